@@ -1,54 +1,42 @@
 import gradio as gr
-import cv2
 import numpy as np
-import tempfile
-import os
-from pipeline import PalmReadingPipeline
+from serving import build_server, ServerBusy
 
-# Load model once
-pipeline = PalmReadingPipeline('best.pt')
+# Load model once; requests share it through a bounded queue and YOLO micro-batches
+server = build_server('best.pt')
 
-def analyze_palm(image):
+async def analyze_palm(image, request: gr.Request = None):
     """Process palm and return results"""
     if image is None:
         return None, "Please upload an image"
     
-    # Save to temp file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as f:
-        temp_path = f.name
-        cv2.imwrite(temp_path, cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
-    
+    # Gradio delivers decoded RGB frames; process them in memory.
+    # Uploads from the same browser session try the previous rotation first.
+    session_id = request.session_hash if request is not None else None
     try:
-        # Process
-        result_img, interpretations, mounts = pipeline.process(temp_path)
-        
-        if result_img is None:
-            return None, "❌ No hand detected"
-        
-        # Format text
-        text = "🔮 VEDIC PALMISTRY ANALYSIS\n\n"
-        
-        if interpretations:
-            for line_name, data in interpretations.items():
-                features = data.get('features', {})
-                interp = data.get('interpretation', 'N/A')
-                
-                text += f"📍 {line_name.upper()}\n"
-                text += f"   Length: {features.get('length_class', 'unknown')}\n"
-                text += f"   Depth: {features.get('depth', 'unknown')}\n"
-                text += f"   {interp}\n\n"
-        else:
-            text += "⚠️ No interpretations generated"
-        
-        # Convert BGR to RGB
-        result_rgb = cv2.cvtColor(result_img, cv2.COLOR_BGR2RGB)
-        
-        return result_rgb, text
-        
-    finally:
-        # Clean up
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        result_img, interpretations, mounts = await server.submit(image, color_order='RGB', session_id=session_id)
+    except ServerBusy:
+        return None, "⏳ Server is busy, please try again in a moment"
+    
+    if result_img is None:
+        return None, "❌ No hand detected"
+    
+    # Format text
+    text = "🔮 VEDIC PALMISTRY ANALYSIS\n\n"
+    
+    if interpretations:
+        for line_name, data in interpretations.items():
+            features = data.get('features', {})
+            interp = data.get('interpretation', 'N/A')
+            
+            text += f"📍 {line_name.upper()}\n"
+            text += f"   Length: {features.get('length_class', 'unknown')}\n"
+            text += f"   Depth: {features.get('depth', 'unknown')}\n"
+            text += f"   {interp}\n\n"
+    else:
+        text += "⚠️ No interpretations generated"
+    
+    return result_img, text
 
 # Create interface
 demo = gr.Interface(
@@ -60,7 +48,9 @@ demo = gr.Interface(
     ],
     title="🔮 PalmReaderPro - AI Vedic Palmistry",
     description="Upload a clear palm image for AI-powered analysis based on Vedic palmistry principles",
-    theme="soft"
+    theme="soft",
+    # Concurrency is bounded by the server's own queue, not Gradio's
+    concurrency_limit=None
 )
 
 if __name__ == "__main__":
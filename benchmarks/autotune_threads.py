@@ -0,0 +1,151 @@
+'''
+Find the torch thread count that maximizes pipeline throughput on this host
+
+For each candidate intra-op thread count T, runs ``workers`` processes
+(default: cores // T, so the machine is filled without oversubscription),
+each with torch.set_num_threads(T), over the synthetic benchmark images,
+and reports aggregate images/second. The best setting is printed as the
+config.py values to use.
+
+Runs offline on CPU; no trained ``best.pt`` is required.
+
+Usage:
+    python benchmarks/autotune_threads.py
+    python benchmarks/autotune_threads.py --threads 1 2 4 8 --workers 4 --output tune.json
+'''
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import PalmReadingPipeline
+from core.detectors import LineDetector
+from logging_config import setup_logging
+from benchmarks.bench_pipeline import environment, parse_size
+from benchmarks.synthetic import STAND_IN_MODEL, StubHandDetector, SyntheticLineDetector, make_palm_image
+
+# Per-process state, set up by the pool initializer
+_worker = None
+
+
+def default_thread_counts(cpu_count):
+    '''Powers of two up to the core count, plus the core count itself'''
+    counts = []
+    t = 1
+    while t < cpu_count:
+        counts.append(t)
+        t *= 2
+    counts.append(cpu_count)
+    return counts
+
+
+def _init_worker(threads, model, size, images, target_size, log_level='WARNING'):
+    '''Load the pipeline and images once per process'''
+    global _worker
+    # Spawned workers start from the import-time INFO setup
+    setup_logging(log_level)
+    pipeline = PalmReadingPipeline(
+        None,
+        target_size=target_size,
+        hand_detector=StubHandDetector(),
+        line_detector=SyntheticLineDetector(model, num_threads=threads),
+    )
+    batch = [make_palm_image(*size, seed=i) for i in range(images)]
+    # Warm up torch and the allocator outside the timed region
+    pipeline.process_array(batch[0], color_order='BGR')
+    _worker = (pipeline, batch)
+
+
+def _run_pass(_):
+    '''Process every image once; returns the number processed'''
+    pipeline, batch = _worker
+    for img in batch:
+        pipeline.process_array(img, color_order='BGR')
+    return len(batch)
+
+
+def measure(threads, workers, model, size, images, passes, target_size, log_level='WARNING'):
+    '''
+    Aggregate throughput of ``workers`` processes with ``threads`` torch threads each
+
+    A single worker runs in this process (intra-op threads are restored
+    afterwards); several run in a spawn pool.
+    '''
+    initargs = (threads, model, size, images, target_size, log_level)
+    jobs = range(passes * workers)
+
+    if workers == 1:
+        previous = LineDetector.configure_threads()[0]
+        try:
+            _init_worker(*initargs)
+            start = time.perf_counter()
+            processed = sum(_run_pass(job) for job in jobs)
+            elapsed = time.perf_counter() - start
+        finally:
+            LineDetector.configure_threads(previous)
+    else:
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+            # One untimed round makes sure every worker has finished loading
+            pool.map(_run_pass, range(workers), chunksize=1)
+            start = time.perf_counter()
+            processed = sum(pool.map(_run_pass, jobs, chunksize=1))
+            elapsed = time.perf_counter() - start
+
+    return {
+        'threads': threads,
+        'workers': workers,
+        'images': processed,
+        'seconds': elapsed,
+        'images_per_second': processed / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main(argv=None):
+    cpu_count = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Sweep torch thread counts for the best pipeline throughput")
+    parser.add_argument('--threads', type=int, nargs='+', default=None,
+                        help="Intra-op thread counts to try (default: powers of two up to the core count)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes per trial (default: cores // threads)")
+    parser.add_argument('--model', default=STAND_IN_MODEL,
+                        help="YOLO weights or config (default: untrained stand-in)")
+    parser.add_argument('--size', default='768x1024', help="Synthetic image size as WxH")
+    parser.add_argument('--images', type=int, default=4, help="Synthetic images per worker")
+    parser.add_argument('--passes', type=int, default=2, help="Timed passes over the images per worker")
+    parser.add_argument('--target-size', type=int, default=1024)
+    parser.add_argument('--output', help="Optional JSON report path")
+    parser.add_argument('--verbose', action='store_true', help="Show pipeline progress output")
+    args = parser.parse_args(argv)
+    log_level = 'INFO' if args.verbose else 'WARNING'
+    setup_logging(log_level)
+
+    size = parse_size(args.size)
+    trials = []
+    for threads in args.threads or default_thread_counts(cpu_count):
+        workers = args.workers or max(1, cpu_count // threads)
+        trial = measure(threads, workers, args.model, size, args.images, args.passes, args.target_size,
+                        log_level)
+        trials.append(trial)
+        print(f"  {threads:>3} thread(s) x {workers:>3} worker(s): {trial['images_per_second']:8.2f} images/s")
+
+    best = max(trials, key=lambda trial: trial['images_per_second'])
+    print(f"\nBest on this host ({cpu_count} cores): {best['threads']} torch thread(s) per worker, "
+          f"{best['workers']} worker(s), {best['images_per_second']:.2f} images/s")
+    print(f"  config.py: TORCH_NUM_THREADS = {best['threads']}")
+    print(f"  batch CLI: python main.py batch ... --workers {best['workers']} --torch-threads {best['threads']}")
+
+    report = {'meta': {**environment(), 'args': vars(args)}, 'trials': trials, 'best': best}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nAutotune report written to {args.output}")
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+'''
+Benchmark harness for the palm reading pipeline
+
+Times every stage of ``PalmReadingPipeline.process_array`` on synthetic
+images with stubbed detectors, microbenchmarks the FeatureExtractor
+kernels over a range of keypoint counts, and writes the results as JSON
+so runs can be compared for regressions.
+
+Runs offline on CPU; no trained ``best.pt`` is required.
+
+Usage:
+    python benchmarks/bench_pipeline.py --output bench.json
+    python benchmarks/bench_pipeline.py --output new.json --compare bench.json
+'''
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import PalmReadingPipeline
+from core.features import FeatureExtractor, ImageContext
+from core.classifiers import MountBasedClassifier
+from config import ORIENTATION_MODE, RESOLUTION_MODE
+from logging_config import setup_logging
+from benchmarks.synthetic import (STAND_IN_MODEL, StubHandDetector, SyntheticLineDetector,
+                                  make_palm_image, line_keypoints)
+
+STAGES = ['standardize', 'orientation', 'landmarks', 'yolo',
+          'features', 'classify', 'interpret', 'draw']
+
+DEFAULT_SIZES = ['768x1024', '3024x4032']
+DEFAULT_KEYPOINTS = [8, 17, 32, 64, 128]
+
+
+def summarize(samples_ms):
+    '''Summary statistics (milliseconds) for a list of samples'''
+    arr = np.asarray(samples_ms, dtype=float)
+    if arr.size == 0:
+        return {'n': 0}
+    return {
+        'n': int(arr.size),
+        'mean_ms': float(arr.mean()),
+        'median_ms': float(np.median(arr)),
+        'p95_ms': float(np.percentile(arr, 95)),
+        'min_ms': float(arr.min()),
+        'max_ms': float(arr.max()),
+    }
+
+
+class StageProfiler:
+    '''
+    Wraps callables on live objects so their durations are attributed to a
+    stage; the original attributes are restored on exit
+    '''
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._current = defaultdict(float)
+        self._patched = []
+
+    def wrap(self, owner, attr, stage):
+        own = attr in owner.__dict__
+        original = owner.__dict__.get(attr)
+        func = original.__func__ if isinstance(original, staticmethod) else getattr(owner, attr)
+        
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._current[stage] += (time.perf_counter() - start) * 1000
+        
+        setattr(owner, attr, staticmethod(timed) if isinstance(owner, type) else timed)
+        self._patched.append((owner, attr, original, own))
+        return self
+
+    def discard(self):
+        '''Drop timings accumulated since the last commit (e.g. warmup)'''
+        self._current.clear()
+
+    def commit(self):
+        '''Close the current iteration, recording one sample per stage'''
+        for stage in STAGES:
+            self.samples[stage].append(self._current.get(stage, 0.0))
+        self._current.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        for owner, attr, original, own in reversed(self._patched):
+            if own:
+                setattr(owner, attr, original)
+            else:
+                delattr(owner, attr)
+        self._patched.clear()
+
+
+def bench_pipeline(pipeline, images, repeat, warmup):
+    '''Per-stage and end-to-end timings of process_array over images'''
+    hand = pipeline.hand_detector
+    
+    with StageProfiler() as profiler:
+        profiler.wrap(pipeline, 'standardize_image', 'standardize')
+        profiler.wrap(hand, 'orient_hand', 'orientation')
+        profiler.wrap(hand, 'get_landmarks', 'landmarks')
+        profiler.wrap(hand, 'extract_mounts', 'landmarks')
+        profiler.wrap(pipeline.line_detector, 'detect', 'yolo')
+        profiler.wrap(FeatureExtractor, 'extract_geometry_batch', 'features')
+        profiler.wrap(FeatureExtractor, 'extract_features_improved', 'features')
+        profiler.wrap(MountBasedClassifier, 'classify_line_length_by_mounts', 'classify')
+        profiler.wrap(pipeline, 'interpret_features', 'interpret')
+        profiler.wrap(hand, 'draw_landmarks', 'draw')
+        profiler.wrap(hand, 'draw_mounts', 'draw')
+        profiler.wrap(pipeline, 'draw_lines', 'draw')
+        
+        totals = []
+        for i in range(warmup + repeat):
+            for img in images:
+                start = time.perf_counter()
+                result_img, _, _ = pipeline.process_array(img, color_order='BGR')
+                elapsed = (time.perf_counter() - start) * 1000
+                if result_img is None:
+                    raise RuntimeError("stubbed pipeline returned no result")
+                if i < warmup:
+                    profiler.discard()
+                    continue
+                profiler.commit()
+                totals.append(elapsed)
+    
+    stages = {stage: summarize(profiler.samples[stage]) for stage in STAGES}
+    return {'stages': stages, 'total': summarize(totals)}
+
+
+def time_call(func, min_time=0.05, max_iters=2000):
+    '''Median per-call time in ms, auto-scaling the iteration count'''
+    samples = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < 5 or (time.perf_counter() < deadline and len(samples) < max_iters):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def bench_features(keypoint_counts, size=(768, 1024)):
+    '''Microbenchmarks of FeatureExtractor kernels across keypoint counts'''
+    width, height = size
+    img = make_palm_image(width, height, seed=1)
+    results = defaultdict(dict)
+    
+    for k in keypoint_counts:
+        lines = list(line_keypoints(width, height, num_keypoints=k))
+        kpts = lines[0]
+        ctx = ImageContext(img)
+        ctx.gray, ctx.binary  # prebuild shared maps
+        
+        cases = {
+            'calculate_line_thickness': lambda: FeatureExtractor.calculate_line_thickness(kpts, img),
+            'calculate_line_thickness_ctx': lambda: FeatureExtractor.calculate_line_thickness(kpts, ctx),
+            'detect_actual_branches': lambda: FeatureExtractor.detect_actual_branches(kpts, img),
+            'detect_actual_branches_ctx': lambda: FeatureExtractor.detect_actual_branches(kpts, ctx),
+            'calculate_curvature_improved': lambda: FeatureExtractor.calculate_curvature_improved(kpts),
+            'detect_breaks_adaptive': lambda: FeatureExtractor.detect_breaks_adaptive(kpts),
+            'extract_geometry_batch_4_lines': lambda: FeatureExtractor.extract_geometry_batch(lines),
+            'extract_features_improved': lambda: FeatureExtractor.extract_features_improved(kpts, ctx),
+        }
+        for name, func in cases.items():
+            results[name][str(k)] = time_call(func)
+    
+    return dict(results)
+
+
+def environment():
+    import torch
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'torch': torch.__version__,
+        'torch_threads': torch.get_num_threads(),
+    }
+
+
+def compare(current, baseline, threshold):
+    '''Print median ratios against a baseline; return names that regressed'''
+    regressions = []
+    rows = []
+    
+    def add(name, cur, base):
+        if not cur or not base or not base.get('median_ms'):
+            return
+        ratio = cur['median_ms'] / base['median_ms']
+        rows.append((name, base['median_ms'], cur['median_ms'], ratio))
+        if ratio > threshold:
+            regressions.append(name)
+    
+    for size, run in current.get('pipeline', {}).items():
+        base_run = baseline.get('pipeline', {}).get(size, {})
+        add(f"{size}/total", run.get('total'), base_run.get('total'))
+        for stage in STAGES:
+            add(f"{size}/{stage}", run['stages'].get(stage), base_run.get('stages', {}).get(stage))
+    for func, by_k in current.get('micro', {}).items():
+        for k, stats in by_k.items():
+            add(f"{func}[{k}]", stats, baseline.get('micro', {}).get(func, {}).get(k))
+    
+    print(f"\n{'benchmark':<48}{'base ms':>10}{'now ms':>10}{'ratio':>8}")
+    for name, base, cur, ratio in rows:
+        flag = '  <-- regression' if ratio > threshold else ''
+        print(f"{name:<48}{base:>10.3f}{cur:>10.3f}{ratio:>8.2f}{flag}")
+    return regressions
+
+
+def print_summary(report):
+    for size, run in report['pipeline'].items():
+        print(f"\nPipeline {size} ({run['total']['n']} runs, median total "
+              f"{run['total']['median_ms']:.1f} ms)")
+        for stage in STAGES:
+            stats = run['stages'][stage]
+            print(f"  {stage:<12}{stats['median_ms']:>10.3f} ms  (p95 {stats['p95_ms']:.3f})")
+
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the palm reading pipeline offline")
+    parser.add_argument('--output', default='bench_results.json', help="JSON report path")
+    parser.add_argument('--compare', help="Baseline JSON report to compare against")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="Median ratio above which --compare reports a regression")
+    parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES, help="Input sizes as WxH")
+    parser.add_argument('--images', type=int, default=3, help="Synthetic images per size")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed passes over the images")
+    parser.add_argument('--warmup', type=int, default=1, help="Untimed warmup passes")
+    parser.add_argument('--keypoints', type=int, nargs='+', default=DEFAULT_KEYPOINTS,
+                        help="Keypoint counts for the FeatureExtractor microbenchmarks")
+    parser.add_argument('--model', default=STAND_IN_MODEL,
+                        help="YOLO weights or config (default: untrained stand-in)")
+    parser.add_argument('--no-yolo', action='store_true', help="Skip running the YOLO model")
+    parser.add_argument('--mediapipe', action='store_true',
+                        help="Run real MediaPipe for orientation/landmarks timing")
+    parser.add_argument('--orientation-mode', default=ORIENTATION_MODE, choices=['fast', 'ordered', 'exhaustive'])
+    parser.add_argument('--resolution-mode', default=RESOLUTION_MODE, choices=['single', 'multi'])
+    parser.add_argument('--target-size', type=int, default=1024)
+    parser.add_argument('--skip-pipeline', action='store_true')
+    parser.add_argument('--skip-micro', action='store_true')
+    parser.add_argument('--verbose', action='store_true', help="Show pipeline progress output")
+    args = parser.parse_args(argv)
+    
+    report = {'meta': {**environment(), 'args': vars(args)}, 'pipeline': {}, 'micro': {}}
+    setup_logging('INFO' if args.verbose else 'WARNING')
+    
+    if not args.skip_pipeline:
+        pipeline = PalmReadingPipeline(
+            None,
+            target_size=args.target_size,
+            orientation_mode=args.orientation_mode,
+            resolution_mode=args.resolution_mode,
+            hand_detector=StubHandDetector(run_mediapipe=args.mediapipe),
+            line_detector=SyntheticLineDetector(args.model, run_model=not args.no_yolo),
+        )
+        with pipeline:
+            for size_text in args.sizes:
+                width, height = parse_size(size_text)
+                images = [make_palm_image(width, height, seed=i) for i in range(args.images)]
+                report['pipeline'][size_text] = bench_pipeline(pipeline, images, args.repeat, args.warmup)
+        print_summary(report)
+    
+    if not args.skip_micro:
+        report['micro'] = bench_features(args.keypoints)
+    
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nBenchmark report written to {args.output}")
+    
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.2f}x")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
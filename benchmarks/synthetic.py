@@ -0,0 +1,188 @@
+'''
+Synthetic fixtures for offline benchmarking and the test suite
+
+Everything here runs without a real palm photo or a trained ``best.pt``:
+images are drawn procedurally, hand landmarks are fixed, and line
+detections are generated from the image geometry while a stand-in YOLO
+pose model (built from the bundled ``yolov8n-pose.yaml``) supplies
+realistic inference cost. Tests use the same stand-ins with the model
+switched off.
+'''
+import os
+import sys
+
+import cv2
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.detectors import HandDetector, LineDetector
+from config import TORCH_NUM_THREADS
+
+STAND_IN_MODEL = 'yolov8n-pose.yaml'
+LINE_NAMES = {0: 'life_line', 1: 'heart_line', 2: 'head_line', 3: 'fate_line'}
+
+# Normalized landmarks of an upright right palm (wrist at the bottom)
+UPRIGHT_LANDMARKS = {
+    0: (0.50, 0.90), 1: (0.32, 0.78), 2: (0.24, 0.68), 3: (0.20, 0.60), 4: (0.17, 0.52),
+    5: (0.36, 0.45), 6: (0.34, 0.32), 7: (0.33, 0.23), 8: (0.32, 0.15),
+    9: (0.48, 0.43), 10: (0.48, 0.29), 11: (0.48, 0.19), 12: (0.48, 0.10),
+    13: (0.59, 0.45), 14: (0.60, 0.32), 15: (0.61, 0.23), 16: (0.62, 0.16),
+    17: (0.69, 0.50), 18: (0.72, 0.41), 19: (0.74, 0.34), 20: (0.76, 0.28),
+}
+
+# Normalized control points of the four major lines
+LINE_PATHS = {
+    0: [(0.36, 0.50), (0.33, 0.58), (0.32, 0.66), (0.35, 0.74), (0.41, 0.82)],
+    1: [(0.70, 0.53), (0.62, 0.51), (0.54, 0.51), (0.46, 0.50), (0.39, 0.48)],
+    2: [(0.37, 0.53), (0.45, 0.57), (0.53, 0.59), (0.61, 0.61), (0.67, 0.64)],
+    3: [(0.50, 0.85), (0.50, 0.76), (0.49, 0.67), (0.49, 0.58), (0.48, 0.50)],
+}
+
+
+def make_hand(points=None):
+    '''21-landmark NormalizedLandmarkList with the given (index: (x, y)) points, others at the center'''
+    points = points or {}
+    hand = landmark_pb2.NormalizedLandmarkList()
+    for i in range(21):
+        x, y = points.get(i, (0.5, 0.5))
+        hand.landmark.add(x=x, y=y, z=0.0)
+    return hand
+
+
+def make_hand_landmarks():
+    '''Fixed 21-point NormalizedLandmarkList for an upright palm'''
+    return make_hand(UPRIGHT_LANDMARKS)
+
+
+def upright_orient_hand(img, mode=None, **hints):
+    '''Drop-in for HandDetector.orient_hand that always finds the upright palm'''
+    return img, 0, make_hand_landmarks()
+
+
+def line_keypoints(width, height, num_keypoints=17):
+    '''(4, num_keypoints, 2) pixel keypoints for the synthetic lines'''
+    t = np.linspace(0.0, 1.0, num_keypoints)
+    lines = []
+    for class_id in sorted(LINE_PATHS):
+        path = np.array(LINE_PATHS[class_id])
+        s = np.linspace(0.0, 1.0, len(path))
+        x = np.interp(t, s, path[:, 0]) * width
+        y = np.interp(t, s, path[:, 1]) * height
+        lines.append(np.stack([x, y], axis=1))
+    return np.array(lines, dtype=np.float32)
+
+
+def make_palm_image(width=768, height=1024, seed=0):
+    '''Skin-toned palm with dark creases along the synthetic lines, plus sensor noise'''
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width, 3), (60, 70, 80), dtype=np.uint8)
+    
+    center = (int(width * 0.5), int(height * 0.62))
+    axes = (int(width * 0.3), int(height * 0.3))
+    cv2.ellipse(img, center, axes, 0, 0, 360, (150, 175, 215), -1)
+    
+    for i, line in enumerate(line_keypoints(width, height, num_keypoints=32)):
+        thickness = max(1, int(min(width, height) / 150) + i % 3)
+        cv2.polylines(img, [line.astype(np.int32)], False, (70, 80, 100), thickness)
+    
+    img = cv2.GaussianBlur(img, (5, 5), 0)
+    noise = rng.normal(0, 6, img.shape)
+    return np.clip(img + noise, 0, 255).astype(np.uint8)
+
+
+class FakeTensor:
+    '''Mimics the ``.cpu().numpy()`` chain of ultralytics tensors'''
+
+    def __init__(self, array):
+        self.array = np.asarray(array)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class FakeKeypoints:
+    def __init__(self, xy):
+        self.xy = FakeTensor(xy)
+
+
+class FakeBoxes:
+    def __init__(self, cls):
+        self.cls = FakeTensor(cls)
+
+
+class SyntheticLineResult:
+    '''The parts of an ultralytics pose Results the pipeline reads'''
+
+    def __init__(self, xy, cls):
+        self.keypoints = FakeKeypoints(xy)
+        self.boxes = FakeBoxes(cls)
+
+
+class _Names:
+    names = LINE_NAMES
+
+
+class SyntheticLineDetector:
+    '''
+    Runs a stand-in YOLO pose model for realistic inference cost, then
+    returns synthetic detections of the four major lines
+
+    With ``run_model=False`` it is a model-free, deterministic detector for
+    tests; ``batch_sizes`` records the size of every detect_batch call.
+    '''
+
+    def __init__(self, model_path=STAND_IN_MODEL, num_keypoints=17, run_model=True, num_threads=TORCH_NUM_THREADS):
+        self.detector = LineDetector(model_path, num_threads=num_threads) if run_model else None
+        self.model = _Names()
+        self.num_keypoints = num_keypoints
+        self.batch_sizes = []
+
+    def _synthetic(self, image):
+        h, w = image.shape[:2]
+        xy = line_keypoints(w, h, self.num_keypoints)
+        return SyntheticLineResult(xy, np.arange(len(xy), dtype=np.float32))
+
+    def detect(self, image, conf=0.3, iou=0.4):
+        if self.detector is not None:
+            self.detector.detect(image, conf=conf, iou=iou)
+        return self._synthetic(image)
+
+    def detect_batch(self, images, conf=0.3, iou=0.4):
+        self.batch_sizes.append(len(images))
+        if self.detector is not None:
+            self.detector.detect_batch(images, conf=conf, iou=iou)
+        return [self._synthetic(image) for image in images]
+
+
+class StubHandDetector(HandDetector):
+    '''
+    HandDetector that always "finds" the synthetic upright hand
+
+    With ``run_mediapipe=True`` the real MediaPipe calls still run (so
+    their cost is measured) and the synthetic hand is substituted only
+    when MediaPipe finds nothing, which is the usual case on drawn images.
+    '''
+
+    def __init__(self, run_mediapipe=False):
+        super().__init__()
+        self.run_mediapipe = run_mediapipe
+
+    def orient_hand(self, img, mode='fast', **hints):
+        if self.run_mediapipe:
+            img, angle, hand_landmarks = super().orient_hand(img, mode=mode, **hints)
+            if hand_landmarks is not None:
+                return img, angle, hand_landmarks
+            return img, angle, self.rotate_landmarks(make_hand_landmarks(), angle)
+        return upright_orient_hand(img)
+
+    def get_landmarks(self, img_rgb, confidence=0.5):
+        if self.run_mediapipe:
+            hand_landmarks = super().get_landmarks(img_rgb, confidence)
+            if hand_landmarks is not None:
+                return hand_landmarks
+        return make_hand_landmarks()
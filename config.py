@@ -25,6 +25,62 @@ ROTATION_MAP = {
 
 ROTATION_ANGLES = [0, 90, 180, 270]
 
+# Orientation Search
+# 'fast': one MediaPipe pass on a thumbnail, rotation solved from landmarks
+# 'ordered': MediaPipe on rotations of the full image, most likely first
+#            (session prior, EXIF, aspect ratio), until one is upright
+# 'exhaustive': MediaPipe on all four rotations of the full image
+# Only 'ordered' uses the EXIF and session-prior hints
+ORIENTATION_MODE = 'fast'
+ORIENTATION_THUMBNAIL_SIZE = 256
+# 'ordered' search stops at the first rotation scoring at least this
+# (wrist-to-fingertip plus wrist-to-knuckle height, normalized; upright ~1.2)
+UPRIGHT_SCORE_THRESHOLD = 0.5
+
+# Rotation prior per session_id (last angle found, tried first next time);
+# least recently used sessions beyond the cap, or idle past the TTL, are dropped
+ROTATION_PRIOR_SESSIONS = 1024
+ROTATION_PRIOR_TTL = 3600  # seconds
+
+# Resolution Strategy
+# 'single': MediaPipe, YOLO and features all use the target_size image
+# 'multi': MediaPipe on a DETECTION_SIZE copy, YOLO at YOLO_INPUT_SIZE,
+#          keypoints mapped back so features sample the target_size image
+#          (not the original decode: feature thresholds assume that scale)
+RESOLUTION_MODE = 'single'
+DETECTION_SIZE = 256
+YOLO_INPUT_SIZE = 640
+
+# Decode large JPEGs at 1/2, 1/4 or 1/8 scale when still >= target_size
+REDUCED_DECODE = True
+
+# Serving (serving.py)
+# Requests beyond SERVING_MAX_QUEUE waiting ones are rejected as busy;
+# YOLO calls arriving within SERVING_BATCH_WINDOW_MS share one forward pass
+SERVING_WORKERS = 2
+SERVING_MAX_QUEUE = 16
+SERVING_MAX_BATCH = 8
+SERVING_BATCH_WINDOW_MS = 10
+
+# YOLO handles shared by threads calling one LineDetector (1 = fully serialized)
+LINE_MODEL_INSTANCES = 2
+
+# Torch CPU threads for YOLO inference (process-wide). None keeps torch's
+# default of one intra-op thread per core, which oversubscribes the host
+# when several worker processes run; `python benchmarks/autotune_threads.py`
+# finds the best split for a machine.
+TORCH_NUM_THREADS = None
+TORCH_INTEROP_THREADS = None
+
+# Line model runtime: 'torch' (PyTorch via ultralytics), 'onnxruntime' or
+# 'openvino'. Other backends export the weights once, next to the .pt file
+# (see core/export.py), and reuse that export while it is newer than them.
+LINE_BACKEND = 'torch'
+# Static INT8 quantization (onnxruntime only), calibrated on palm photos
+LINE_INT8 = False
+LINE_CALIBRATION_DIR = None
+LINE_EXPORT_SIZE = 640
+
 # Detection Parameters
 MEDIAPIPE_DETECTION_CONFIDENCE = 0.3
 YOLO_CONFIDENCE = 0.3
@@ -0,0 +1,360 @@
+import copy
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from utils import to_jsonable
+from core.schema import plain_readings
+from logging_config import get_logger
+
+logger = get_logger('cache')
+
+_file_digests = {}
+_file_digest_lock = threading.Lock()
+
+
+def image_digest(img):
+    '''Content hash of decoded pixels (shape and dtype included)'''
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{img.shape}|{img.dtype}".encode())
+    h.update(np.ascontiguousarray(img).data)
+    return h.hexdigest()
+
+
+def file_digest(path):
+    '''Content hash of a file, memoized per (path, size, mtime)'''
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _file_digest_lock:
+        if memo_key in _file_digests:
+            return _file_digests[memo_key]
+    
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _file_digest_lock:
+        _file_digests[memo_key] = digest
+    return digest
+
+
+def model_fingerprint(model_path):
+    '''File hash for weights on disk, otherwise the model identifier itself'''
+    if model_path and os.path.isfile(str(model_path)):
+        return file_digest(model_path)
+    return str(model_path)
+
+
+def config_fingerprint(module=config):
+    '''Hash of every upper-case setting in config.py'''
+    values = {
+        name: to_jsonable(getattr(module, name))
+        for name in dir(module)
+        if name.isupper()
+    }
+    payload = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class ResultCache:
+    '''
+    Content-addressed cache of pipeline results
+    
+    Tier 1 is an in-memory LRU bounded by entry count and byte size with an
+    optional TTL. Tier 2 (optional) is a directory holding ``<key>.npz``
+    (image) and ``<key>.json`` (interpretations, mounts and annotations).
+    Disk hits are promoted to memory. The pipeline stores the clean image
+    plus JSON-ready ``annotations`` (landmarks and labelled lines) and
+    redraws the overlay on a hit.
+    
+    Entries are copied on put and on get, so callers may modify what they
+    store or receive. Both tiers return the same types (see
+    core.schema.plain_readings).
+    '''
+    
+    def __init__(self, max_entries=256, max_bytes=512 * 1024 * 1024, ttl=None, disk_dir=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'memory_hits': 0, 'disk_hits': 0,
+                         'stores': 0, 'evictions': 0, 'expirations': 0}
+    
+    @staticmethod
+    def entry_size(value):
+        image = value[0]
+        return image.nbytes if image is not None else 0
+    
+    @staticmethod
+    def snapshot(image, interpretations, mounts, annotations=None):
+        '''Private copy of a result in the form the disk tier reads back'''
+        if image is not None:
+            image = image.copy()
+        interpretations, mounts = plain_readings(interpretations, mounts)
+        if annotations is not None:
+            annotations = to_jsonable(annotations)
+        return image, interpretations, mounts, annotations
+    
+    @staticmethod
+    def _copy(value):
+        image, interpretations, mounts, annotations = value
+        return (image.copy() if image is not None else None,
+                copy.deepcopy(interpretations), copy.deepcopy(mounts), copy.deepcopy(annotations))
+    
+    def _expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+    
+    def _evict_locked(self):
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or (self.max_bytes and self._bytes > self.max_bytes)):
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.counters['evictions'] += 1
+    
+    def _put_memory(self, key, value, created):
+        size = self.entry_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[2]
+            self._entries[key] = (value, created, size)
+            self._bytes += size
+            self._evict_locked()
+    
+    def get(self, key):
+        '''Return (image, interpretations, mounts, annotations) or None on a miss'''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, created, size = entry
+                if self._expired(created):
+                    del self._entries[key]
+                    self._bytes -= size
+                    self.counters['expirations'] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.counters['hits'] += 1
+                    self.counters['memory_hits'] += 1
+                    return self._copy(value)
+        
+        value = self._load_disk(key) if self.disk_dir else None
+        with self._lock:
+            if value is None:
+                self.counters['misses'] += 1
+                return None
+            self.counters['hits'] += 1
+            self.counters['disk_hits'] += 1
+        self._put_memory(key, value[0], value[1])
+        return self._copy(value[0])
+    
+    def put(self, key, image, interpretations, mounts, annotations=None):
+        value = self.snapshot(image, interpretations, mounts, annotations)
+        created = time.time()
+        self._put_memory(key, value, created)
+        with self._lock:
+            self.counters['stores'] += 1
+        if self.disk_dir:
+            self._store_disk(key, value)
+    
+    def _paths(self, key):
+        return os.path.join(self.disk_dir, f"{key}.npz"), os.path.join(self.disk_dir, f"{key}.json")
+    
+    def _store_disk(self, key, value):
+        image, interpretations, mounts, annotations = value
+        npz_path, json_path = self._paths(key)
+        try:
+            if image is not None:
+                tmp = f"{npz_path}.{os.getpid()}-{threading.get_ident()}.tmp.npz"
+                np.savez(tmp, image=image)
+                os.replace(tmp, npz_path)
+            payload = {
+                'has_image': image is not None,
+                'interpretations': to_jsonable(interpretations),
+                'mounts': to_jsonable(mounts),
+                'annotations': annotations,
+            }
+            tmp = f"{json_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(payload, f)
+            # JSON last: its presence marks a complete entry
+            os.replace(tmp, json_path)
+        except OSError as e:
+            logger.warning("Could not write cache entry %s: %s", key, e)
+    
+    def _load_disk(self, key):
+        npz_path, json_path = self._paths(key)
+        try:
+            created = os.path.getmtime(json_path)
+        except OSError:
+            return None
+        if self._expired(created):
+            with self._lock:
+                self.counters['expirations'] += 1
+            return None
+        
+        try:
+            with open(json_path) as f:
+                payload = json.load(f)
+            image = None
+            if payload['has_image']:
+                with np.load(npz_path) as data:
+                    image = data['image']
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Discarding unreadable cache entry %s: %s", key, e)
+            return None
+        
+        value = self.snapshot(image, payload['interpretations'], payload['mounts'], payload.get('annotations'))
+        return value, created
+    
+    def stats(self):
+        '''Hit/miss counters plus current memory usage'''
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return {
+                **self.counters,
+                'hit_rate': self.counters['hits'] / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+    
+    def clear(self):
+        '''Drop the memory tier (disk entries are kept)'''
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+class LandmarkStore:
+    '''
+    Persistent map from image hash to (rotation angle, normalized landmarks)
+    
+    Orientation and landmarks depend only on the pixels, so they survive
+    model swaps and threshold changes that invalidate ResultCache. Entries
+    are kept in memory and, when ``path`` is given, appended to a JSON Lines
+    file that is reloaded on start-up. Unchanged re-puts are not written,
+    and a file holding superseded or torn records is compacted on load. ``landmarks`` is None for images
+    where no hand was found.
+    '''
+    
+    def __init__(self, path=None):
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'stores': 0}
+        if path:
+            parent = os.path.dirname(os.path.abspath(path))
+            os.makedirs(parent, exist_ok=True)
+            self._load()
+    
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        lines = 0
+        with open(self.path) as f:
+            for line_number, line in enumerate(f, 1):
+                lines += 1
+                try:
+                    record = json.loads(line)
+                    self._entries[record['key']] = (record['angle'], record['landmarks'])
+                except (ValueError, KeyError):
+                    # A crash mid-append leaves at most one truncated line
+                    logger.warning("Skipping bad landmark record at %s:%d", self.path, line_number)
+        logger.debug("Loaded %d landmark records from %s", len(self._entries), self.path)
+        if lines > len(self._entries):
+            self._compact()
+    
+    def _compact(self):
+        '''Rewrite the file with one line per key, dropping superseded and torn records'''
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                for key, (angle, landmarks) in self._entries.items():
+                    f.write(json.dumps({'key': key, 'angle': angle, 'landmarks': landmarks}) + '\n')
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("Could not compact %s: %s", self.path, e)
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def get(self, key):
+        '''Return (angle, landmarks) or None on a miss'''
+        with self._lock:
+            entry = self._entries.get(key)
+            self.counters['hits' if entry is not None else 'misses'] += 1
+            return entry
+    
+    def put(self, key, angle, landmarks):
+        '''Record an orientation result; landmarks is a list of [x, y, z] or None'''
+        landmarks = to_jsonable(landmarks)
+        with self._lock:
+            if self._entries.get(key) == (angle, landmarks):
+                return
+            self._entries[key] = (angle, landmarks)
+            self.counters['stores'] += 1
+            if self.path:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps({'key': key, 'angle': angle, 'landmarks': landmarks}) + '\n')
+    
+    def stats(self):
+        with self._lock:
+            return {**self.counters, 'entries': len(self._entries)}
+
+
+class SessionPriors:
+    '''
+    Bounded map from session ID to the last rotation angle found
+
+    Holds at most ``max_sessions`` entries (least recently used dropped
+    first), each for at most ``ttl`` seconds since it was written. A
+    session_id of None is never stored, so anonymous requests neither
+    leave a prior nor pick one up.
+    '''
+
+    def __init__(self, max_sessions=config.ROTATION_PRIOR_SESSIONS, ttl=config.ROTATION_PRIOR_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, session_id):
+        '''Last angle for session_id, or None'''
+        if session_id is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            angle, written = entry
+            if self.ttl is not None and time.time() - written > self.ttl:
+                del self._entries[session_id]
+                return None
+            self._entries.move_to_end(session_id)
+            return angle
+
+    def put(self, session_id, angle):
+        if session_id is None:
+            return
+        with self._lock:
+            self._entries.pop(session_id, None)
+            self._entries[session_id] = (angle, time.time())
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
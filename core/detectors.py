@@ -1,31 +1,124 @@
 import cv2
 import mediapipe as mp
+from mediapipe.framework.formats import landmark_pb2
 from ultralytics import YOLO
+import torch
 import numpy as np
 from scipy.spatial import distance
 import sys
 import os
+import copy
+import threading
+from contextlib import contextmanager
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from config import MOUNT_LANDMARK_MAP, ROTATION_MAP, ROTATION_ANGLES, MEDIAPIPE_DETECTION_CONFIDENCE
-from utils import get_pixel_coords
+from config import (MOUNT_LANDMARK_MAP, ROTATION_MAP, ROTATION_ANGLES, MEDIAPIPE_DETECTION_CONFIDENCE,
+                    ORIENTATION_MODE, ORIENTATION_THUMBNAIL_SIZE, UPRIGHT_SCORE_THRESHOLD,
+                    LINE_MODEL_INSTANCES, TORCH_NUM_THREADS, TORCH_INTEROP_THREADS, LINE_BACKEND, LINE_INT8)
+from core.export import resolve_line_model
+from utils import get_pixel_coords, rotate_normalized_coords
+from logging_config import get_logger
+
+logger = get_logger('detectors')
+
+class HandsSessionManager:
+    '''
+    Pool of pre-initialized MediaPipe Hands graphs keyed by confidence
+
+    Sessions are checked out for the duration of one ``process`` call and
+    returned afterwards, so each graph is only ever used by one thread at a
+    time while still being reused across calls and threads.
+    '''
+
+    def __init__(self, mp_hands):
+        self.mp_hands = mp_hands
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self.created = 0
+        self.reused = 0
+
+    def _create(self, confidence):
+        return self.mp_hands.Hands(
+            static_image_mode=True,
+            max_num_hands=1,
+            min_detection_confidence=confidence
+        )
+
+    def acquire(self, confidence):
+        '''Check out a Hands session for the given confidence'''
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("HandsSessionManager is closed")
+            idle = self._idle.get(confidence)
+            if idle:
+                self.reused += 1
+                return idle.pop()
+            self.created += 1
+        return self._create(confidence)
+
+    def release(self, confidence, hands):
+        '''Return a checked-out session to the pool'''
+        with self._lock:
+            if not self._closed:
+                self._idle.setdefault(confidence, []).append(hands)
+                return
+        hands.close()
+
+    @contextmanager
+    def session(self, confidence):
+        '''Context manager wrapping acquire/release'''
+        hands = self.acquire(confidence)
+        try:
+            yield hands
+        finally:
+            self.release(confidence, hands)
+
+    def warmup(self, confidences, count=1):
+        '''Pre-create ``count`` idle sessions for each confidence'''
+        for confidence in confidences:
+            sessions = [self.acquire(confidence) for _ in range(count)]
+            for hands in sessions:
+                self.release(confidence, hands)
+
+    def stats(self):
+        '''Return created/reused/idle session counters'''
+        with self._lock:
+            idle = sum(len(v) for v in self._idle.values())
+            return {'created': self.created, 'reused': self.reused, 'idle': idle}
+
+    def close(self):
+        '''Close all idle sessions; sessions still checked out close on release'''
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, {}
+        for sessions in idle.values():
+            for hands in sessions:
+                hands.close()
+
 
 class HandDetector:
     def __init__(self):
         self.mp_hands = mp.solutions.hands
         self.mp_drawing = mp.solutions.drawing_utils
+        self.sessions = HandsSessionManager(self.mp_hands)
+
+    def close(self):
+        '''Release all pooled MediaPipe sessions'''
+        self.sessions.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
         
     def get_landmarks(self, img_rgb, confidence=0.5):
         '''Extract hand landmarks from RGB image'''
-        hands = self.mp_hands.Hands(
-            static_image_mode=True,
-            max_num_hands=1,
-            min_detection_confidence=confidence
-        )
-        results = hands.process(img_rgb)
-        hands.close()
+        with self.sessions.session(confidence) as hands:
+            results = hands.process(img_rgb)
         
         if results.multi_hand_landmarks:
             return results.multi_hand_landmarks[0]
@@ -59,84 +152,209 @@ class HandDetector:
         
         return mounts
     
+    @staticmethod
+    def uprightness_score(hand_landmarks):
+        '''Score how upright a hand is in normalized image coordinates'''
+        landmarks = hand_landmarks.landmark
+        
+        # Calculate uprightness score based on wrist (0) to middle finger tip (12)
+        wrist = landmarks[MOUNT_LANDMARK_MAP['wrist']]
+        middle_tip = landmarks[MOUNT_LANDMARK_MAP['middle_tip']]
+        
+        # Score: vertical distance (positive = finger above wrist)
+        vertical_distance = wrist.y - middle_tip.y
+        
+        # Also check palm orientation
+        index_base = landmarks[MOUNT_LANDMARK_MAP['index_base']]
+        pinky_base = landmarks[MOUNT_LANDMARK_MAP['pinky_base']]
+        
+        palm_center_y = (index_base.y + pinky_base.y) / 2
+        palm_upright_score = wrist.y - palm_center_y
+        
+        # Combined score
+        return vertical_distance + palm_upright_score
+    
+    @staticmethod
+    def rotate_landmarks(hand_landmarks, angle):
+        '''Return a copy of landmarks expressed in the frame rotated clockwise by angle'''
+        rotated = type(hand_landmarks)()
+        rotated.CopyFrom(hand_landmarks)
+        if angle == 0:
+            return rotated
+        
+        for lm in rotated.landmark:
+            lm.x, lm.y = rotate_normalized_coords(lm.x, lm.y, angle)
+        return rotated
+    
+    @staticmethod
+    def landmarks_to_list(hand_landmarks):
+        '''Normalized [x, y, z] per landmark, for storage'''
+        return [[lm.x, lm.y, lm.z] for lm in hand_landmarks.landmark]
+    
+    @staticmethod
+    def landmarks_from_list(coords):
+        '''Rebuild a NormalizedLandmarkList from landmarks_to_list output'''
+        hand_landmarks = landmark_pb2.NormalizedLandmarkList()
+        for x, y, z in coords:
+            hand_landmarks.landmark.add(x=x, y=y, z=z)
+        return hand_landmarks
+    
+    def estimate_orientation(self, img, thumbnail_size=ORIENTATION_THUMBNAIL_SIZE):
+        '''
+        Single-pass orientation estimate
+        
+        Runs MediaPipe once on a thumbnail and solves the rotation from the
+        landmarks by scoring each candidate frame mathematically.
+        
+        Returns:
+            (angle, hand_landmarks) with landmarks in the unrotated frame,
+            or (0, None) when no hand is found
+        '''
+        h, w = img.shape[:2]
+        candidates = [img]
+        if thumbnail_size and max(h, w) > thumbnail_size:
+            scale = thumbnail_size / max(h, w)
+            thumb = cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))),
+                               interpolation=cv2.INTER_AREA)
+            candidates.insert(0, thumb)
+        
+        hand_landmarks = None
+        with self.sessions.session(MEDIAPIPE_DETECTION_CONFIDENCE) as hands_detector:
+            for candidate in candidates:
+                results = hands_detector.process(cv2.cvtColor(candidate, cv2.COLOR_BGR2RGB))
+                if results.multi_hand_landmarks:
+                    hand_landmarks = results.multi_hand_landmarks[0]
+                    break
+        
+        if hand_landmarks is None:
+            return 0, None
+        
+        scores = {angle: self.uprightness_score(self.rotate_landmarks(hand_landmarks, angle))
+                  for angle in ROTATION_ANGLES}
+        best_rotation = max(ROTATION_ANGLES, key=lambda angle: scores[angle])
+        logger.debug("Fast orientation: %d° (score=%.4f)", best_rotation, scores[best_rotation])
+        return best_rotation, hand_landmarks
+    
+    def orient_hand(self, img, mode=ORIENTATION_MODE, exif_rotation=None, prior=None):
+        '''
+        Rotate image so the hand is upright and return its landmarks
+        
+        Args:
+            img: BGR image
+            mode: 'fast' (single detection, landmarks rotated mathematically),
+                  'ordered' (rotations tried most likely first, stopping at
+                  the first upright one) or 'exhaustive' (detect on all four
+                  rotations and keep the best)
+            exif_rotation: Rotation recorded in EXIF (already applied to img),
+                or None when the file had no orientation tag
+            prior: Angle chosen for the previous image of the same session
+        
+        exif_rotation and prior only order the 'ordered' search. 'fast'
+        makes one MediaPipe pass whatever the hints, and 'exhaustive'
+        always tries every rotation.
+        
+        Returns:
+            (rotated_img, rotation_angle, hand_landmarks or None)
+        '''
+        if mode in ('ordered', 'exhaustive'):
+            if mode == 'ordered':
+                order = self.rotation_order(img.shape, exif_rotation, prior)
+                rotation_angle, hand_landmarks = self.search_rotations(img, order)
+            else:
+                rotation_angle, hand_landmarks = self.search_rotations(img, ROTATION_ANGLES, stop_score=None)
+            if ROTATION_MAP.get(rotation_angle) is not None:
+                img = cv2.rotate(img, ROTATION_MAP[rotation_angle])
+            return img, rotation_angle, hand_landmarks
+        if mode != 'fast':
+            raise ValueError(f"Unknown orientation mode: {mode}")
+        
+        rotation_angle, hand_landmarks = self.estimate_orientation(img)
+        if ROTATION_MAP.get(rotation_angle) is not None:
+            img = cv2.rotate(img, ROTATION_MAP[rotation_angle])
+        if hand_landmarks is not None:
+            hand_landmarks = self.rotate_landmarks(hand_landmarks, rotation_angle)
+        return img, rotation_angle, hand_landmarks
+    
+    @staticmethod
+    def rotation_order(shape, exif_rotation=None, prior=None):
+        '''
+        Candidate rotations, most likely first
+        
+        The session prior leads. A photo that carried EXIF orientation is
+        already display-upright, so 0° comes next. Otherwise the aspect
+        ratio decides: portrait favours 0°/180°, landscape 90°/270°.
+        '''
+        h, w = shape[:2]
+        order = [0, 180, 90, 270] if h >= w else [90, 270, 0, 180]
+        likely = []
+        if exif_rotation is not None:
+            likely.append(0)
+        if prior in order:
+            likely.append(prior)
+        
+        # Later entries move in front of earlier ones, so the prior ends up first
+        for angle in likely:
+            order.remove(angle)
+            order.insert(0, angle)
+        return order
+    
+    def search_rotations(self, img, order=ROTATION_ANGLES, stop_score=UPRIGHT_SCORE_THRESHOLD):
+        '''
+        Run MediaPipe on rotations of img in the given order
+        
+        Stops at the first rotation whose uprightness score reaches
+        stop_score (None searches every rotation).
+        
+        Returns:
+            (best angle, its landmarks in the rotated frame) or (0, None)
+        '''
+        best_rotation, best_score, best_landmarks = 0, -1, None
+        attempts = 0
+        
+        with self.sessions.session(MEDIAPIPE_DETECTION_CONFIDENCE) as hands_detector:
+            for angle in order:
+                test_img = img if ROTATION_MAP.get(angle) is None else cv2.rotate(img, ROTATION_MAP[angle])
+                results = hands_detector.process(cv2.cvtColor(test_img, cv2.COLOR_BGR2RGB))
+                attempts += 1
+                
+                if results.multi_hand_landmarks:
+                    landmarks = results.multi_hand_landmarks[0]
+                    score = self.uprightness_score(landmarks)
+                    logger.debug("Rotation %d°: score=%.4f", angle, score)
+                    
+                    if score > best_score:
+                        best_rotation, best_score, best_landmarks = angle, score, landmarks
+                    if stop_score is not None and score >= stop_score:
+                        break
+        
+        logger.debug("Rotation search: %d° after %d/%d passes", best_rotation, attempts, len(order))
+        return best_rotation, best_landmarks
+    
     def detect_and_rotate_to_portrait(self, img):
         '''Detect hand orientation and rotate image to portrait with hand upright'''
         h, w = img.shape[:2]
         
         # If already portrait, check if rotation needed
         if h > w:
-            print(f"Image is portrait ({w}x{h}), checking orientation...")
+            logger.debug("Image is portrait (%dx%d), checking orientation...", w, h)
         else:
-            print(f"Image is landscape ({w}x{h}), detecting hand orientation...")
+            logger.debug("Image is landscape (%dx%d), detecting hand orientation...", w, h)
         
         # Try all 4 rotations and pick the one where hand is most upright
-        best_rotation = 0
-        best_score = -1
-        
-        hands_detector = self.mp_hands.Hands(
-            static_image_mode=True,
-            max_num_hands=1,
-            min_detection_confidence=MEDIAPIPE_DETECTION_CONFIDENCE
-        )
-        
-        rotation_codes = [
-            None,  # 0 degrees (no rotation)
-            cv2.ROTATE_90_CLOCKWISE,  # 90 degrees
-            cv2.ROTATE_180,  # 180 degrees
-            cv2.ROTATE_90_COUNTERCLOCKWISE  # 270 degrees
-        ]
-        
-        for angle, rotate_code in zip(ROTATION_ANGLES, rotation_codes):
-            # Rotate image
-            if rotate_code is None:
-                test_img = img.copy()
-            else:
-                test_img = cv2.rotate(img, rotate_code)
-            
-            # Test if hand is detected and upright
-            test_rgb = cv2.cvtColor(test_img, cv2.COLOR_BGR2RGB)
-            results = hands_detector.process(test_rgb)
-            
-            if results.multi_hand_landmarks:
-                landmarks = results.multi_hand_landmarks[0]
-                
-                # Calculate uprightness score based on wrist (0) to middle finger tip (12)
-                wrist = landmarks.landmark[0]
-                middle_tip = landmarks.landmark[12]
-                
-                # Score: vertical distance (positive = finger above wrist)
-                vertical_distance = wrist.y - middle_tip.y
-                
-                # Also check palm orientation
-                index_base = landmarks.landmark[5]
-                pinky_base = landmarks.landmark[17]
-                
-                palm_center_y = (index_base.y + pinky_base.y) / 2
-                palm_upright_score = wrist.y - palm_center_y
-                
-                # Combined score
-                score = vertical_distance + palm_upright_score
-                
-                print(f"  Rotation {angle}°: score={score:.4f}")
-                
-                if score > best_score:
-                    best_score = score
-                    best_rotation = angle
-        
-        hands_detector.close()
+        best_rotation, _ = self.search_rotations(img, ROTATION_ANGLES, stop_score=None)
         
         # Apply best rotation
         if best_rotation == 0:
-            print("No rotation needed")
+            logger.debug("No rotation needed")
             return img, 0
         elif best_rotation == 90:
-            print("Rotating 90° clockwise to portrait")
+            logger.debug("Rotating 90° clockwise to portrait")
             return cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE), 90
         elif best_rotation == 180:
-            print("Rotating 180°")
+            logger.debug("Rotating 180°")
             return cv2.rotate(img, cv2.ROTATE_180), 180
         elif best_rotation == 270:
-            print("Rotating 90° counter-clockwise to portrait")
+            logger.debug("Rotating 90° counter-clockwise to portrait")
             return cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE), 270
         
         return img, 0
@@ -161,16 +379,166 @@ class HandDetector:
                            cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 0, 255), 1)
 
 
+class LineModelPool:
+    '''
+    Pool of YOLO model handles cloned from one loaded model
+
+    ultralytics keeps per-call state on the model (its predictor), so one
+    handle must never run two predictions at once. Handles are checked out
+    for the duration of a predict call. Single-threaded callers only ever
+    hold the one model they passed in; the first time a caller has to wait
+    for a handle, it clones the handle it gets back, up to ``max_instances``.
+    Torch releases the GIL during inference, so separate handles run truly
+    in parallel.
+    '''
+
+    def __init__(self, model, max_instances=LINE_MODEL_INSTANCES, factory=None):
+        if max_instances < 1:
+            raise ValueError(f"max_instances must be >= 1, got {max_instances}")
+        # factory (e.g. for runtime sessions that cannot be deep-copied) builds
+        # new handles without waiting instead of cloning a returned one
+        self.factory = factory
+        self.max_instances = max_instances
+        self._idle = [model]
+        self._cond = threading.Condition()
+        self.created = 1
+        self.waits = 0
+
+    @staticmethod
+    def clone(model):
+        '''Deep copy of an idle handle, leaving its predictor (threads, locks) behind'''
+        predictor = getattr(model, 'predictor', None)
+        return copy.deepcopy(model, {id(predictor): None} if predictor is not None else None)
+
+    def acquire(self):
+        '''Check out a model handle, cloning or waiting if none is idle'''
+        waited = False
+        with self._cond:
+            while not self._idle:
+                if self.factory is not None and self.created < self.max_instances:
+                    self.created += 1
+                    break
+                self.waits += 1
+                waited = True
+                self._cond.wait()
+            else:
+                model = self._idle.pop()
+                if not waited or self.factory is not None or self.created >= self.max_instances:
+                    return model
+                self.created += 1
+        if self.factory is not None:
+            return self.factory()
+        # Demand has outgrown the pool: copy the handle while no one predicts on it
+        self.release(self.clone(model))
+        return model
+
+    def release(self, model):
+        '''Return a checked-out handle'''
+        with self._cond:
+            self._idle.append(model)
+            self._cond.notify()
+
+    @contextmanager
+    def session(self):
+        '''Context manager wrapping acquire/release'''
+        model = self.acquire()
+        try:
+            yield model
+        finally:
+            self.release(model)
+
+    def stats(self):
+        '''Return created/idle handle counts and how often a caller had to wait'''
+        with self._cond:
+            return {'created': self.created, 'idle': len(self._idle), 'waits': self.waits,
+                    'max_instances': self.max_instances}
+
+
 class LineDetector:
-    def __init__(self, model_path):
-        self.model = YOLO(model_path)
+    def __init__(self, model_path, max_instances=LINE_MODEL_INSTANCES, num_threads=TORCH_NUM_THREADS,
+                 interop_threads=TORCH_INTEROP_THREADS, backend=LINE_BACKEND, int8=LINE_INT8):
+        '''
+        Args:
+            model_path: YOLO pose weights (or model YAML), or an exported
+                .onnx file / *_openvino_model directory
+            max_instances: Model handles available to concurrent callers;
+                1 serializes all predictions on a single handle
+            num_threads: Torch intra-op threads (process-wide); None keeps
+                the current setting
+            interop_threads: Torch inter-op threads; None keeps the current
+                setting
+            backend: 'torch', 'onnxruntime' or 'openvino'; the latter two
+                export model_path on first use (see core/export.py)
+            int8: Use the INT8-quantized export (onnxruntime)
+        '''
+        self.threads = self.configure_threads(num_threads, interop_threads)
+        self.backend = backend
+        self.model_path = resolve_line_model(model_path, backend, int8)
+        self.model = YOLO(self.model_path, task='pose')
+        factory = None
+        if backend != 'torch':
+            # Runtime sessions are loaded fresh rather than deep-copied
+            factory = lambda: YOLO(self.model_path, task='pose')
+        self.pool = LineModelPool(self.model, max_instances, factory)
     
-    def detect(self, image_path, conf=0.3, iou=0.4):
-        '''Detect palm lines using YOLO'''
-        results = self.model.predict(
-            source=image_path,
-            conf=conf,
-            iou=iou,
-            save=False
-        )
-        return results[0] if results else None
\ No newline at end of file
+    @staticmethod
+    def configure_threads(num_threads=None, interop_threads=None):
+        '''
+        Size torch's CPU thread pools for this process
+        
+        Intra-op threads split a single operator (e.g. a convolution);
+        inter-op threads run independent operators side by side. Torch only
+        accepts an inter-op size before its first parallel operation, so a
+        late change is logged and skipped.
+        
+        Returns:
+            (intra-op threads, inter-op threads) now in effect
+        '''
+        if num_threads is not None:
+            if num_threads < 1:
+                raise ValueError(f"num_threads must be >= 1, got {num_threads}")
+            torch.set_num_threads(num_threads)
+        if interop_threads is not None and interop_threads != torch.get_num_interop_threads():
+            if interop_threads < 1:
+                raise ValueError(f"interop_threads must be >= 1, got {interop_threads}")
+            try:
+                torch.set_num_interop_threads(interop_threads)
+            except RuntimeError as e:
+                logger.warning("Keeping %d inter-op threads: %s", torch.get_num_interop_threads(), e)
+        threads = (torch.get_num_threads(), torch.get_num_interop_threads())
+        logger.debug("Torch threads: %d intra-op, %d inter-op", *threads)
+        return threads
+    
+    def predict(self, source, conf, iou):
+        '''model.predict on a handle no other thread is using'''
+        with self.pool.session() as model:
+            return model.predict(
+                source=source,
+                conf=conf,
+                iou=iou,
+                save=False,
+                verbose=False
+            )
+    
+    def detect(self, image, conf=0.3, iou=0.4):
+        '''
+        Detect palm lines using YOLO
+        
+        Args:
+            image: BGR image as a numpy array (decoded in memory, no disk round trip)
+        '''
+        results = self.predict(image, conf, iou)
+        return results[0] if results else None
+    
+    def detect_batch(self, images, conf=0.3, iou=0.4):
+        '''Detect palm lines on a list of BGR arrays in a single forward pass'''
+        if not images:
+            return []
+        return list(self.predict(list(images), conf, iou))
+    
+    def detect_path(self, image_path, conf=0.3, iou=0.4):
+        '''Detect palm lines in an image file'''
+        img = cv2.imread(image_path)
+        if img is None:
+            raise ValueError(f"Could not load image: {image_path}")
+        return self.detect(img, conf=conf, iou=iou)
@@ -0,0 +1,197 @@
+'''
+Export the YOLO line model for ONNX Runtime or OpenVINO inference
+
+Exported models load back through ultralytics.YOLO, which runs them on
+the matching runtime and returns the same Results objects as PyTorch
+(``keypoints.xy``, ``boxes.cls``, ``boxes.conf``), so nothing downstream
+of LineDetector changes.
+
+Usage:
+    python core/export.py best.pt --backend onnxruntime
+    python core/export.py best.pt --backend onnxruntime --int8 --calibration palms/
+    python core/export.py best.pt --backend openvino
+'''
+import argparse
+import glob
+import os
+import shutil
+import sys
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+from ultralytics.data.augment import LetterBox
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import LINE_BACKEND, LINE_INT8, LINE_CALIBRATION_DIR, LINE_EXPORT_SIZE
+from logging_config import get_logger
+
+logger = get_logger('export')
+
+BACKENDS = ('torch', 'onnxruntime', 'openvino')
+
+# ultralytics export format for each runtime
+EXPORT_FORMATS = {'onnxruntime': 'onnx', 'openvino': 'openvino'}
+
+CALIBRATION_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def is_exported(model_path):
+    '''True for an ONNX file or an OpenVINO model directory'''
+    path = os.fspath(model_path).rstrip('/\\')
+    return path.endswith('.onnx') or path.endswith('_openvino_model')
+
+
+def exported_path(model_path, backend, int8=False):
+    '''Where export_line_model puts the model for backend (ultralytics naming)'''
+    stem = os.path.splitext(os.fspath(model_path))[0]
+    suffix = '_int8' if int8 else ''
+    if backend == 'onnxruntime':
+        return f"{stem}{suffix}.onnx"
+    if backend == 'openvino':
+        return f"{stem}{suffix}_openvino_model"
+    raise ValueError(f"Unknown line model backend: {backend}")
+
+
+def load_calibration_images(source, limit=64):
+    '''
+    BGR images for INT8 calibration
+
+    source is a directory, a glob pattern, or a list of paths and/or
+    decoded arrays. Use real palm photos; quantization ranges are taken
+    from the activations these produce.
+    '''
+    if isinstance(source, (str, os.PathLike)):
+        source = os.fspath(source)
+        pattern = os.path.join(source, '*') if os.path.isdir(source) else source
+        source = [path for path in sorted(glob.glob(pattern)) if path.lower().endswith(CALIBRATION_EXTENSIONS)]
+
+    images = []
+    for item in list(source)[:limit]:
+        img = cv2.imread(os.fspath(item)) if isinstance(item, (str, os.PathLike)) else item
+        if img is None:
+            logger.warning("Skipping unreadable calibration image %s", item)
+            continue
+        images.append(img)
+    if not images:
+        raise ValueError("INT8 export needs at least one calibration image")
+    return images
+
+
+class CalibrationReader:
+    '''Feeds letterboxed calibration images to onnxruntime's quantize_static'''
+
+    def __init__(self, images, input_name='images', imgsz=LINE_EXPORT_SIZE):
+        letterbox = LetterBox((imgsz, imgsz), auto=False)
+        self.batches = []
+        for img in images:
+            # Same preprocessing as ultralytics predict: letterbox, BGR->RGB, CHW, 0-1
+            x = letterbox(image=img)[..., ::-1].transpose(2, 0, 1)[None]
+            self.batches.append({input_name: np.ascontiguousarray(x, dtype=np.float32) / 255})
+        self._iter = iter(self.batches)
+
+    def get_next(self):
+        return next(self._iter, None)
+
+    def rewind(self):
+        self._iter = iter(self.batches)
+
+
+def quantize_onnx(onnx_path, output_path, calibration_images, imgsz=LINE_EXPORT_SIZE):
+    '''
+    Static INT8 (QDQ) quantization of an exported ONNX model
+
+    Weights are quantized per channel to int8 and activations to uint8,
+    with ranges calibrated on calibration_images. The result runs on
+    onnxruntime's CPU provider; dynamic quantization is not used because it
+    leaves convolutions in float.
+    '''
+    try:
+        import onnx
+        from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+    except ImportError as e:
+        raise ImportError("INT8 export needs onnx and onnxruntime: pip install onnx onnxruntime") from e
+
+    input_name = onnx.load(onnx_path, load_external_data=False).graph.input[0].name
+    reader = CalibrationReader(load_calibration_images(calibration_images), input_name, imgsz)
+    quantize_static(
+        onnx_path, output_path, reader,
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+    # ultralytics reads class names and strides from the model metadata
+    quantized = onnx.load(output_path)
+    if not quantized.metadata_props:
+        quantized.metadata_props.extend(onnx.load(onnx_path, load_external_data=False).metadata_props)
+        onnx.save(quantized, output_path)
+    return output_path
+
+
+def export_line_model(model_path, backend, int8=False, calibration_images=None, imgsz=LINE_EXPORT_SIZE):
+    '''
+    Export PyTorch weights for backend and return the exported model path
+
+    Models accept any input size (dynamic axes). int8 needs
+    calibration_images and is supported for 'onnxruntime' only.
+    '''
+    if backend not in EXPORT_FORMATS:
+        raise ValueError(f"Nothing to export for backend {backend!r}; expected one of {list(EXPORT_FORMATS)}")
+    if int8 and backend != 'onnxruntime':
+        raise ValueError("INT8 export is only supported for the onnxruntime backend")
+    if int8 and calibration_images is None:
+        raise ValueError("INT8 export needs calibration_images (a directory or a list of images)")
+
+    fp32_path = exported_path(model_path, backend)
+    logger.info("Exporting %s for %s%s", model_path, backend, " (INT8)" if int8 else "")
+    exported = YOLO(model_path).export(format=EXPORT_FORMATS[backend], dynamic=True, imgsz=imgsz)
+    exported = os.fspath(exported).rstrip('/\\')
+    if os.path.abspath(exported) != os.path.abspath(fp32_path):
+        if os.path.isdir(fp32_path):
+            shutil.rmtree(fp32_path)
+        os.replace(exported, fp32_path)
+
+    if not int8:
+        return fp32_path
+    return quantize_onnx(fp32_path, exported_path(model_path, backend, int8=True), calibration_images, imgsz)
+
+
+def resolve_line_model(model_path, backend=LINE_BACKEND, int8=LINE_INT8, calibration_images=LINE_CALIBRATION_DIR):
+    '''
+    Model path that ultralytics.YOLO should load for backend
+
+    'torch' and already-exported paths are returned unchanged. Otherwise
+    an export next to the weights is reused when it is newer than them,
+    and created (see export_line_model) when it is missing or stale.
+    '''
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown line model backend: {backend}")
+    if backend == 'torch' or is_exported(model_path):
+        return model_path
+
+    target = exported_path(model_path, backend, int8)
+    if os.path.exists(target) and (not os.path.exists(model_path)
+                                   or os.path.getmtime(target) >= os.path.getmtime(model_path)):
+        return target
+    return export_line_model(model_path, backend, int8, calibration_images)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the line model for ONNX Runtime or OpenVINO")
+    parser.add_argument('model', help="PyTorch weights, e.g. best.pt")
+    parser.add_argument('--backend', default='onnxruntime', choices=list(EXPORT_FORMATS))
+    parser.add_argument('--int8', action='store_true', help="Static INT8 quantization (onnxruntime only)")
+    parser.add_argument('--calibration', help="Directory or glob of palm images for INT8 calibration")
+    parser.add_argument('--imgsz', type=int, default=LINE_EXPORT_SIZE, help="Export/calibration image size")
+    args = parser.parse_args(argv)
+
+    path = export_line_model(args.model, args.backend, args.int8, args.calibration, args.imgsz)
+    print(f"Exported {args.model} -> {path}")
+    print(f"Set LINE_BACKEND = '{args.backend}'" + (" and LINE_INT8 = True" if args.int8 else "") + " in config.py")
+    return path
+
+
+if __name__ == '__main__':
+    main()
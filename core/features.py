@@ -1,5 +1,4 @@
 import numpy as np
-from scipy.spatial import distance
 import cv2
 import sys
 import os
@@ -11,38 +10,126 @@ from config import (BREAK_STD_DEV_THRESHOLD, BRANCH_DETECTION_RADIUS,
                     THICKNESS_DEEP_THRESHOLD, THICKNESS_MEDIUM_THRESHOLD,
                     CURVATURE_WAVY_OVERALL, CURVATURE_WAVY_LOCAL,
                     CURVATURE_CURVED_OVERALL, CURVATURE_CURVED_LOCAL)
-from utils import calculate_line_length
+from utils import (pack_lines, segment_mask, segment_lengths,
+                   batch_line_lengths, turning_angles)
+from logging_config import get_logger
+
+logger = get_logger('features')
+
+
+class ImageContext:
+    '''
+    Per-image preprocessing shared by all FeatureExtractor calls
+    
+    The grayscale and binary threshold maps are computed lazily, once per
+    image, instead of once per line or keypoint ROI.
+    '''
+    
+    def __init__(self, img):
+        self.img = img
+        self._gray = None
+        self._binary = None
+    
+    @classmethod
+    def wrap(cls, img):
+        '''Return img unchanged if it is already a context, else build one'''
+        return img if isinstance(img, cls) else cls(img)
+    
+    @property
+    def shape(self):
+        return self.img.shape
+    
+    @property
+    def gray(self):
+        if self._gray is None:
+            if self.img.ndim == 2:
+                self._gray = self.img
+            else:
+                self._gray = cv2.cvtColor(self.img, cv2.COLOR_BGR2GRAY)
+        return self._gray
+    
+    @property
+    def binary(self):
+        if self._binary is None:
+            _, self._binary = cv2.threshold(self.gray, 127, 255, cv2.THRESH_BINARY)
+        return self._binary
 
 
 class FeatureExtractor:
+    @staticmethod
+    def batch_curvature(lines, counts=None):
+        '''
+        Curvature for a whole batch of lines at once
+        
+        Args:
+            lines: (N, K, 2) keypoints, zero-padded past each line's count
+            counts: (N,) number of valid points per line (default: all K)
+        
+        Returns:
+            (overall_curvature, max_local_curvature), each of shape (N,)
+        '''
+        lines = np.asarray(lines, dtype=float)
+        n, k = lines.shape[:2]
+        counts = np.full(n, k) if counts is None else np.asarray(counts)
+        
+        overall = np.zeros(n)
+        max_local = np.zeros(n)
+        usable = counts >= 3
+        if k < 3 or not np.any(usable):
+            return overall, max_local
+        
+        rows = np.arange(n)
+        actual_length = batch_line_lengths(lines, counts)
+        ends = lines[rows, np.maximum(counts - 1, 0)]
+        straight = np.hypot(*(ends - lines[:, 0]).T)
+        usable &= straight != 0
+        
+        safe_straight = np.where(usable, straight, 1.0)
+        overall = np.where(usable, (actual_length - straight) / safe_straight, 0.0)
+        
+        angles = turning_angles(lines)
+        angles = np.where(segment_mask(counts, k, span=2) & ~np.isnan(angles), angles, -np.inf)
+        max_local = np.where(usable, np.max(angles, axis=1), 0.0)
+        max_local[np.isinf(max_local)] = 0.0
+        return overall, max_local
+
     @staticmethod
     def calculate_curvature_improved(keypoints):
         '''Improved curvature calculation'''
         if len(keypoints) < 3:
             return 0, 0
         
-        actual_length = calculate_line_length(keypoints)
-        straight_distance = distance.euclidean(keypoints[0], keypoints[-1])
+        overall, max_local = FeatureExtractor.batch_curvature(np.asarray(keypoints)[None])
+        return overall[0], max_local[0]
+
+    @staticmethod
+    def batch_breaks(lines, counts=None):
+        '''
+        Adaptive break detection for a whole batch of lines at once
         
-        if straight_distance == 0:
-            return 0, 0
+        Returns:
+            (num_breaks of shape (N,), list of break-position lists)
+        '''
+        lines = np.asarray(lines, dtype=float)
+        n, k = lines.shape[:2]
+        counts = np.full(n, k) if counts is None else np.asarray(counts)
         
-        overall_curvature = (actual_length - straight_distance) / straight_distance
+        if k < 2:
+            return np.zeros(n, dtype=int), [[] for _ in range(n)]
         
-        angles = []
-        for i in range(1, len(keypoints) - 1):
-            vec1 = np.array(keypoints[i]) - np.array(keypoints[i-1])
-            vec2 = np.array(keypoints[i+1]) - np.array(keypoints[i])
-            norm1 = np.linalg.norm(vec1)
-            norm2 = np.linalg.norm(vec2)
-            
-            if norm1 > 0 and norm2 > 0:
-                cos_angle = np.clip(np.dot(vec1, vec2) / (norm1 * norm2), -1.0, 1.0)
-                angle = np.arccos(cos_angle)
-                angles.append(np.degrees(angle))
+        valid = segment_mask(counts, k)
+        gaps = np.where(valid, segment_lengths(lines), np.nan)
+        has_gaps = valid.any(axis=1)
         
-        max_local_curvature = max(angles) if angles else 0
-        return overall_curvature, max_local_curvature
+        # Rows without gaps are filled so the nan-reductions stay warning-free
+        filled = np.where(has_gaps[:, None], gaps, 0.0)
+        median_gap = np.nanmedian(filled, axis=1)
+        std_gap = np.nanstd(filled, axis=1)
+        break_threshold = median_gap + BREAK_STD_DEV_THRESHOLD * std_gap
+        
+        is_break = valid & (np.where(valid, gaps, -np.inf) > break_threshold[:, None])
+        positions = [np.flatnonzero(row).tolist() for row in is_break]
+        return is_break.sum(axis=1), positions
 
     @staticmethod
     def detect_breaks_adaptive(keypoints):
@@ -50,32 +137,47 @@ class FeatureExtractor:
         if len(keypoints) < 2:
             return 0, []
         
-        gaps = []
-        for i in range(len(keypoints) - 1):
-            gap = distance.euclidean(keypoints[i], keypoints[i+1])
-            gaps.append(gap)
+        num_breaks, positions = FeatureExtractor.batch_breaks(np.asarray(keypoints)[None])
+        return int(num_breaks[0]), positions[0]
+
+    @staticmethod
+    def extract_geometry_batch(lines):
+        '''
+        Length, curvature and break features for all lines of an image in one call
         
-        if not gaps:
-            return 0, []
+        Args:
+            lines: list of (K_i, 2) keypoint arrays
         
-        median_gap = np.median(gaps)
-        std_gap = np.std(gaps)
-        break_threshold = median_gap + BREAK_STD_DEV_THRESHOLD * std_gap
+        Returns:
+            list of per-line geometry dicts, in input order
+        '''
+        if not len(lines):
+            return []
         
-        breaks = []
-        for i, gap in enumerate(gaps):
-            if gap > break_threshold:
-                breaks.append(i)
+        packed, counts = pack_lines(lines)
+        lengths = batch_line_lengths(packed, counts)
+        overall, max_local = FeatureExtractor.batch_curvature(packed, counts)
+        num_breaks, positions = FeatureExtractor.batch_breaks(packed, counts)
         
-        return len(breaks), breaks
+        return [
+            {
+                'length': float(lengths[i]),
+                'curvature_ratio': float(overall[i]),
+                'max_local_curvature': float(max_local[i]),
+                'breaks': int(num_breaks[i]),
+                'break_positions': positions[i],
+            }
+            for i in range(len(lines))
+        ]
 
     @staticmethod
     def detect_actual_branches(keypoints, img, radius=BRANCH_DETECTION_RADIUS):
-        '''Detect actual branches/forks'''
+        '''Detect actual branches/forks (img may be an array or an ImageContext)'''
         if len(keypoints) < 3:
             return {'upward': 0, 'downward': 0, 'forks': 0}
         
         branches = {'upward': 0, 'downward': 0, 'forks': 0}
+        binary_map = ImageContext.wrap(img).binary
         
         for i in range(1, len(keypoints) - 1):
             x, y = int(keypoints[i][0]), int(keypoints[i][1])
@@ -83,11 +185,7 @@ class FeatureExtractor:
             if x < radius or y < radius or x >= img.shape[1] - radius or y >= img.shape[0] - radius:
                 continue
             
-            roi = img[y-radius:y+radius, x-radius:x+radius]
-            if len(roi.shape) == 3:
-                roi = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-            
-            _, binary = cv2.threshold(roi, 127, 255, cv2.THRESH_BINARY)
+            binary = binary_map[y-radius:y+radius, x-radius:x+radius]
             num_labels, labels = cv2.connectedComponents(binary)
             
             if num_labels > 2:
@@ -104,47 +202,50 @@ class FeatureExtractor:
 
     @staticmethod
     def calculate_line_thickness(keypoints, img, sample_points=THICKNESS_SAMPLE_POINTS):
-        '''Calculate average line thickness'''
+        '''
+        Calculate average line thickness
+        
+        Walks the perpendicular at each sample point until the first bright
+        pixel; all rays for all sample points are gathered in one indexing
+        pass. With an ImageContext the shared grayscale map is sampled,
+        otherwise only the gathered pixels are converted.
+        '''
         if len(keypoints) < 2:
             return 1
         
-        thicknesses = []
+        keypoints = np.asarray(keypoints)
         indices = np.linspace(0, len(keypoints)-1, min(sample_points, len(keypoints)), dtype=int)
+        indices = indices[indices < len(keypoints) - 1]
         
-        for idx in indices:
-            if idx >= len(keypoints) - 1:
-                continue
-            
-            vec = np.array(keypoints[min(idx+1, len(keypoints)-1)]) - np.array(keypoints[idx])
-            vec_len = np.linalg.norm(vec)
-            
-            if vec_len == 0:
-                continue
-            
-            perp = np.array([-vec[1], vec[0]]) / vec_len
-            center = keypoints[idx]
-            thickness = 0
-            
-            for dist in range(1, MAX_THICKNESS_SEARCH):
-                sample_pos = center + perp * dist
-                x, y = int(sample_pos[0]), int(sample_pos[1])
-                
-                if x < 0 or y < 0 or x >= img.shape[1] or y >= img.shape[0]:
-                    break
-                
-                if len(img.shape) == 3:
-                    pixel_val = cv2.cvtColor(img[y:y+1, x:x+1], cv2.COLOR_BGR2GRAY)[0, 0]
-                else:
-                    pixel_val = img[y, x]
-                
-                if pixel_val < 128:
-                    thickness += 1
-                else:
-                    break
-            
-            thicknesses.append(thickness * 2)
+        vecs = keypoints[indices + 1] - keypoints[indices]
+        vec_lens = np.linalg.norm(vecs, axis=1)
+        keep = vec_lens != 0
+        if not np.any(keep):
+            return 1
+        
+        vecs, vec_lens = vecs[keep], vec_lens[keep]
+        perps = np.stack([-vecs[:, 1], vecs[:, 0]], axis=1) / vec_lens[:, None]
+        centers = keypoints[indices[keep]]
+        
+        # (samples, steps, 2) positions along every perpendicular ray
+        dists = np.arange(1, MAX_THICKNESS_SEARCH, dtype=perps.dtype)
+        positions = centers[:, None, :] + perps[:, None, :] * dists[None, :, None]
+        xs = np.trunc(positions[..., 0]).astype(np.int64)
+        ys = np.trunc(positions[..., 1]).astype(np.int64)
+        
+        h, w = img.shape[:2]
+        in_bounds = (xs >= 0) & (ys >= 0) & (xs < w) & (ys < h)
+        source = img.gray if isinstance(img, ImageContext) else img
+        values = source[np.clip(ys, 0, h - 1), np.clip(xs, 0, w - 1)]
+        if values.ndim == 3:
+            # Convert only the gathered (samples, steps) pixels, not the whole image
+            values = cv2.cvtColor(np.ascontiguousarray(values), cv2.COLOR_BGR2GRAY)
+        
+        # Count dark pixels up to the first bright or out-of-bounds step
+        dark = in_bounds & (values < 128)
+        thicknesses = np.cumprod(dark, axis=1).sum(axis=1) * 2
         
-        return np.mean(thicknesses) if thicknesses else 1
+        return np.mean(thicknesses)
 
     @staticmethod
     def classify_thickness(thickness):
@@ -167,35 +268,50 @@ class FeatureExtractor:
             return 'straight'
 
     @staticmethod
-    def extract_features_improved(keypoints, img):
-        '''Extract all features with improved methods'''
+    def assemble_features(keypoints, geometry, branches, thickness):
+        '''Build the feature dict from geometry plus the pixel-based measurements'''
         features = {}
+        features['length'] = geometry['length']
+        
+        features['curvature_ratio'] = geometry['curvature_ratio']
+        features['max_local_curvature'] = geometry['max_local_curvature']
+        features['curvature'] = FeatureExtractor.classify_curvature_improved(
+            geometry['curvature_ratio'], geometry['max_local_curvature']
+        )
+        
+        features['breaks'] = geometry['breaks']
+        features['break_positions'] = geometry['break_positions']
+        
+        features['branches'] = branches
+        
+        features['thickness'] = thickness
+        features['depth'] = FeatureExtractor.classify_thickness(thickness)
+        
+        features['start_point'] = tuple(keypoints[0])
+        features['end_point'] = tuple(keypoints[-1])
+        return features
+
+    @staticmethod
+    def extract_features_improved(keypoints, img, geometry=None):
+        '''
+        Extract all features with improved methods
+        
+        Pass an ImageContext built once per image to share its grayscale and
+        binary maps across lines; a plain array gets its own context.
+        ``geometry`` may carry this line's entry from extract_geometry_batch.
+        '''
+        ctx = ImageContext.wrap(img)
         
         try:
-            length = calculate_line_length(keypoints)
-            features['length'] = length
-            
-            overall_curv, max_local_curv = FeatureExtractor.calculate_curvature_improved(keypoints)
-            features['curvature_ratio'] = overall_curv
-            features['max_local_curvature'] = max_local_curv
-            features['curvature'] = FeatureExtractor.classify_curvature_improved(overall_curv, max_local_curv)
-            
-            num_breaks, break_positions = FeatureExtractor.detect_breaks_adaptive(keypoints)
-            features['breaks'] = num_breaks
-            features['break_positions'] = break_positions
-            
-            branches = FeatureExtractor.detect_actual_branches(keypoints, img)
-            features['branches'] = branches
-            
-            thickness = FeatureExtractor.calculate_line_thickness(keypoints, img)
-            features['thickness'] = thickness
-            features['depth'] = FeatureExtractor.classify_thickness(thickness)
+            if geometry is None:
+                geometry = FeatureExtractor.extract_geometry_batch([keypoints])[0]
             
-            features['start_point'] = tuple(keypoints[0])
-            features['end_point'] = tuple(keypoints[-1])
+            branches = FeatureExtractor.detect_actual_branches(keypoints, ctx)
+            thickness = FeatureExtractor.calculate_line_thickness(keypoints, ctx)
+            features = FeatureExtractor.assemble_features(keypoints, geometry, branches, thickness)
             
         except Exception as e:
-            print(f"Error in feature extraction: {e}")
+            logger.warning("Error in feature extraction: %s", e)
             features = {
                 'length': 0, 'length_class': 'unknown',
                 'curvature': 'unknown', 'breaks': 0,
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+PIPELINE_STAGES = ['load', 'standardize', 'rotation', 'landmarks', 'mounts',
+                   'yolo', 'features', 'interpret', 'draw', 'cache']
+
+_NULL_CONTEXT = nullcontext()
+
+
+class StageTimer:
+    '''
+    Records wall-clock duration and call count per stage for one pipeline call
+    
+    Hooks are called as ``hook(stage, elapsed_ms)`` after every timed block.
+    '''
+    
+    enabled = True
+    
+    def __init__(self, hooks=()):
+        self.hooks = list(hooks)
+        self.durations = {}
+        self.counts = {}
+        self._start = time.perf_counter()
+    
+    @contextmanager
+    def stage(self, name, count=1):
+        '''Time a block; ``count`` is added to the stage's call count'''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000, count)
+    
+    def add(self, name, elapsed_ms, count=1):
+        '''Record an externally measured duration (e.g. a share of a batch)'''
+        self.durations[name] = self.durations.get(name, 0.0) + elapsed_ms
+        self.counts[name] = self.counts.get(name, 0) + count
+        for hook in self.hooks:
+            hook(name, elapsed_ms)
+    
+    def as_dict(self):
+        '''Structured per-call timings: {'stages': {name: {'ms', 'count'}}, 'total_ms'}'''
+        return {
+            'stages': {
+                name: {'ms': self.durations[name], 'count': self.counts[name]}
+                for name in self.durations
+            },
+            'total_ms': (time.perf_counter() - self._start) * 1000,
+        }
+
+
+class NullTimer:
+    '''Drop-in StageTimer that records nothing'''
+    
+    enabled = False
+    
+    def stage(self, name, count=1):
+        return _NULL_CONTEXT
+    
+    def add(self, name, elapsed_ms, count=1):
+        pass
+    
+    def as_dict(self):
+        return None
+
+
+NULL_TIMER = NullTimer()
+
+
+class StageMetrics:
+    '''
+    Rolling per-stage latency percentiles across pipeline calls
+    
+    Keeps the last ``window`` samples per stage; safe to update from
+    several threads and to scrape concurrently.
+    '''
+    
+    QUANTILES = (50, 95, 99)
+    
+    def __init__(self, window=1000):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+    
+    def record(self, timings):
+        '''Add one call's StageTimer.as_dict() output'''
+        if not timings:
+            return
+        with self._lock:
+            self.calls += 1
+            for name, stats in timings['stages'].items():
+                self._samples.setdefault(name, deque(maxlen=self.window)).append(stats['ms'])
+            self._samples.setdefault('total', deque(maxlen=self.window)).append(timings['total_ms'])
+    
+    def snapshot(self):
+        '''{stage: {'count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms'}} over the window'''
+        with self._lock:
+            samples = {name: np.fromiter(values, dtype=float) for name, values in self._samples.items()}
+        
+        snapshot = {}
+        for name, values in samples.items():
+            quantiles = np.percentile(values, self.QUANTILES)
+            snapshot[name] = {
+                'count': int(values.size),
+                'mean_ms': float(values.mean()),
+                **{f"p{q}_ms": float(v) for q, v in zip(self.QUANTILES, quantiles)},
+            }
+        return snapshot
+    
+    def render_prometheus(self, prefix='palm_pipeline'):
+        '''Prometheus text exposition of the rolling percentiles'''
+        lines = [
+            f"# HELP {prefix}_stage_seconds Rolling stage latency quantiles",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for name, stats in sorted(self.snapshot().items()):
+            for q in self.QUANTILES:
+                lines.append(f'{prefix}_stage_seconds{{stage="{name}",quantile="{q / 100}"}} '
+                             f'{stats[f"p{q}_ms"] / 1000:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {stats["count"]}')
+        lines.append(f"{prefix}_calls_total {self.calls}")
+        return "\n".join(lines) + "\n"
+    
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self.calls = 0
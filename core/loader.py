@@ -0,0 +1,135 @@
+import os
+import struct
+import sys
+
+import cv2
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import REDUCED_DECODE
+from logging_config import get_logger
+
+logger = get_logger('loader')
+
+# libjpeg can decode directly at 1/2, 1/4 and 1/8 scale (DCT scaling)
+REDUCED_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+}
+
+# EXIF orientation -> clockwise rotation that makes the stored pixels upright
+EXIF_ROTATION = {1: 0, 2: 0, 3: 180, 4: 180, 5: 90, 6: 90, 7: 270, 8: 270}
+
+_EXIF_ORIENTATION_TAG = 0x0112
+# Start-of-frame markers carry the image size (C4, C8 and CC are not SOFs)
+_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _parse_exif_orientation(data):
+    '''Orientation value from the payload of an APP1 Exif segment, or None'''
+    if not data.startswith(b'Exif\x00\x00') or len(data) < 14:
+        return None
+    tiff = data[6:]
+    byte_order = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+    if byte_order is None:
+        return None
+
+    ifd_offset = struct.unpack(byte_order + 'I', tiff[4:8])[0]
+    if ifd_offset + 2 > len(tiff):
+        return None
+    (num_entries,) = struct.unpack(byte_order + 'H', tiff[ifd_offset:ifd_offset + 2])
+    for i in range(num_entries):
+        entry = tiff[ifd_offset + 2 + 12 * i: ifd_offset + 14 + 12 * i]
+        if len(entry) < 12:
+            break
+        tag, _, _ = struct.unpack(byte_order + 'HHI', entry[:8])
+        if tag == _EXIF_ORIENTATION_TAG:
+            return struct.unpack(byte_order + 'H', entry[8:10])[0]
+    return None
+
+
+def read_jpeg_header(path):
+    '''
+    Read a JPEG's stored size and EXIF orientation without decoding pixels
+
+    Returns:
+        ((width, height), orientation) where orientation is None when the
+        file has no EXIF orientation tag, or None if path is not a JPEG
+    '''
+    orientation = None
+    with open(path, 'rb') as f:
+        if f.read(2) != b'\xff\xd8':
+            return None
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+            # Fill bytes before a marker are allowed
+            while marker[1] == 0xFF:
+                next_byte = f.read(1)
+                if not next_byte:
+                    return None
+                marker = marker[1:] + next_byte
+            code = marker[1]
+            if code == 0x01 or 0xD0 <= code <= 0xD7:
+                continue
+
+            length_bytes = f.read(2)
+            if len(length_bytes) < 2:
+                return None
+            (length,) = struct.unpack('>H', length_bytes)
+            if code == 0xE1 and orientation is None:
+                orientation = _parse_exif_orientation(f.read(length - 2))
+            elif code in _SOF_MARKERS:
+                height, width = struct.unpack('>xHH', f.read(5))
+                return (width, height), orientation
+            elif code == 0xDA:
+                return None
+            else:
+                f.seek(length - 2, os.SEEK_CUR)
+
+
+def reduction_for(size, target_size):
+    '''Largest DCT reduction (8, 4, 2 or 1) that keeps the longer edge >= target_size'''
+    longest = max(size)
+    for factor in sorted(REDUCED_FLAGS, reverse=True):
+        if longest // factor >= target_size:
+            return factor
+    return 1
+
+
+def load_image(path, target_size=None, reduced=REDUCED_DECODE):
+    '''
+    Decode an image as BGR, at reduced scale when that is free
+
+    JPEGs much larger than ``target_size`` are decoded with libjpeg's DCT
+    scaling (cv2.IMREAD_REDUCED_COLOR_2/4/8), which skips most of the
+    IDCT and colour conversion work. The longer edge never drops below
+    target_size, so standardization still only shrinks. As with
+    cv2.imread, EXIF orientation is applied to the pixels.
+
+    Returns:
+        (img or None if unreadable, info) where info holds 'orientation'
+        (EXIF value or None), 'exif_rotation' (clockwise degrees the camera
+        recorded; already applied to img), 'reduction' and 'stored_size'
+    '''
+    try:
+        header = read_jpeg_header(path)
+    except (OSError, struct.error) as e:
+        logger.debug("No JPEG header for %s: %s", path, e)
+        header = None
+    info = {'orientation': None, 'exif_rotation': None, 'reduction': 1, 'stored_size': None}
+    flag = cv2.IMREAD_COLOR
+
+    if header is not None:
+        info['stored_size'], info['orientation'] = header
+        info['exif_rotation'] = EXIF_ROTATION.get(info['orientation'])
+        if reduced and target_size:
+            info['reduction'] = reduction_for(info['stored_size'], target_size)
+            flag = REDUCED_FLAGS.get(info['reduction'], cv2.IMREAD_COLOR)
+
+    img = cv2.imread(path, flag)
+    if img is not None and info['reduction'] > 1:
+        logger.debug("Decoded %s at 1/%d scale: %dx%d", path, info['reduction'], img.shape[1], img.shape[0])
+    return img, info
@@ -0,0 +1,86 @@
+'''JSON shapes returned by the pipeline when rendering is disabled'''
+import os
+import sys
+from typing import Dict, List, Optional, TypedDict, Union
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import to_jsonable
+
+
+class Branches(TypedDict):
+    upward: int
+    downward: int
+    forks: int
+
+
+class LineFeatures(TypedDict, total=False):
+    length: float
+    length_class: str
+    curvature: str
+    curvature_ratio: float
+    max_local_curvature: float
+    breaks: int
+    break_positions: List[int]
+    branches: Branches
+    thickness: float
+    depth: str
+    start_point: List[float]
+    end_point: List[float]
+
+
+class LineReading(TypedDict):
+    features: LineFeatures
+    interpretation: Optional[str]
+
+
+class PalmReport(TypedDict):
+    hand_detected: bool
+    interpretations: Dict[str, LineReading]
+    mounts: Dict[str, Union[List[float], float]]
+    timings: Optional[dict]
+
+
+def plain_readings(interpretations, mounts):
+    '''
+    Interpretations and mounts in the form every rendered result carries
+
+    Interpretations become JSON-style dicts and lists (numpy values to
+    Python numbers, tuples to lists); mount points stay numpy arrays and
+    scalars become floats. Fresh and cached results share this form, so a
+    cache hit is indistinguishable from a miss.
+    '''
+    if interpretations is not None:
+        interpretations = to_jsonable(interpretations)
+    if mounts is not None:
+        mounts = {name: (np.array(v) if isinstance(v, list) else v) for name, v in to_jsonable(mounts).items()}
+    return interpretations, mounts
+
+
+def build_report(interpretations, mounts, timings=None) -> PalmReport:
+    '''
+    Convert pipeline outputs into a PalmReport of plain Python types
+
+    numpy arrays become lists, numpy scalars become int/float and point
+    tuples (``start_point``/``end_point``) become [x, y] float lists, so the
+    report can be passed straight to json.dumps.
+    '''
+    if interpretations is None:
+        return PalmReport(hand_detected=False, interpretations={}, mounts={}, timings=timings)
+
+    readings = {}
+    for line_name, data in interpretations.items():
+        features = to_jsonable(data.get('features', {}))
+        for key in ('start_point', 'end_point'):
+            if key in features:
+                features[key] = [float(v) for v in features[key]]
+        readings[line_name] = LineReading(features=features, interpretation=data.get('interpretation'))
+
+    return PalmReport(
+        hand_detected=True,
+        interpretations=readings,
+        mounts=to_jsonable(mounts or {}),
+        timings=timings,
+    )
@@ -0,0 +1,301 @@
+'''Run a chain of per-item functions as threads joined by bounded queues'''
+import queue
+import threading
+import time
+import weakref
+
+_END = object()
+_POLL_SECONDS = 0.1
+
+
+class Done:
+    '''Stage output that skips the remaining stages (e.g. no hand found)'''
+
+    __slots__ = ('result',)
+
+    def __init__(self, result):
+        self.result = result
+
+
+class _Failure:
+    __slots__ = ('error', 'stage')
+
+    def __init__(self, error, stage):
+        self.error = error
+        self.stage = stage
+
+
+class StageError(RuntimeError):
+    '''
+    A stage raised while processing one item
+
+    ``index`` and ``stage`` identify the item and where it failed; the
+    original exception is chained as ``__cause__``. The stream stays usable.
+    '''
+
+    def __init__(self, index, stage, error):
+        super().__init__(f"Item {index} failed in stage {stage!r}: {error}")
+        self.index = index
+        self.stage = stage
+
+
+class Stage:
+    '''One step of a StagedRunner: ``fn(payload) -> payload or Done(result)``'''
+
+    def __init__(self, name, fn, workers=1):
+        if workers < 1:
+            raise ValueError(f"Stage {name!r} needs at least one worker, got {workers}")
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+
+
+class _StageThreads:
+    '''
+    Queues, counters and threads behind a StageStream
+
+    Kept apart from the stream so the threads hold no reference to it:
+    a dropped stream is collected and its finalizer stops them.
+    '''
+
+    def __init__(self, stages, queue_size, window, items):
+        self.stages = stages
+        self.stop = threading.Event()
+        self.queues = [queue.Queue(queue_size) for _ in stages] + [queue.Queue(window)]
+        # One slot per item between the input and the consumer bounds the
+        # output queue and the reorder buffer behind a slow item
+        self.slots = threading.Semaphore(window)
+        self.busy = {stage.name: 0.0 for stage in stages}
+        self.starved = {stage.name: 0.0 for stage in stages}
+        self.blocked = {stage.name: 0.0 for stage in stages}
+        self.items = {stage.name: 0 for stage in stages}
+        self.lock = threading.Lock()
+
+        self.threads = [threading.Thread(target=self.feed, args=(items,), name='stage-feed', daemon=True)]
+        for position, stage in enumerate(stages):
+            remaining = [stage.workers]
+            for i in range(stage.workers):
+                self.threads.append(threading.Thread(
+                    target=self.work, args=(position, stage, remaining),
+                    name=f"stage-{stage.name}-{i}", daemon=True,
+                ))
+        for thread in self.threads:
+            thread.start()
+
+    def put(self, q, item):
+        '''Blocking put that gives up once the stream is stopped'''
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, q):
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _END
+
+    def acquire_slot(self):
+        while not self.stop.is_set():
+            if self.slots.acquire(timeout=_POLL_SECONDS):
+                return True
+        return False
+
+    def feed(self, items):
+        items = iter(items)
+        count = 0
+        try:
+            # Take a slot before reading, so the input is only read when there is room
+            while self.acquire_slot():
+                try:
+                    item = next(items)
+                except StopIteration:
+                    self.slots.release()
+                    return
+                if not self.put(self.queues[0], (count, item)):
+                    return
+                count += 1
+        except Exception as e:
+            # A failing input iterator ends the stream after what was read
+            self.put(self.queues[-1], (count, _Failure(e, 'input')))
+        finally:
+            for _ in range(self.stages[0].workers):
+                self.put(self.queues[0], _END)
+
+    def work(self, position, stage, remaining):
+        inbox, outbox = self.queues[position], self.queues[position + 1]
+        is_last = position == len(self.stages) - 1
+
+        while True:
+            waited = time.perf_counter()
+            entry = self.get(inbox)
+            got = time.perf_counter()
+            if entry is _END:
+                break
+
+            index, payload = entry
+            try:
+                payload = stage.fn(payload)
+            except Exception as e:
+                payload = _Failure(e, stage.name)
+            spent = time.perf_counter() - got
+
+            # Finished items (and failures) go straight to the output
+            finished = is_last or isinstance(payload, (Done, _Failure))
+            if is_last and not isinstance(payload, (Done, _Failure)):
+                payload = Done(payload)
+
+            put_start = time.perf_counter()
+            delivered = self.put(self.queues[-1] if finished else outbox, (index, payload))
+            with self.lock:
+                self.starved[stage.name] += got - waited
+                self.busy[stage.name] += spent
+                self.blocked[stage.name] += time.perf_counter() - put_start
+                self.items[stage.name] += 1
+            if not delivered:
+                return
+
+        with self.lock:
+            remaining[0] -= 1
+            last_worker = remaining[0] == 0
+        if not last_worker:
+            return
+        # One end marker per downstream worker, or one for the consumer
+        downstream = 1 if is_last else self.stages[position + 1].workers
+        for _ in range(downstream):
+            self.put(outbox, _END)
+
+
+class StageStream:
+    '''
+    Iterator over (index, result) pairs of one StagedRunner.run call
+
+    A stage exception is raised as StageError when its item is reached;
+    iteration can continue past it. At most ``window`` items are between
+    the input and the consumer at once, including finished items held back
+    for ordering, so a slow consumer or a slow item stalls the input
+    rather than buffering it. Closing the stream (also on leaving a
+    ``with`` block, or once the stream is garbage collected) stops every
+    stage thread.
+    '''
+
+    def __init__(self, runner, items, ordered):
+        self.runner = runner
+        self.ordered = ordered
+        self.window = runner.queue_size * len(runner.stages) + sum(stage.workers for stage in runner.stages)
+        self._start = time.perf_counter()
+        self._end = None
+        self._buffered = {}
+        self._next_index = 0
+        self._finished = False
+        self._threads = _StageThreads(runner.stages, runner.queue_size, self.window, items)
+        self._finalizer = weakref.finalize(self, self._threads.stop.set)
+
+    def __iter__(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __next__(self):
+        outbox = self._threads.queues[-1]
+        while True:
+            if self.ordered and self._next_index in self._buffered:
+                index = self._next_index
+                self._next_index += 1
+                return index, self._release(index, self._buffered.pop(index))
+            if self._finished:
+                if self._buffered:
+                    index = min(self._buffered)
+                    return index, self._release(index, self._buffered.pop(index))
+                self._shutdown()
+                raise StopIteration
+
+            entry = self._threads.get(outbox)
+            if entry is _END:
+                self._finished = True
+                continue
+            index, done = entry
+            if not self.ordered:
+                return index, self._release(index, done)
+            self._buffered[index] = done
+
+    def _release(self, index, done):
+        '''Hand an item to the consumer, freeing its slot for the next input'''
+        self._threads.slots.release()
+        if isinstance(done, _Failure):
+            raise StageError(index, done.stage, done.error) from done.error
+        return done.result
+
+    def _shutdown(self):
+        if self._end is None:
+            self._end = time.perf_counter()
+        self._finalizer()
+
+    def close(self):
+        '''Stop all stage threads; items still in flight are dropped'''
+        self._shutdown()
+        for thread in self._threads.threads:
+            thread.join()
+
+    def stats(self):
+        '''
+        Per-stage work and waiting, for spotting the bottleneck
+
+        ``utilization`` is busy time over wall time times workers; a stage
+        near 1.0 limits throughput while the others show ``starved_ms``
+        (waiting for input) or ``blocked_ms`` (waiting for room downstream).
+        '''
+        threads = self._threads
+        wall = (self._end or time.perf_counter()) - self._start
+        with threads.lock:
+            stages = {
+                stage.name: {
+                    'items': threads.items[stage.name],
+                    'workers': stage.workers,
+                    'busy_ms': threads.busy[stage.name] * 1000,
+                    'starved_ms': threads.starved[stage.name] * 1000,
+                    'blocked_ms': threads.blocked[stage.name] * 1000,
+                    'utilization': threads.busy[stage.name] / (wall * stage.workers) if wall > 0 else 0.0,
+                }
+                for stage in self.runner.stages
+            }
+        return {'wall_ms': wall * 1000, 'stages': stages}
+
+
+class StagedRunner:
+    '''
+    Threaded producer/consumer chain
+
+    Each Stage gets its own worker thread(s); stages are joined by queues
+    of at most ``queue_size`` items, so a slow stage holds back the ones
+    before it instead of letting work pile up in memory (see
+    StageStream.window for the bound on finished items). Item N+1 can be
+    in an early stage while item N is in a later one.
+    '''
+
+    def __init__(self, stages, queue_size=4):
+        if not stages:
+            raise ValueError("StagedRunner needs at least one stage")
+        if queue_size < 1:
+            raise ValueError(f"queue_size must be >= 1, got {queue_size}")
+        self.stages = list(stages)
+        self.queue_size = queue_size
+
+    def run(self, items, ordered=True):
+        '''
+        Start processing items (any iterable, consumed lazily)
+
+        Returns:
+            StageStream yielding (index, result) in input order, or in
+            completion order when ordered=False
+        '''
+        return StageStream(self, items, ordered)
@@ -1,39 +1,175 @@
+import atexit
+import contextvars
+import copy
+import json
 import logging
+import logging.handlers
+import queue
 import sys
+import uuid
+from contextlib import contextmanager
 from pathlib import Path
 
-def setup_logging(log_level: str = "INFO", log_file: str = None):
+LOGGER_NAME = 'palm_reader'
+
+# Request ID of the pipeline call currently running in this thread/task
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+# Background listener when setup_logging(use_queue=True) is active
+_queue_listener = None
+
+
+class RequestIdFilter(logging.Filter):
+    '''Attach the active request ID (or '-') to every record'''
+
+    def filter(self, record):
+        record.request_id = request_id_var.get() or '-'
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    '''One JSON object per line: timestamp, level, logger, message, request_id and extras'''
+
+    # Attributes present on every LogRecord; anything else came in via ``extra=``
+    _RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id'}
+
+    def format(self, record):
+        payload = {
+            'timestamp': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+        }
+        for key, value in record.__dict__.items():
+            if key not in self._RESERVED:
+                payload[key] = value
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Queued records carry the traceback as text (see TracebackQueueHandler)
+            payload['exception'] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class TracebackQueueHandler(logging.handlers.QueueHandler):
+    '''
+    QueueHandler that keeps the traceback apart from the message
+
+    The stock prepare() folds the traceback into the message and clears
+    exc_info, so formatters on the listener side cannot report it
+    separately. Here the message is merged with its arguments and the
+    traceback is kept as exc_text, which both formatters read.
+    '''
+
+    _traceback_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = record.exc_text or self._traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+@contextmanager
+def request_context(request_id=None):
+    '''
+    Tag log records emitted inside the block with a request ID
+
+    Nested contexts without an explicit ID keep the outer one, so a caller
+    (e.g. the web app) can set the ID and the pipeline will reuse it.
+    '''
+    if request_id is None:
+        request_id = request_id_var.get() or uuid.uuid4().hex[:12]
+    token = request_id_var.set(request_id)
+    try:
+        yield request_id
+    finally:
+        request_id_var.reset(token)
+
+
+def get_logger(name=None):
+    '''Logger under the application namespace, e.g. get_logger('pipeline')'''
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+
+def _stop_queue_listener():
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+
+def setup_logging(log_level: str = "INFO", log_file: str = None,
+                  json_format: bool = False, use_queue: bool = False):
     '''
     Configure logging for the application
-    
+
+    Safe to call repeatedly: handlers installed by a previous call are
+    replaced, never duplicated.
+
     Args:
         log_level: Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
         log_file: Optional file path to write logs
+        json_format: Emit one JSON object per line instead of plain text
+        use_queue: Hand records to a background thread so logging calls
+            never block on console or file I/O
     '''
     # Create logger
-    logger = logging.getLogger('palm_reader')
+    logger = logging.getLogger(LOGGER_NAME)
     logger.setLevel(getattr(logging, log_level.upper()))
-    
+    logger.propagate = False
+
+    # Drop handlers from earlier calls
+    _stop_queue_listener()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+    # Formatter
+    if json_format:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.DEBUG)
-    
-    # Formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-    
+    handlers = [console_handler]
+
     # File handler (optional)
     if log_file:
-        file_handler = logging.FileHandler(log_file)
-        file_handler.setLevel(logging.DEBUG)
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-    
+        Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+        handlers.append(logging.FileHandler(log_file))
+
+    for handler in handlers:
+        handler.setLevel(logging.DEBUG)
+        handler.setFormatter(formatter)
+
+    request_filter = RequestIdFilter()
+    if use_queue:
+        # The request ID must be captured on the calling thread, before queueing
+        global _queue_listener
+        log_queue = queue.SimpleQueue()
+        queue_handler = TracebackQueueHandler(log_queue)
+        queue_handler.addFilter(request_filter)
+        logger.addHandler(queue_handler)
+        _queue_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _queue_listener.start()
+    else:
+        for handler in handlers:
+            handler.addFilter(request_filter)
+            logger.addHandler(handler)
+
     return logger
 
+
+atexit.register(_stop_queue_listener)
+
 # Global logger instance
-logger = setup_logging()
\ No newline at end of file
+logger = setup_logging()
@@ -1,10 +1,18 @@
 import cv2
 import sys
 import os
+import json
+import glob
+import time
+import argparse
+import multiprocessing
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from pipeline import PalmReadingPipeline
+from core.export import resolve_line_model
+from core.stages import StageError
+from config import TORCH_NUM_THREADS
 from logging_config import logger
 
 
@@ -12,7 +20,7 @@ def process_palm_reading(image_path, yolo_model_path, output_dir='results'):
     """Main function to process palm reading with proper output naming"""
     
     try:
-        logger.info(f"Starting palm reading analysis for: {image_path}")
+        logger.info("Starting palm reading analysis for: %s", image_path)
         
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
@@ -28,7 +36,7 @@ def process_palm_reading(image_path, yolo_model_path, output_dir='results'):
         if result_img is not None:
             # Save result with proper naming
             cv2.imwrite(output_path, result_img)
-            logger.info(f"Result saved to: {output_path}")
+            logger.info("Result saved to: %s", output_path)
             
             # Print analysis header
             print("\n" + "=" * 70)
@@ -88,12 +96,250 @@ def process_palm_reading(image_path, yolo_model_path, output_dir='results'):
             return None, None, None
             
     except Exception as e:
-        logger.exception(f"Error during palm reading: {e}")
+        logger.exception("Error during palm reading: %s", e)
         print(f"\n❌ EXCEPTION: {e}")
         raise
 
 
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff')
+
+# Per-process pipeline, created once by the pool initializer
+_worker_pipeline = None
+
+
+def collect_image_paths(inputs, file_list=None):
+    """Expand directories, glob patterns and list files into image paths"""
+    candidates = []
+    
+    if file_list:
+        with open(file_list) as f:
+            candidates.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()  # walk subdirectories in a stable order so _N suffixes are deterministic
+                candidates.extend(os.path.join(root, name) for name in sorted(files))
+        elif glob.has_magic(item):
+            candidates.extend(sorted(glob.glob(item, recursive=True)))
+        else:
+            candidates.append(item)
+    
+    paths = []
+    seen = set()
+    for path in candidates:
+        if not path.lower().endswith(IMAGE_EXTENSIONS) or path in seen:
+            continue
+        seen.add(path)
+        paths.append(path)
+    return paths
+
+
+def assign_output_paths(image_paths, output_dir, extension='.jpg'):
+    """Map each input to <base>_result<extension>, suffixing _N until every name is unique"""
+    used = set()
+    jobs = []
+    for image_path in image_paths:
+        base_filename = os.path.splitext(os.path.basename(image_path))[0]
+        name, n = base_filename, 0
+        while name in used:
+            n += 1
+            name = f"{base_filename}_{n}"
+        used.add(name)
+        jobs.append((image_path, os.path.join(output_dir, f"{name}_result{extension}")))
+    return jobs
+
+
+def _init_worker(yolo_model_path, target_size, render=True, torch_threads=None):
+    """Load the models once per worker process"""
+    global _worker_pipeline
+    _worker_pipeline = PalmReadingPipeline(yolo_model_path, target_size=target_size, render=render,
+                                           torch_threads=torch_threads)
+
+
+def _save_result(result, output_path, render=True):
+    """Write an annotated image (or JSON report); returns (status, number of lines)"""
+    if not render:
+        found, interpretations = result['hand_detected'], result['interpretations']
+        if found:
+            with open(output_path, 'w') as f:
+                json.dump(result, f, indent=2)
+    else:
+        result_img, interpretations, _ = result
+        found = result_img is not None
+        if found:
+            cv2.imwrite(output_path, result_img)
+    if not found:
+        return 'no_hand', 0
+    return 'ok', len(interpretations)
+
+
+def _job_summary(image_path, output_path, status, num_lines, seconds, error=None):
+    return {
+        'image': image_path,
+        'output': output_path if status == 'ok' else None,
+        'status': status,
+        'lines': num_lines,
+        'seconds': seconds,
+        'error': error,
+    }
+
+
+def _process_job(job):
+    """Process one image in a worker and save its annotated result (or JSON report)"""
+    image_path, output_path = job
+    start = time.perf_counter()
+    try:
+        result = _worker_pipeline.process(image_path)
+        status, num_lines = _save_result(result, output_path, _worker_pipeline.render)
+        error = None
+    except Exception as e:
+        status, num_lines, error = 'error', 0, str(e)
+    
+    return _job_summary(image_path, output_path, status, num_lines, time.perf_counter() - start, error)
+
+
+def _stream_jobs(jobs, yolo_model_path, target_size, render, queue_size=4, torch_threads=None):
+    """Run jobs through one in-process staged pipeline; yields job summaries as images finish"""
+    pipeline = PalmReadingPipeline(yolo_model_path, target_size=target_size, render=render, instrument=True,
+                                   torch_threads=torch_threads)
+    stream = pipeline.process_stream([image_path for image_path, _ in jobs], ordered=False, queue_size=queue_size)
+    try:
+        while True:
+            try:
+                index, result = next(stream)
+            except StopIteration:
+                break
+            except StageError as e:
+                yield _job_summary(jobs[e.index][0], None, 'error', 0, 0.0, str(e.__cause__))
+                continue
+            image_path, output_path = jobs[index]
+            timings = result['timings'] if not render else result.timings
+            try:
+                status, num_lines = _save_result(result, output_path, render)
+                error = None
+            except Exception as e:
+                status, num_lines, error = 'error', 0, str(e)
+            yield _job_summary(image_path, output_path, status, num_lines, timings['total_ms'] / 1000, error)
+        
+        for name, stage in stream.stats()['stages'].items():
+            logger.info("Stage %s: %d images, %.0f%% busy, %.0fms starved, %.0fms blocked", name, stage['items'],
+                        100 * stage['utilization'], stage['starved_ms'], stage['blocked_ms'])
+    finally:
+        stream.close()
+        pipeline.close()
+
+
+def worker_torch_threads(workers, cpu_count=None):
+    """Torch threads per worker: TORCH_NUM_THREADS, else an even share of the cores"""
+    if TORCH_NUM_THREADS is not None:
+        return TORCH_NUM_THREADS
+    return max(1, (cpu_count or os.cpu_count() or 1) // workers)
+
+
+def process_palm_batch(image_paths, yolo_model_path, output_dir='results', workers=None, target_size=1024,
+                       render=True, stream=False, torch_threads=None):
+    """
+    Process many images with a pool of worker processes
+    
+    Each worker loads YOLO and MediaPipe once; results are written to
+    output_dir as they complete, as annotated JPEGs or, with render=False,
+    as JSON reports (no drawing or encoding). With stream=True a single
+    process runs the staged pipeline instead (decode, hand location, YOLO
+    and features overlapped on threads) and logs per-stage utilization.
+    Each worker gets torch_threads intra-op threads (default: see
+    worker_torch_threads) so the pool does not oversubscribe the cores.
+    
+    Returns:
+        Aggregate summary dict (counts, wall time, images/sec)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = assign_output_paths(image_paths, output_dir, '.jpg' if render else '.json')
+    workers = 1 if stream else workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs) or 1))
+    
+    torch_threads = torch_threads or worker_torch_threads(workers)
+    # Export for LINE_BACKEND here, once: workers exporting to the same path
+    # at the same time would overwrite each other's output
+    yolo_model_path = resolve_line_model(yolo_model_path)
+    logger.info("Processing %d images with %d worker(s), %d torch thread(s) each",
+                len(jobs), workers, torch_threads)
+    counts = {'ok': 0, 'no_hand': 0, 'error': 0}
+    start = time.perf_counter()
+    
+    def report(summary):
+        counts[summary['status']] += 1
+        done = sum(counts.values())
+        if summary['status'] == 'error':
+            logger.error("[%d/%d] %s: %s", done, len(jobs), summary['image'], summary['error'])
+        else:
+            logger.info("[%d/%d] %s: %s (%d lines, %.2fs)", done, len(jobs), summary['image'],
+                        summary['status'], summary['lines'], summary['seconds'])
+    
+    if stream:
+        for summary in _stream_jobs(jobs, yolo_model_path, target_size, render, torch_threads=torch_threads):
+            report(summary)
+    elif workers == 1:
+        _init_worker(yolo_model_path, target_size, render, torch_threads)
+        for job in jobs:
+            report(_process_job(job))
+    else:
+        # spawn: MediaPipe and torch are not fork-safe once initialized
+        ctx = multiprocessing.get_context('spawn')
+        initargs = (yolo_model_path, target_size, render, torch_threads)
+        with ctx.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+            for summary in pool.imap_unordered(_process_job, jobs):
+                report(summary)
+    
+    elapsed = time.perf_counter() - start
+    total = len(jobs)
+    summary = {
+        'images': total,
+        'workers': workers,
+        'torch_threads': torch_threads,
+        'seconds': elapsed,
+        'images_per_second': total / elapsed if elapsed > 0 else 0.0,
+        **counts,
+    }
+    
+    print("\n" + "=" * 70)
+    print(f"Processed {total} images in {elapsed:.1f}s with {workers} worker(s)")
+    print(f"  Throughput: {summary['images_per_second']:.2f} images/s")
+    print(f"  OK: {counts['ok']}  No hand: {counts['no_hand']}  Errors: {counts['error']}")
+    print("=" * 70 + "\n")
+    return summary
+
+
+def batch_main(argv):
+    """Batch CLI: python main.py batch INPUT... [--model M] [--output-dir D] [--workers N]"""
+    parser = argparse.ArgumentParser(prog='main.py batch', description="Process many palm images in parallel")
+    parser.add_argument('inputs', nargs='*', help="Image files, directories or glob patterns")
+    parser.add_argument('--file-list', help="Text file with one image path per line")
+    parser.add_argument('--model', default='best.pt', help="Path to YOLO model")
+    parser.add_argument('--output-dir', default='results', help="Directory for annotated results")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--target-size', type=int, default=1024, help="Standardized longer edge in px")
+    parser.add_argument('--json', action='store_true', help="Write JSON reports instead of annotated images")
+    parser.add_argument('--stream', action='store_true',
+                        help="One process with overlapped pipeline stages instead of a worker pool")
+    parser.add_argument('--torch-threads', type=int, default=None,
+                        help="Torch intra-op threads per worker (default: cores / workers)")
+    args = parser.parse_args(argv)
+    
+    image_paths = collect_image_paths(args.inputs, args.file_list)
+    if not image_paths:
+        parser.error("no images found")
+    
+    return process_palm_batch(image_paths, args.model, args.output_dir,
+                              workers=args.workers, target_size=args.target_size, render=not args.json,
+                              stream=args.stream, torch_threads=args.torch_threads)
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        batch_main(sys.argv[2:])
+        sys.exit(0)
+    
     # Default paths
     IMAGE_PATH = '/home/momonga/Downloads/t2.jpeg'
     MODEL_PATH = '/home/momonga/Documents/PalmReaderPro/best.pt'
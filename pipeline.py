@@ -1,31 +1,229 @@
 import cv2
+import hashlib
 import os
 import numpy as np
 import sys
+import threading
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from core.detectors import HandDetector, LineDetector
-from core.features import FeatureExtractor
+from core.features import FeatureExtractor, ImageContext
 from core.classifiers import MountBasedClassifier
 from core.interpreters import VedicInterpreter
-from config import YOLO_CONFIDENCE, YOLO_IOU, COLOR_LINES, COLOR_TEXT
+from core.instrumentation import StageTimer, StageMetrics, NULL_TIMER
+from core.cache import SessionPriors, image_digest, model_fingerprint, config_fingerprint
+from core.schema import build_report, plain_readings
+from core.loader import load_image
+from core.stages import Done, Stage, StagedRunner
+from config import (YOLO_CONFIDENCE, YOLO_IOU, COLOR_LINES, COLOR_TEXT, ORIENTATION_MODE, ROTATION_MAP,
+                    RESOLUTION_MODE, DETECTION_SIZE, YOLO_INPUT_SIZE, TORCH_NUM_THREADS)
+from logging_config import get_logger, request_context
+
+logger = get_logger('pipeline')
+
+
+class PalmOverlay:
+    '''
+    Annotations for one image, kept apart from the pixels they describe
+    
+    The pipeline never draws on the image the features read; render()
+    draws landmarks, mounts and labelled lines onto a copy. Downscaled
+    bases are cached per ``max_size`` so repeated previews are cheap.
+    '''
+    
+    def __init__(self, image, hand_detector, hand_landmarks, mounts, lines=None,
+                 color_order='BGR', draw_lines=None):
+        self.image = image
+        self.hand_detector = hand_detector
+        self.hand_landmarks = hand_landmarks
+        self.mounts = mounts
+        self.lines = lines if lines is not None else []
+        self.color_order = color_order
+        self.draw_lines = draw_lines or PalmReadingPipeline.draw_lines
+        self._bases = {}
+    
+    def base(self, max_size=None):
+        '''(clean BGR image no larger than max_size, scale factor)'''
+        h, w = self.image.shape[:2]
+        if not max_size or max(h, w) <= max_size:
+            return self.image, 1.0
+        if max_size not in self._bases:
+            scale = max_size / max(h, w)
+            small = cv2.resize(self.image, (max(1, int(w * scale)), max(1, int(h * scale))),
+                               interpolation=cv2.INTER_AREA)
+            self._bases[max_size] = (small, scale)
+        return self._bases[max_size]
+    
+    def render(self, max_size=None):
+        '''Annotated copy in the caller's color order, optionally downscaled'''
+        base, scale = self.base(max_size)
+        canvas = base.copy()
+        
+        mounts = self.mounts
+        lines = self.lines
+        if scale != 1.0:
+            mounts = {name: (pos * scale if np.ndim(pos) else pos) for name, pos in mounts.items()}
+            lines = [(np.round(pts * scale).astype(np.int32), label) for pts, label in lines]
+        
+        self.hand_detector.draw_landmarks(canvas, self.hand_landmarks)
+        self.hand_detector.draw_mounts(canvas, mounts)
+        self.draw_lines(canvas, lines)
+        
+        if self.color_order == 'RGB':
+            canvas = cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB)
+        return canvas
+
+
+class PalmReadingResult(tuple):
+    '''
+    (annotated image, interpretations, mounts) with per-call stage timings
+    
+    Unpacks like the plain 3-tuple the pipeline has always returned;
+    ``timings`` is None unless the pipeline was built with instrument=True.
+    ``overlay`` re-renders the annotations, e.g. as a downscaled preview.
+    Interpretations and mounts come in core.schema.plain_readings form,
+    whether computed or served from the cache.
+    '''
+    
+    def __new__(cls, image, interpretations, mounts, timings=None, overlay=None):
+        result = super().__new__(cls, (image, interpretations, mounts))
+        result.timings = timings
+        result.overlay = overlay
+        return result
+    
+    @property
+    def image(self):
+        return self[0]
+    
+    @property
+    def interpretations(self):
+        return self[1]
+    
+    @property
+    def mounts(self):
+        return self[2]
+    
+    def to_report(self):
+        '''JSON-serializable PalmReport of this result (the image is left out)'''
+        return build_report(self.interpretations, self.mounts, self.timings)
+    
+    def render(self, max_size=None):
+        '''Draw the annotations onto a fresh copy of the clean image'''
+        if self.overlay is None:
+            raise ValueError("Result has no overlay to render")
+        return self.overlay.render(max_size)
 
 
 class PalmReadingPipeline:
-    def __init__(self, yolo_model_path, target_size=1024):
+    '''
+    Palm image in, annotated image and line interpretations out
+    
+    One instance may be shared by many threads: MediaPipe graphs and YOLO
+    handles are checked out of pools per call (see HandsSessionManager and
+    LineModelPool), caches, stores and metrics lock internally, and all
+    per-call state lives on the call stack. Images never touch disk.
+    '''
+    
+    def __init__(self, yolo_model_path, target_size=1024, orientation_mode=ORIENTATION_MODE,
+                 hand_detector=None, line_detector=None, instrument=False, timing_hooks=(),
+                 metrics_window=1000, cache=None, landmark_store=None, recorder=None, render=True,
+                 resolution_mode=RESOLUTION_MODE, detection_size=DETECTION_SIZE,
+                 yolo_input_size=YOLO_INPUT_SIZE, torch_threads=TORCH_NUM_THREADS):
         '''
         Initialize pipeline with image standardization
         
         Args:
             yolo_model_path: Path to YOLO model
             target_size: Standard size for longer edge (default 1024px)
+            orientation_mode: 'fast' (single MediaPipe pass), 'ordered'
+                (rotations tried most likely first, using the EXIF and session
+                hints) or 'exhaustive' (try all four rotations)
+            hand_detector: Optional pre-built HandDetector (or stand-in)
+            line_detector: Optional pre-built LineDetector (or stand-in);
+                yolo_model_path is not loaded when given
+            instrument: Record per-stage timings on every result and in
+                self.metrics (rolling p50/p95/p99)
+            timing_hooks: Callables ``hook(stage, elapsed_ms)`` invoked after
+                every timed stage (implies instrument=True)
+            metrics_window: Samples per stage kept for rolling percentiles
+            cache: Optional ResultCache; results are keyed by a hash of the
+                decoded pixels, the model file and the config values
+            landmark_store: Optional LandmarkStore; orientation and landmarks
+                are looked up by a hash of the standardized image
+            recorder: Optional replay.DetectionRecorder that captures the raw
+                detections of every processed image for offline replay
+            render: Default for the per-call ``render`` flag; False returns
+                JSON-ready PalmReport dicts and skips all drawing
+            resolution_mode: 'single' (everything at target_size) or 'multi'
+                (MediaPipe at detection_size, YOLO at yolo_input_size, features
+                at target_size; see yolo_input for why not the original size)
+            detection_size: Longer edge of the MediaPipe image in 'multi' mode
+            yolo_input_size: Longer edge of the YOLO image in 'multi' mode
+            torch_threads: Torch intra-op threads for the LineDetector built
+                from yolo_model_path (process-wide; None keeps the current
+                setting)
         '''
-        print("Initializing Palm Reading Pipeline...")
-        self.hand_detector = HandDetector()
-        self.line_detector = LineDetector(yolo_model_path)
+        if resolution_mode not in ('single', 'multi'):
+            raise ValueError(f"Unknown resolution mode: {resolution_mode}")
+        logger.info("Initializing Palm Reading Pipeline...")
+        self.hand_detector = hand_detector or HandDetector()
+        self.line_detector = line_detector or LineDetector(yolo_model_path, num_threads=torch_threads)
         self.target_size = target_size
-        print(f"Models loaded! Images will be standardized to {target_size}px")
+        self.orientation_mode = orientation_mode
+        self.timing_hooks = list(timing_hooks)
+        self.instrument = instrument or bool(self.timing_hooks)
+        self.metrics = StageMetrics(metrics_window) if self.instrument else None
+        self.cache = cache
+        self.landmark_store = landmark_store
+        self.recorder = recorder
+        self.render = render
+        self.resolution_mode = resolution_mode
+        # Last rotation per session, bounded; orders the next search (see HandDetector.rotation_order)
+        self.rotation_priors = SessionPriors()
+        self.detection_size = detection_size
+        self.yolo_input_size = yolo_input_size
+        self._cache_namespace = None
+        self._lock = threading.Lock()
+        logger.info("Models loaded! Images will be standardized to %dpx", target_size)
+
+    def new_timer(self):
+        '''StageTimer for one call, or the no-op timer when instrumentation is off'''
+        return StageTimer(self.timing_hooks) if self.instrument else NULL_TIMER
+    
+    def cache_key(self, img, color_order, render=True):
+        '''Content address of one input under the current model and settings'''
+        with self._lock:
+            if self._cache_namespace is None:
+                model_path = getattr(self.line_detector, 'model_path', None)
+                settings = '|'.join([
+                    model_fingerprint(model_path), config_fingerprint(),
+                    str(self.target_size), self.orientation_mode, self.resolution_mode,
+                    str(self.detection_size), str(self.yolo_input_size),
+                ])
+                self._cache_namespace = hashlib.blake2b(settings.encode(), digest_size=8).hexdigest()
+        mode = color_order if render else 'report'
+        return f"{image_digest(img)}-{mode}-{self._cache_namespace}"
+    
+    def finish(self, timer, img, interpretations, mounts, render=True, overlay=None):
+        '''Wrap outputs in a PalmReadingResult (or PalmReport) and feed the rolling metrics'''
+        timings = timer.as_dict()
+        if timings is not None:
+            self.metrics.record(timings)
+        if not render:
+            return build_report(interpretations, mounts, timings)
+        interpretations, mounts = plain_readings(interpretations, mounts)
+        return PalmReadingResult(img, interpretations, mounts, timings, overlay)
+
+    def close(self):
+        '''Release pooled detector sessions'''
+        self.hand_detector.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
     
     def standardize_image(self, img):
         '''
@@ -42,92 +240,490 @@ class PalmReadingPipeline:
             scale = self.target_size / w
             new_w, new_h = self.target_size, int(h * scale)
         
-        # Resize with high-quality interpolation
-        resized = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LANCZOS4)
+        # Resize with high-quality interpolation; 'multi' mode shrinks with
+        # INTER_AREA, which is cheaper and anti-aliases large reductions
+        interpolation = cv2.INTER_LANCZOS4
+        if self.resolution_mode == 'multi' and scale < 1:
+            interpolation = cv2.INTER_AREA
+        resized = cv2.resize(img, (new_w, new_h), interpolation=interpolation)
         
-        print(f"  Standardized: {w}x{h} → {new_w}x{new_h} (scale: {scale:.2f}x)")
+        logger.debug("Standardized: %dx%d → %dx%d (scale: %.2fx)", w, h, new_w, new_h, scale)
         return resized, scale
     
-    def process(self, image_path):
+    @staticmethod
+    def downscale(img, max_size):
+        '''Shrink so the longer edge is at most max_size (INTER_AREA); returns (img, scale)'''
+        h, w = img.shape[:2]
+        if not max_size or max(h, w) <= max_size:
+            return img, 1.0
+        scale = max_size / max(h, w)
+        small = cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))),
+                           interpolation=cv2.INTER_AREA)
+        return small, scale
+    
+    def yolo_input(self, img):
+        '''
+        (image handed to YOLO, per-axis (x, y) factors mapping its keypoints back onto img)
+        
+        Keypoints go back to the target_size image, not the original decode:
+        thickness, length and branch features are measured in target_size
+        pixels and the classifier thresholds are tuned to that scale, and
+        large JPEGs are decoded only down to about target_size anyway (see
+        core.loader). Feature precision therefore matches 'single' mode.
+        '''
+        if self.resolution_mode != 'multi':
+            return img, 1.0
+        small, _ = self.downscale(img, self.yolo_input_size)
+        if small is img:
+            return img, 1.0
+        return small, (img.shape[1] / small.shape[1], img.shape[0] / small.shape[0])
+    
+    def process(self, image_path, render=None, session_id=None):
         '''Complete pipeline with image standardization and auto-rotation'''
         
-        # Load image
-        img = cv2.imread(image_path)
-        if img is None:
-            raise ValueError(f"Could not load image: {image_path}")
+        with request_context():
+            timer = self.new_timer()
+        
+            # Load image (large JPEGs are decoded at reduced scale)
+            with timer.stage('load'):
+                img, info = load_image(image_path, self.target_size)
+            if img is None:
+                raise ValueError(f"Could not load image: {image_path}")
+        
+            return self.process_array(img, color_order='BGR', timer=timer, image_id=image_path, render=render,
+                                      session_id=session_id, exif_rotation=info['exif_rotation'])
+    
+    def process_array(self, img, color_order='RGB', timer=None, image_id=None, render=None,
+                      session_id=None, exif_rotation=None):
+        '''
+        Run the pipeline on an already decoded image
+        
+        Args:
+            img: HxWx3 uint8 array
+            color_order: 'RGB' (e.g. Gradio/PIL uploads) or 'BGR' (cv2.imread)
+            image_id: Name stored with recorded detections (defaults to the request ID)
+            render: False skips the overlay stage and returns a PalmReport
+                dict; None uses the pipeline default
+            session_id: Images sharing a session (e.g. one user's uploads)
+                try the previous image's rotation first
+            exif_rotation: EXIF rotation already applied by the loader, if any
+        
+        Returns:
+            PalmReadingResult: (annotated image in the same color order as the
+            input, interpretations, mounts), plus ``timings`` when instrumented;
+            or a PalmReport when not rendering
+        '''
+        render = self.render if render is None else render
+        with request_context() as request_id:
+            timer = timer or self.new_timer()
+        
+            key, cached = self.lookup_cache(img, color_order, timer, render)
+            if cached is not None:
+                return cached
+        
+            prepared = self.prepare_image(img, color_order, timer, exif_rotation, session_id)
+            if prepared is None:
+                self.store_cache(key, None, None, None, timer)
+                return self.finish(timer, None, None, None, render)
+            img, mounts, hand_landmarks = prepared
+        
+            # Detect lines on standardized image (in memory)
+            with timer.stage('yolo'):
+                yolo_img, keypoint_scale = self.yolo_input(img)
+                line_result = self.line_detector.detect(yolo_img, conf=YOLO_CONFIDENCE, iou=YOLO_IOU)
+        
+            annotated, interpretations, overlay = self.complete(
+                img, line_result, mounts, hand_landmarks, color_order, timer, render, image_id or request_id,
+                keypoint_scale
+            )
+        
+            self.store_cache(key, overlay, interpretations, mounts, timer)
+            return self.finish(timer, annotated, interpretations, mounts, render, overlay)
+    
+    def lookup_cache(self, img, color_order, timer=NULL_TIMER, render=True):
+        '''
+        Look an input up in the result cache
+        
+        Returns:
+            (cache key or None without a cache, finished result or None on a miss)
+        '''
+        if self.cache is None:
+            return None, None
+        with timer.stage('cache'):
+            key = self.cache_key(img, color_order, render)
+            cached = self.cache.get(key)
+        if cached is None:
+            return key, None
+        logger.debug("Result cache hit %s", key)
+        # The cache hands out copies, so callers may modify what they get
+        image, interpretations, mounts, annotations = cached
+        if annotations is None:
+            return key, self.finish(timer, image, interpretations, mounts, render)
+        
+        overlay = PalmOverlay(
+            image, self.hand_detector, HandDetector.landmarks_from_list(annotations['landmarks']), mounts,
+            lines=[(np.array(pts, dtype=np.int32), label) for pts, label in annotations['lines']],
+            color_order=annotations['color_order'], draw_lines=self.draw_lines
+        )
+        with timer.stage('draw'):
+            annotated = overlay.render()
+        return key, self.finish(timer, annotated, interpretations, mounts, render, overlay)
+    
+    def store_cache(self, key, overlay, interpretations, mounts, timer=NULL_TIMER):
+        '''
+        Store a result under a key from lookup_cache (no-op when key is None)
+        
+        With an overlay, the clean image and its annotations are stored so a
+        hit can rebuild the overlay; without one only the readings are kept.
+        '''
+        if key is None:
+            return
+        image = annotations = None
+        if overlay is not None:
+            image = overlay.image
+            annotations = {
+                'landmarks': HandDetector.landmarks_to_list(overlay.hand_landmarks),
+                'lines': [(pts.tolist(), label) for pts, label in overlay.lines],
+                'color_order': overlay.color_order,
+            }
+        # The cache stores a private copy, so callers may draw on the returned image
+        with timer.stage('cache', count=0):
+            self.cache.put(key, image, interpretations, mounts, annotations)
+    
+    def complete(self, img, line_result, mounts, hand_landmarks, color_order, timer, render, image_id,
+                 keypoint_scale=1.0):
+        '''
+        Features and interpretations for one detected hand, then the overlay stage
+        
+        keypoint_scale maps YOLO keypoints onto img when YOLO saw a resized copy.
+        
+        Returns:
+            (annotated image or None, interpretations, PalmOverlay or None)
+        '''
+        self.record(image_id, img, line_result, mounts, keypoint_scale)
+        overlay = None
+        if render:
+            overlay = PalmOverlay(img, self.hand_detector, hand_landmarks, mounts,
+                                  color_order=color_order, draw_lines=self.draw_lines)
+        
+        interpretations = self.interpret_lines(img, line_result, mounts, timer, overlay, keypoint_scale)
+        if overlay is None:
+            return None, interpretations, None
+        
+        with timer.stage('draw'):
+            annotated = overlay.render()
+        return annotated, interpretations, overlay
+    
+    def process_batch(self, images, batch_size=8, color_order='BGR', render=None, session_id=None):
+        '''
+        Run the pipeline on many images, batching the YOLO stage
+        
+        Standardization, orientation and landmarks run per image; line
+        detection is sent to the model ``batch_size`` images at a time.
+        
+        Args:
+            images: iterable of image paths or decoded arrays
+            batch_size: number of images per YOLO forward pass
+            color_order: color order of array inputs (paths are always BGR)
+            render: False returns PalmReport dicts without drawing
+            session_id: Rotation prior shared by the images of the batch
+        
+        Returns:
+            list of PalmReadingResult (or PalmReport) in input order; images
+            without a detected hand, and paths that cannot be read (logged as
+            warnings), yield (None, None, None). Result cache hits skip every
+            stage. The YOLO time of each batch is split evenly across its
+            images.
+        '''
+        render = self.render if render is None else render
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be >= 1, got {batch_size}")
+        
+        results = []
+        pending = []
         
-        print(f"Original image size: {img.shape[1]}x{img.shape[0]}")
+        def flush():
+            batch_timer = StageTimer()
+            with batch_timer.stage('yolo'):
+                yolo_inputs = [self.yolo_input(entry[1]) for entry in pending]
+                line_results = self.line_detector.detect_batch(
+                    [yolo_img for yolo_img, _ in yolo_inputs], conf=YOLO_CONFIDENCE, iou=YOLO_IOU
+                )
+            yolo_share = batch_timer.durations['yolo'] / len(pending)
+            for (index, img, mounts, hand_landmarks, order, timer, request_id, image_id, key), line_result, \
+                    (_, keypoint_scale) in zip(pending, line_results, yolo_inputs):
+                with request_context(request_id):
+                    timer.add('yolo', yolo_share)
+                    annotated, interpretations, overlay = self.complete(
+                        img, line_result, mounts, hand_landmarks, order, timer, render, image_id, keypoint_scale
+                    )
+                    self.store_cache(key, overlay, interpretations, mounts, timer)
+                    results[index] = self.finish(timer, annotated, interpretations, mounts, render, overlay)
+            pending.clear()
+        
+        for index, image in enumerate(images):
+            timer = self.new_timer()
+            with request_context() as request_id:
+                try:
+                    img, order, image_id, exif_rotation = self.open_input(image, color_order, timer, request_id)
+                except ValueError as e:
+                    # One bad file must not discard the rest of the batch
+                    logger.warning("%s", e)
+                    results.append(self.finish(timer, None, None, None, render))
+                    continue
+                key, cached = self.lookup_cache(img, order, timer, render)
+                if cached is not None:
+                    results.append(cached)
+                    continue
+                prepared = self.prepare_image(img, order, timer, exif_rotation, session_id)
+            
+            if prepared is None:
+                self.store_cache(key, None, None, None, timer)
+                results.append(self.finish(timer, None, None, None, render))
+                continue
+            
+            results.append(None)
+            pending.append((index, *prepared, order, timer, request_id, image_id, key))
+            if len(pending) >= batch_size:
+                flush()
+        
+        if pending:
+            flush()
+        
+        return results
+    
+    def open_input(self, image, color_order, timer=NULL_TIMER, image_id=None):
+        '''
+        Decode a path (or pass an array through) for the batch and stream modes
+        
+        Returns:
+            (img, color order, image id, EXIF rotation or None)
+        '''
+        if isinstance(image, (str, os.PathLike)):
+            with timer.stage('load'):
+                img, info = load_image(os.fspath(image), self.target_size)
+            if img is None:
+                raise ValueError(f"Could not load image: {image}")
+            return img, 'BGR', os.fspath(image), info['exif_rotation']
+        return image, color_order, image_id, None
+    
+    def process_stream(self, images, ordered=True, queue_size=4, color_order='BGR', render=None,
+                       session_id=None, workers=None):
+        '''
+        Stream results for many images, overlapping the stages across images
+        
+        Decoding, hand location (standardize, orientation, mounts), YOLO and
+        feature extraction each run on their own thread(s), joined by queues
+        of ``queue_size`` images: image N+1 decodes and orients while image N
+        is in YOLO. OpenCV, MediaPipe and torch release the GIL for most of
+        their work.
+        
+        Args:
+            images: iterable of image paths or decoded arrays, read lazily
+            ordered: yield in input order (True) or as images finish (False)
+            queue_size: images allowed to wait between two stages
+            color_order, render, session_id: as for process_batch
+            workers: optional {stage: threads} for 'load', 'prepare', 'yolo'
+                and 'features'; 'yolo' must stay at 1 unless the line
+                detector is safe to call from several threads
+        
+        Returns:
+            StageStream of (index, PalmReadingResult or PalmReport); images
+            without a hand yield (None, None, None). ``stream.stats()``
+            reports per-stage busy, starved and blocked time and utilization.
+        '''
+        render = self.render if render is None else render
+        workers = workers or {}
+        
+        def load(image):
+            timer = self.new_timer()
+            with request_context() as request_id:
+                img, order, image_id, exif_rotation = self.open_input(image, color_order, timer, request_id)
+                key, cached = self.lookup_cache(img, order, timer, render)
+            if cached is not None:
+                return Done(cached)
+            return {'img': img, 'order': order, 'image_id': image_id, 'exif_rotation': exif_rotation,
+                    'timer': timer, 'request_id': request_id, 'key': key}
+        
+        def prepare(job):
+            with request_context(job['request_id']):
+                prepared = self.prepare_image(job['img'], job['order'], job['timer'], job['exif_rotation'],
+                                              session_id)
+                if prepared is None:
+                    self.store_cache(job['key'], None, None, None, job['timer'])
+                    return Done(self.finish(job['timer'], None, None, None, render))
+            job['img'], job['mounts'], job['hand_landmarks'] = prepared
+            return job
+        
+        def detect(job):
+            with request_context(job['request_id']), job['timer'].stage('yolo'):
+                yolo_img, job['keypoint_scale'] = self.yolo_input(job['img'])
+                job['line_result'] = self.line_detector.detect(yolo_img, conf=YOLO_CONFIDENCE, iou=YOLO_IOU)
+            return job
+        
+        def features(job):
+            timer = job['timer']
+            with request_context(job['request_id']):
+                annotated, interpretations, overlay = self.complete(
+                    job['img'], job['line_result'], job['mounts'], job['hand_landmarks'], job['order'], timer,
+                    render, job['image_id'], job['keypoint_scale']
+                )
+                self.store_cache(job['key'], overlay, interpretations, job['mounts'], timer)
+                return self.finish(timer, annotated, interpretations, job['mounts'], render, overlay)
+        
+        stages = [
+            Stage('load', load, workers.get('load', 1)),
+            Stage('prepare', prepare, workers.get('prepare', 1)),
+            Stage('yolo', detect, workers.get('yolo', 1)),
+            Stage('features', features, workers.get('features', 1)),
+        ]
+        return StagedRunner(stages, queue_size).run(images, ordered)
+    
+    def prepare_image(self, img, color_order='BGR', timer=NULL_TIMER, exif_rotation=None, session_id=None):
+        '''
+        Standardize, orient and locate the hand in one image
+        
+        Returns:
+            (clean upright BGR image, mounts, hand landmarks), or None if no
+            hand is detected
+        '''
+        if color_order not in ('RGB', 'BGR'):
+            raise ValueError(f"color_order must be 'RGB' or 'BGR', got {color_order!r}")
+        
+        logger.debug("Original image size: %dx%d", img.shape[1], img.shape[0])
         
         # STANDARDIZE IMAGE SIZE (NEW!)
-        img, scale_factor = self.standardize_image(img)
+        with timer.stage('standardize'):
+            img, scale_factor = self.standardize_image(img)
+            
+            # Detectors and drawing work in BGR; convert once, after downsizing
+            if color_order == 'RGB':
+                img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+            
+            # 'multi': MediaPipe only needs a small copy; landmarks are normalized
+            detect_img = img
+            if self.resolution_mode == 'multi':
+                detect_img, _ = self.downscale(img, self.detection_size)
+        
+        stored = store_key = None
+        if self.landmark_store is not None:
+            with timer.stage('cache'):
+                store_key = f"{image_digest(img)}-{self.orientation_mode}-{self.resolution_mode}"
+                stored = self.landmark_store.get(store_key)
+        
+        if stored is not None:
+            # Reprocessing a known image: replay the stored rotation, skip MediaPipe
+            rotation_angle, coords = stored
+            hand_landmarks = self.hand_detector.landmarks_from_list(coords) if coords else None
+            rotated = None
+        else:
+            prior = self.rotation_priors.get(session_id)
+            rotated, rotation_angle, hand_landmarks = self.locate_hand(detect_img, timer, exif_rotation, prior)
+            if store_key is not None:
+                coords = self.hand_detector.landmarks_to_list(hand_landmarks) if hand_landmarks else None
+                self.landmark_store.put(store_key, rotation_angle, coords)
+        
+        if detect_img is img and rotated is not None:
+            img = rotated
+        elif ROTATION_MAP.get(rotation_angle) is not None:
+            img = cv2.rotate(img, ROTATION_MAP[rotation_angle])
         
-        # Auto-rotate to portrait
+        if not hand_landmarks:
+            logger.info("Still no hand detected, returning None")
+            return None
+        self.rotation_priors.put(session_id, rotation_angle)
+        
+        h, w = img.shape[:2]
+        
+        # Extract mounts
+        with timer.stage('mounts'):
+            mounts = self.hand_detector.extract_mounts(hand_landmarks, w, h)
+        
+        return img, mounts, hand_landmarks
+    
+    def locate_hand(self, img, timer=NULL_TIMER, exif_rotation=None, prior=None):
+        '''
+        Rotate a standardized BGR image upright and find the hand landmarks
+        
+        exif_rotation and prior are hints that order the rotation search.
+        
+        Returns:
+            (rotated image, total clockwise rotation angle, landmarks or None)
+        '''
+        # Auto-rotate to portrait and locate the hand
+        # (in 'fast' mode this single pass also yields the landmarks)
         try:
-            img, rotation_angle = self.hand_detector.detect_and_rotate_to_portrait(img)
-            print(f"Image rotated by {rotation_angle}° for processing")
+            with timer.stage('rotation'):
+                img, rotation_angle, hand_landmarks = self.hand_detector.orient_hand(
+                    img, mode=self.orientation_mode, exif_rotation=exif_rotation, prior=prior
+                )
+            logger.debug("Image rotated by %d° for processing", rotation_angle)
         except Exception as e:
-            print(f"Rotation error: {e}")
+            logger.warning("Rotation error: %s", e)
             h, w = img.shape[:2]
             if w > h:
                 img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
                 rotation_angle = 90
             else:
                 rotation_angle = 0
-        
-        # Process image
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        h, w = img.shape[:2]
-        
-        # Detect hand landmarks
-        hand_landmarks = self.hand_detector.get_landmarks(img_rgb)
+            with timer.stage('landmarks'):
+                hand_landmarks = self.hand_detector.get_landmarks(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
         
         if not hand_landmarks:
-            print("No hand detected by MediaPipe after rotation, trying 180° flip...")
-            img = cv2.rotate(img, cv2.ROTATE_180)
-            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            hand_landmarks = self.hand_detector.get_landmarks(img_rgb)
-            
-            if not hand_landmarks:
-                print("Still no hand detected, returning None")
-                return None, None, None
-        
-        # Extract mounts
-        mounts = self.hand_detector.extract_mounts(hand_landmarks, w, h)
-        
-        # Draw landmarks and mounts
-        self.hand_detector.draw_landmarks(img, hand_landmarks)
-        self.hand_detector.draw_mounts(img, mounts)
+            logger.debug("No hand detected by MediaPipe after rotation, trying 180° flip...")
+            with timer.stage('landmarks'):
+                img = cv2.rotate(img, cv2.ROTATE_180)
+                img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+                hand_landmarks = self.hand_detector.get_landmarks(img_rgb)
+            rotation_angle = (rotation_angle + 180) % 360
         
-          # Save standardized image temporarily for YOLO
-        base_name = os.path.splitext(image_path)[0]
-        ext = os.path.splitext(image_path)[1]
-        temp_rotated_path = f"{base_name}_standardized_temp{ext}"
+        return img, rotation_angle, hand_landmarks
+    
+    def record(self, image_id, img, line_result, mounts, keypoint_scale=1.0):
+        '''Hand the raw detections to the recorder, if one is attached'''
+        if self.recorder is not None:
+            names = getattr(self.line_detector.model, 'names', {})
+            self.recorder.capture(image_id, img, line_result, mounts, names, keypoint_scale)
+    
+    @staticmethod
+    def unpack_lines(line_result, keypoint_scale=1.0):
+        '''
+        Pull (keypoints, class_ids, confidences) out of a YOLO pose result
         
-        cv2.imwrite(temp_rotated_path, img)
+        keypoints is (N, K, 2), multiplied by keypoint_scale (a scalar or
+        per-axis (x, y) factors; the (0, 0) padding stays at 0); class_ids defaults to 0..N-1 and confidences
+        to None when the result carries no boxes.
+        '''
+        if not line_result or line_result.keypoints is None:
+            return np.zeros((0, 0, 2), dtype=np.float32), np.zeros(0, dtype=int), None
         
-        # Detect lines on standardized image
-        line_result = self.line_detector.detect(temp_rotated_path, conf=YOLO_CONFIDENCE, iou=YOLO_IOU)
+        keypoints = line_result.keypoints.xy.cpu().numpy()
+        if np.any(np.asarray(keypoint_scale) != 1.0):
+            keypoints = keypoints * np.asarray(keypoint_scale, dtype=np.float32)
+        boxes = getattr(line_result, 'boxes', None)
+        if boxes is None:
+            return keypoints, np.arange(len(keypoints)), None
         
-        # Clean up temp file (with safety check)
-        try:
-            if os.path.exists(temp_rotated_path) and temp_rotated_path != image_path:
-                os.remove(temp_rotated_path)
-        except Exception as e:
-            print(f"Warning: Could not delete temp file {temp_rotated_path}: {e}")
-       
+        class_ids = boxes.cls.cpu().numpy().astype(int)
+        confidences = boxes.conf.cpu().numpy() if getattr(boxes, 'conf', None) is not None else None
+        return keypoints, class_ids, confidences
+    
+    def interpret_lines(self, img, line_result, mounts, timer=NULL_TIMER, overlay=None, keypoint_scale=1.0):
+        '''Extract features and interpretations for detected lines; labelled lines go to overlay'''
         interpretations = {}
         
+        # Grayscale/binary maps are built once and shared by every line
+        ctx = ImageContext(img)
+        
         if line_result and line_result.keypoints is not None:
-            keypoints = line_result.keypoints.xy.cpu().numpy()
+            keypoints, class_ids, _ = self.unpack_lines(line_result, keypoint_scale)
             
-            if hasattr(line_result, 'boxes') and line_result.boxes is not None:
-                class_ids = line_result.boxes.cls.cpu().numpy().astype(int)
-            else:
-                class_ids = list(range(len(keypoints)))
+            # Geometry (length, curvature, breaks) for every line in one vectorized call
+            with timer.stage('features', count=0):
+                valid_lines = [kpts[~np.all(kpts == 0, axis=1)] for kpts in keypoints]
+                geometries = FeatureExtractor.extract_geometry_batch(valid_lines)
             
-            for i, kpts in enumerate(keypoints):
-                valid_kpts = kpts[~np.all(kpts == 0, axis=1)]
-                
+            for i, valid_kpts in enumerate(valid_lines):
                 if len(valid_kpts) < 2:
                     continue
                 
@@ -140,47 +736,61 @@ class PalmReadingPipeline:
                 line_end = valid_kpts[-1]
                 
                 # Determine line type
-                line_type = None
-                if 'life' in class_name.lower():
-                    line_type = 'life'
-                elif 'heart' in class_name.lower():
-                    line_type = 'heart'
-                elif 'head' in class_name.lower():
-                    line_type = 'head'
-                elif 'fate' in class_name.lower():
-                    line_type = 'fate'
+                line_type = self.line_type_for(class_name)
                 
                 if line_type:
-                    # Classify length based on mounts (now on standardized coordinates)
-                    length_class = MountBasedClassifier.classify_line_length_by_mounts(
-                        line_start, line_end, line_type, mounts
-                    )
-                    
-                    # Extract features
-                    features = FeatureExtractor.extract_features_improved(valid_kpts, img)
-                    features['length_class'] = length_class
+                    with timer.stage('features'):
+                        # Classify length based on mounts (now on standardized coordinates)
+                        length_class = MountBasedClassifier.classify_line_length_by_mounts(
+                            line_start, line_end, line_type, mounts
+                        )
+                        
+                        # Extract features
+                        features = FeatureExtractor.extract_features_improved(valid_kpts, ctx, geometries[i])
+                        features['length_class'] = length_class
                     
                     # Generate Vedic interpretation
-                    if line_type == 'life':
-                        interpretation = VedicInterpreter.interpret_life_line_detailed_vedic(features)
-                    elif line_type == 'heart':
-                        interpretation = VedicInterpreter.interpret_heart_line_detailed_vedic(features)
-                    elif line_type == 'head':
-                        interpretation = VedicInterpreter.interpret_head_line_detailed_vedic(features)
-                    elif line_type == 'fate':
-                        interpretation = VedicInterpreter.interpret_fate_line_detailed_vedic(features, present=True)
+                    with timer.stage('interpret'):
+                        interpretation = self.interpret_features(line_type, features)
                     
                     interpretations[class_name] = {
                         'features': features,
                         'interpretation': interpretation
                     }
                     
-                    # Draw line on image
-                    cv2.polylines(img, [pts], False, COLOR_LINES, 3)
-                    
-                    label = f"{class_name} ({length_class})"
-                    label_x, label_y = int(pts[0][0]), int(pts[0][1]) - 10
-                    cv2.putText(img, label, (label_x, label_y),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, COLOR_TEXT, 2)
+                    if overlay is not None:
+                        overlay.lines.append((pts, f"{class_name} ({length_class})"))
         
-        return img, interpretations, mounts
\ No newline at end of file
+        return interpretations
+    
+    @staticmethod
+    def line_type_for(class_name):
+        '''Map a YOLO class name to 'life', 'heart', 'head', 'fate' or None'''
+        name = class_name.lower()
+        for line_type in ('life', 'heart', 'head', 'fate'):
+            if line_type in name:
+                return line_type
+        return None
+    
+    @staticmethod
+    def interpret_features(line_type, features):
+        '''Generate the Vedic interpretation for one line's features'''
+        if line_type == 'life':
+            return VedicInterpreter.interpret_life_line_detailed_vedic(features)
+        elif line_type == 'heart':
+            return VedicInterpreter.interpret_heart_line_detailed_vedic(features)
+        elif line_type == 'head':
+            return VedicInterpreter.interpret_head_line_detailed_vedic(features)
+        elif line_type == 'fate':
+            return VedicInterpreter.interpret_fate_line_detailed_vedic(features, present=True)
+        return None
+    
+    @staticmethod
+    def draw_lines(img, drawn_lines):
+        '''Draw (points, label) polylines onto img'''
+        for pts, label in drawn_lines:
+            cv2.polylines(img, [pts], False, COLOR_LINES, 3)
+            
+            label_x, label_y = int(pts[0][0]), int(pts[0][1]) - 10
+            cv2.putText(img, label, (label_x, label_y),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, COLOR_TEXT, 2)
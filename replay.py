@@ -0,0 +1,307 @@
+import sys
+import os
+import json
+import time
+import argparse
+import threading
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.features import FeatureExtractor, ImageContext
+from core.classifiers import MountBasedClassifier
+from config import MAX_THICKNESS_SEARCH, BRANCH_DETECTION_RADIUS
+from pipeline import PalmReadingPipeline
+from utils import to_jsonable
+from logging_config import get_logger
+
+logger = get_logger('replay')
+
+FORMAT_VERSION = 1
+
+# Half-width of the corridor kept around each line: thickness rays reach
+# MAX_THICKNESS_SEARCH px and branch windows are squares of BRANCH_DETECTION_RADIUS
+STRIP_HALF_WIDTH = int(np.ceil(max(MAX_THICKNESS_SEARCH, BRANCH_DETECTION_RADIUS * np.sqrt(2)))) + 1
+
+
+def valid_keypoints(kpts):
+    '''Drop the (0, 0) padding YOLO uses for missing keypoints'''
+    return kpts[~np.all(kpts == 0, axis=1)]
+
+
+def extract_strip(gray, pts, half_width=STRIP_HALF_WIDTH):
+    '''
+    Crop the grayscale pixels within half_width of a polyline
+
+    Returns:
+        ((x0, y0, h, w), strip) where pixels outside the corridor are zeroed
+        so the strip compresses well
+    '''
+    img_h, img_w = gray.shape
+    x0 = max(int(pts[:, 0].min()) - half_width, 0)
+    y0 = max(int(pts[:, 1].min()) - half_width, 0)
+    x1 = min(int(pts[:, 0].max()) + half_width + 1, img_w)
+    y1 = min(int(pts[:, 1].max()) + half_width + 1, img_h)
+    if x1 <= x0 or y1 <= y0:
+        return (x0, y0, 0, 0), np.zeros((0, 0), dtype=np.uint8)
+
+    crop = gray[y0:y1, x0:x1]
+    mask = np.zeros_like(crop)
+    local = (pts - [x0, y0]).astype(np.int32)
+    cv2.polylines(mask, [local], False, 255, 2 * half_width + 1)
+    return (x0, y0, y1 - y0, x1 - x0), np.where(mask > 0, crop, 0).astype(np.uint8)
+
+
+class DetectionRecorder:
+    '''
+    Collects raw per-image detections for offline replay
+
+    Stores mounts, YOLO keypoints, class IDs, confidences and the
+    pixel-based line measurements (thickness, branches). With
+    ``store_strips`` the grayscale corridor around every line is kept too,
+    so replay can recompute the pixel measurements without the images.
+    '''
+
+    def __init__(self, store_strips=False):
+        self.store_strips = store_strips
+        self.records = []
+        self.names = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.records)
+
+    def capture(self, image_id, img, line_result, mounts, names, keypoint_scale=1.0):
+        '''Record one image; img is the BGR image the features are read from'''
+        keypoints, class_ids, confidences = PalmReadingPipeline.unpack_lines(line_result, keypoint_scale)
+        keypoints = np.asarray(keypoints, dtype=np.float32)
+        if confidences is None:
+            confidences = np.ones(len(keypoints), dtype=np.float32)
+
+        ctx = ImageContext(img)
+        thickness = np.zeros(len(keypoints))
+        branches = np.zeros((len(keypoints), 3), dtype=np.int32)
+        strips = []
+        for i, kpts in enumerate(keypoints):
+            valid = valid_keypoints(kpts)
+            if len(valid) >= 2:
+                found = FeatureExtractor.detect_actual_branches(valid, ctx)
+                branches[i] = [found['upward'], found['downward'], found['forks']]
+                thickness[i] = FeatureExtractor.calculate_line_thickness(valid, ctx)
+            if self.store_strips:
+                strips.append(extract_strip(ctx.gray, valid) if len(valid) >= 2
+                              else ((0, 0, 0, 0), np.zeros((0, 0), dtype=np.uint8)))
+
+        record = {
+            'image_id': str(image_id),
+            'shape': img.shape[:2],
+            'mounts': mounts,
+            'keypoints': keypoints,
+            'class_ids': np.asarray(class_ids, dtype=np.int32),
+            'confidences': np.asarray(confidences, dtype=np.float32),
+            'thickness': thickness,
+            'branches': branches,
+            'strips': strips,
+        }
+        with self._lock:
+            self.names.update({int(k): v for k, v in dict(names).items()})
+            self.records.append(record)
+
+    def save(self, path):
+        '''Write every record to one compressed .npz file'''
+        if not self.records:
+            raise ValueError("No detections recorded")
+
+        records = self.records
+        first_mounts = records[0]['mounts']
+        point_names = [k for k, v in first_mounts.items() if np.ndim(v) == 1]
+        scalar_names = [k for k, v in first_mounts.items() if np.ndim(v) == 0]
+        num_keypoints = max(r['keypoints'].shape[1] for r in records)
+
+        def padded(kpts):
+            out = np.zeros((len(kpts), num_keypoints, 2), dtype=np.float32)
+            out[:, :kpts.shape[1]] = kpts
+            return out
+
+        line_counts = [len(r['keypoints']) for r in records]
+        arrays = {
+            'shapes': np.array([r['shape'] for r in records], dtype=np.int32),
+            'mount_points': np.array([[r['mounts'][k] for k in point_names] for r in records], dtype=np.float64),
+            'mount_scalars': np.array([[r['mounts'][k] for k in scalar_names] for r in records], dtype=np.float64),
+            'line_offsets': np.concatenate([[0], np.cumsum(line_counts)]).astype(np.int64),
+            'keypoints': np.concatenate([padded(r['keypoints']) for r in records]),
+            'class_ids': np.concatenate([r['class_ids'] for r in records]),
+            'confidences': np.concatenate([r['confidences'] for r in records]),
+            'thickness': np.concatenate([r['thickness'] for r in records]),
+            'branches': np.concatenate([r['branches'] for r in records]),
+        }
+        if self.store_strips:
+            strips = [strip for r in records for strip in r['strips']]
+            sizes = [pixels.size for _, pixels in strips]
+            arrays['strip_boxes'] = np.array([box for box, _ in strips], dtype=np.int32).reshape(-1, 4)
+            arrays['strip_offsets'] = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+            arrays['strip_pixels'] = (np.concatenate([pixels.ravel() for _, pixels in strips])
+                                      if strips else np.zeros(0, dtype=np.uint8))
+
+        meta = {
+            'version': FORMAT_VERSION,
+            'image_ids': [r['image_id'] for r in records],
+            'names': {str(k): v for k, v in self.names.items()},
+            'point_mounts': point_names,
+            'scalar_mounts': scalar_names,
+        }
+        arrays['meta'] = np.array(json.dumps(meta))
+        np.savez_compressed(path, **arrays)
+        logger.info("Saved %d detection records to %s", len(records), path)
+
+
+class ReplayEngine:
+    '''
+    Recompute features, length classes and interpretations from recorded detections
+
+    Line geometry for the whole file is computed in one vectorized batch.
+    Thickness and branches come from the stored corridor strips when the
+    file has them (and ``use_strips`` is not False), otherwise from the
+    values measured at record time.
+    '''
+
+    def __init__(self, path, use_strips=None):
+        with np.load(path) as data:
+            self.data = {name: data[name] for name in data.files}
+        self.meta = json.loads(str(self.data.pop('meta')))
+        if self.meta['version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported detection file version: {self.meta['version']}")
+
+        has_strips = 'strip_pixels' in self.data
+        if use_strips and not has_strips:
+            raise ValueError(f"{path} was recorded without strips")
+        self.use_strips = has_strips if use_strips is None else use_strips
+        self.names = {int(k): v for k, v in self.meta['names'].items()}
+
+    def __len__(self):
+        return len(self.meta['image_ids'])
+
+    def mounts_for(self, index):
+        '''Rebuild the mounts dict of one image'''
+        mounts = {name: self.data['mount_points'][index, j]
+                  for j, name in enumerate(self.meta['point_mounts'])}
+        mounts.update({name: float(self.data['mount_scalars'][index, j])
+                       for j, name in enumerate(self.meta['scalar_mounts'])})
+        return mounts
+
+    def canvas_for(self, index):
+        '''Grayscale image holding every stored strip of one image (zeros elsewhere)'''
+        canvas = np.zeros(tuple(self.data['shapes'][index]), dtype=np.uint8)
+        start, end = self.data['line_offsets'][index:index + 2]
+        for line in range(start, end):
+            x0, y0, h, w = self.data['strip_boxes'][line]
+            if h == 0 or w == 0:
+                continue
+            lo, hi = self.data['strip_offsets'][line:line + 2]
+            region = canvas[y0:y0 + h, x0:x0 + w]
+            np.maximum(region, self.data['strip_pixels'][lo:hi].reshape(h, w), out=region)
+        return canvas
+
+    def __iter__(self):
+        '''Yield (image_id, interpretations) for every recorded image'''
+        valid_lines = [valid_keypoints(kpts) for kpts in self.data['keypoints']]
+        geometries = FeatureExtractor.extract_geometry_batch(valid_lines)
+
+        offsets = self.data['line_offsets']
+        for index, image_id in enumerate(self.meta['image_ids']):
+            mounts = self.mounts_for(index)
+            ctx = ImageContext(self.canvas_for(index)) if self.use_strips else None
+            interpretations = {}
+
+            for line in range(offsets[index], offsets[index + 1]):
+                valid_kpts = valid_lines[line]
+                if len(valid_kpts) < 2:
+                    continue
+
+                class_id = int(self.data['class_ids'][line])
+                class_name = self.names.get(class_id, f"Line_{class_id}")
+                line_type = PalmReadingPipeline.line_type_for(class_name)
+                if not line_type:
+                    continue
+
+                if ctx is not None:
+                    branches = FeatureExtractor.detect_actual_branches(valid_kpts, ctx)
+                    thickness = FeatureExtractor.calculate_line_thickness(valid_kpts, ctx)
+                else:
+                    upward, downward, forks = self.data['branches'][line].tolist()
+                    branches = {'upward': upward, 'downward': downward, 'forks': forks}
+                    thickness = float(self.data['thickness'][line])
+
+                features = FeatureExtractor.assemble_features(valid_kpts, geometries[line], branches, thickness)
+                features['length_class'] = MountBasedClassifier.classify_line_length_by_mounts(
+                    valid_kpts[0], valid_kpts[-1], line_type, mounts
+                )
+                interpretations[class_name] = {
+                    'features': features,
+                    'interpretation': PalmReadingPipeline.interpret_features(line_type, features)
+                }
+
+            yield image_id, interpretations
+
+    def run(self):
+        '''All replayed results as a list of (image_id, interpretations)'''
+        return list(self)
+
+
+def record_detections(image_paths, yolo_model_path, output_path, store_strips=False, target_size=1024):
+    '''Run the full pipeline over image_paths and save their raw detections'''
+    recorder = DetectionRecorder(store_strips=store_strips)
+    with PalmReadingPipeline(yolo_model_path, target_size=target_size, recorder=recorder) as pipeline:
+        for image_path in image_paths:
+            try:
+                pipeline.process(image_path)
+            except ValueError as e:
+                logger.warning("Skipping %s: %s", image_path, e)
+    recorder.save(output_path)
+    return len(recorder)
+
+
+def main(argv=None):
+    '''CLI: python replay.py record IMAGES... --output F | python replay.py run F'''
+    parser = argparse.ArgumentParser(description="Record detections once, replay downstream stages offline")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record = commands.add_parser('record', help="Run the model stack and save raw detections")
+    record.add_argument('inputs', nargs='+', help="Image files, directories or glob patterns")
+    record.add_argument('--model', default='best.pt', help="Path to YOLO model")
+    record.add_argument('--output', default='detections.npz', help="Detection file to write")
+    record.add_argument('--strips', action='store_true', help="Also store pixel strips along each line")
+    record.add_argument('--target-size', type=int, default=1024, help="Standardized longer edge in px")
+
+    run = commands.add_parser('run', help="Recompute features and interpretations from a detection file")
+    run.add_argument('detections', help="File written by 'record'")
+    run.add_argument('--no-strips', action='store_true', help="Use recorded thickness/branches even if strips exist")
+    run.add_argument('--output', help="Write interpretations as JSON")
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        from main import collect_image_paths
+        image_paths = collect_image_paths(args.inputs)
+        if not image_paths:
+            parser.error("no images found")
+        count = record_detections(image_paths, args.model, args.output, args.strips, args.target_size)
+        print(f"Recorded {count}/{len(image_paths)} images to {args.output}")
+        return count
+
+    engine = ReplayEngine(args.detections, use_strips=False if args.no_strips else None)
+    start = time.perf_counter()
+    results = engine.run()
+    elapsed = time.perf_counter() - start
+    print(f"Replayed {len(results)} images in {elapsed:.3f}s "
+          f"({len(results) / elapsed if elapsed else float('inf'):.0f} images/s, "
+          f"strips={'on' if engine.use_strips else 'off'})")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({image_id: to_jsonable(interp) for image_id, interp in results}, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+'''Asyncio serving front-end: bounded request queue, pipeline workers and YOLO micro-batching'''
+import asyncio
+import functools
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.detectors import LineDetector
+from core.instrumentation import StageMetrics
+from config import SERVING_WORKERS, SERVING_MAX_QUEUE, SERVING_MAX_BATCH, SERVING_BATCH_WINDOW_MS, TORCH_NUM_THREADS
+from pipeline import PalmReadingPipeline
+from logging_config import get_logger
+
+logger = get_logger('serving')
+
+
+class ServerBusy(RuntimeError):
+    '''Raised by PalmServer.submit when the request queue is full'''
+
+
+class MicroBatcher:
+    '''
+    Line detector that merges concurrent detect() calls into detect_batch()
+
+    Callers block in detect() while a single background thread gathers
+    the requests arriving within ``window_ms`` of the first one (at most
+    ``max_batch``) and runs them as one forward pass. The wrapped model is
+    only ever called from that thread.
+    '''
+
+    def __init__(self, line_detector, max_batch=SERVING_MAX_BATCH, window_ms=SERVING_BATCH_WINDOW_MS):
+        if max_batch < 1:
+            raise ValueError(f"max_batch must be >= 1, got {max_batch}")
+        self.line_detector = line_detector
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self.batch_sizes = deque(maxlen=1000)
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='yolo-batcher', daemon=True)
+        self._thread.start()
+
+    @property
+    def model(self):
+        return self.line_detector.model
+
+    @property
+    def model_path(self):
+        return getattr(self.line_detector, 'model_path', None)
+
+    def detect(self, image, conf=0.3, iou=0.4):
+        '''Queue one image for the next batch and wait for its result'''
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._pending.append((image, conf, iou, future))
+            self._cond.notify()
+        return future.result()
+
+    def detect_batch(self, images, conf=0.3, iou=0.4):
+        '''Already-batched calls (process_batch) go through the same queue'''
+        futures = []
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            for image in images:
+                future = Future()
+                self._pending.append((image, conf, iou, future))
+                futures.append(future)
+            self._cond.notify()
+        return [future.result() for future in futures]
+
+    def _next_batch(self):
+        '''Block until work arrives, then collect for up to one window; [] once closed'''
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            deadline = time.monotonic() + self.window
+            while len(self._pending) < self.max_batch and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+
+            # Requests with different thresholds cannot share a predict() call
+            groups = {}
+            for entry in batch:
+                groups.setdefault(entry[1:3], []).append(entry)
+            for (conf, iou), entries in groups.items():
+                self.batch_sizes.append(len(entries))
+                try:
+                    results = self.line_detector.detect_batch([entry[0] for entry in entries], conf=conf, iou=iou)
+                except Exception as e:
+                    for entry in entries:
+                        entry[3].set_exception(e)
+                    continue
+                for entry, result in zip(entries, results):
+                    entry[3].set_result(result)
+
+    def stats(self):
+        '''Number of forward passes and images, plus the mean batch size over recent passes'''
+        sizes = list(self.batch_sizes)
+        return {
+            'batches': len(sizes),
+            'images': sum(sizes),
+            'mean_batch_size': sum(sizes) / len(sizes) if sizes else 0.0,
+            'max_batch': self.max_batch,
+            'window_ms': self.window * 1000,
+        }
+
+    def close(self):
+        '''Finish the queued requests, then stop the batching thread'''
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+
+class PalmServer:
+    '''
+    Asyncio front-end for one shared PalmReadingPipeline
+
+    Requests wait in a bounded queue; ``workers`` tasks take them off and
+    run ``pipeline.process_array`` on a thread pool of the same size. When
+    the queue is full, submit() raises ServerBusy instead of letting
+    latency grow without bound. Queue wait and service time are kept as
+    rolling percentiles in ``self.metrics``.
+    '''
+
+    def __init__(self, pipeline, workers=SERVING_WORKERS, max_queue=SERVING_MAX_QUEUE, metrics_window=1000):
+        if workers < 1:
+            raise ValueError(f"workers must be >= 1, got {workers}")
+        self.pipeline = pipeline
+        self.workers = workers
+        self.max_queue = max_queue
+        self.metrics = StageMetrics(metrics_window)
+        self.counters = {'accepted': 0, 'rejected': 0, 'completed': 0, 'failed': 0, 'cancelled': 0}
+        self.max_depth = 0
+        self.busy = 0
+        self._queue = None
+        self._tasks = []
+        self._executor = None
+
+    @property
+    def running(self):
+        return self._queue is not None
+
+    async def start(self):
+        '''Create the queue and worker tasks on the running event loop (idempotent)'''
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='palm-worker')
+        self._tasks = [asyncio.create_task(self._worker(), name=f"palm-worker-{i}") for i in range(self.workers)]
+        logger.info("Palm server started: %d workers, queue of %d", self.workers, self.max_queue)
+
+    async def submit(self, image, color_order='RGB', render=None, session_id=None, timeout=None):
+        '''
+        Queue one decoded image and wait for its result
+
+        Args:
+            image: HxWx3 uint8 array
+            color_order, render, session_id: as for process_array
+            timeout: Seconds to wait for a queue slot; None rejects at once
+
+        Returns:
+            whatever pipeline.process_array returns
+
+        Raises:
+            ServerBusy: the queue stayed full
+        '''
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        item = (time.perf_counter(), image, color_order, render, session_id, future)
+        try:
+            if timeout is None:
+                self._queue.put_nowait(item)
+            else:
+                await asyncio.wait_for(self._queue.put(item), timeout)
+        except (asyncio.QueueFull, asyncio.TimeoutError):
+            self.counters['rejected'] += 1
+            logger.warning("Rejecting request: queue full (%d waiting)", self._queue.qsize())
+            raise ServerBusy(f"Request queue is full ({self.max_queue} waiting)") from None
+
+        self.counters['accepted'] += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+        return await future
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            enqueued, image, color_order, render, session_id, future = await self._queue.get()
+            try:
+                if future.cancelled():
+                    # The client went away while queued
+                    self.counters['cancelled'] += 1
+                    continue
+
+                started = time.perf_counter()
+                self.busy += 1
+                try:
+                    call = functools.partial(self.pipeline.process_array, image, color_order=color_order,
+                                             render=render, session_id=session_id)
+                    result = await loop.run_in_executor(self._executor, call)
+                except Exception as e:
+                    self.counters['failed'] += 1
+                    if not future.cancelled():
+                        future.set_exception(e)
+                else:
+                    self.counters['completed'] += 1
+                    if not future.cancelled():
+                        future.set_result(result)
+                finally:
+                    self.busy -= 1
+
+                finished = time.perf_counter()
+                self.metrics.record({
+                    'stages': {
+                        'queue_wait': {'ms': (started - enqueued) * 1000, 'count': 1},
+                        'service': {'ms': (finished - started) * 1000, 'count': 1},
+                    },
+                    'total_ms': (finished - enqueued) * 1000,
+                })
+            finally:
+                self._queue.task_done()
+
+    def stats(self):
+        '''Queue depth, worker occupancy, request counters and wait/service percentiles'''
+        stats = {
+            'queue_depth': self._queue.qsize() if self.running else 0,
+            'max_queue_depth': self.max_depth,
+            'queue_capacity': self.max_queue,
+            'workers': self.workers,
+            'busy_workers': self.busy,
+            **self.counters,
+            'latency': self.metrics.snapshot(),
+        }
+        batcher = self.pipeline.line_detector
+        if isinstance(batcher, MicroBatcher):
+            stats['batching'] = batcher.stats()
+        return stats
+
+    async def close(self):
+        '''Let queued requests finish, then stop workers, threads and the pipeline'''
+        if not self.running:
+            return
+        await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=True)
+        if isinstance(self.pipeline.line_detector, MicroBatcher):
+            self.pipeline.line_detector.close()
+        self.pipeline.close()
+        self._queue = None
+        self._tasks = []
+
+
+def build_server(yolo_model_path, workers=SERVING_WORKERS, max_queue=SERVING_MAX_QUEUE,
+                 max_batch=SERVING_MAX_BATCH, batch_window_ms=SERVING_BATCH_WINDOW_MS,
+                 line_detector=None, **pipeline_kwargs):
+    '''
+    PalmServer whose pipeline sends YOLO calls through a MicroBatcher
+
+    Batches are capped at ``workers``: no more requests can be waiting on
+    YOLO at once, so a full batch runs without waiting out the window.
+    Extra keyword arguments go to PalmReadingPipeline; ``torch_threads``
+    also configures the LineDetector built here when none is given.
+    '''
+    if line_detector is None:
+        line_detector = LineDetector(yolo_model_path,
+                                     num_threads=pipeline_kwargs.get('torch_threads', TORCH_NUM_THREADS))
+    batcher = MicroBatcher(line_detector, min(max_batch, workers), batch_window_ms)
+    pipeline = PalmReadingPipeline(yolo_model_path, line_detector=batcher, **pipeline_kwargs)
+    return PalmServer(pipeline, workers, max_queue)
@@ -0,0 +1,77 @@
+import json
+import logging
+
+import torch
+
+from benchmarks import autotune_threads, bench_pipeline
+from core.features import FeatureExtractor
+from logging_config import LOGGER_NAME, setup_logging
+
+
+class TestBenchmarkHarness:
+    def test_smoke_run_writes_report(self, tmp_path):
+        '''Tiny offline run produces per-stage and micro timings'''
+        output = tmp_path / 'bench.json'
+        exit_code = bench_pipeline.main([
+            '--output', str(output), '--sizes', '240x320', '--images', '1',
+            '--repeat', '1', '--warmup', '0', '--keypoints', '8', '--no-yolo',
+        ])
+        assert exit_code == 0
+
+        report = json.loads(output.read_text())
+        stages = report['pipeline']['240x320']['stages']
+        assert set(stages) == set(bench_pipeline.STAGES)
+        assert stages['features']['n'] == 1
+        assert stages['features']['median_ms'] > 0
+        assert '8' in report['micro']['calculate_line_thickness']
+
+        # Compare against itself: no regressions
+        assert bench_pipeline.main([
+            '--output', str(tmp_path / 'again.json'), '--sizes', '240x320', '--images', '1',
+            '--repeat', '1', '--warmup', '0', '--skip-micro', '--no-yolo',
+            '--compare', str(output), '--threshold', '1000',
+        ]) == 0
+
+    def test_profiler_restores_patched_methods(self):
+        '''Wrapped static methods are put back after profiling'''
+        original = FeatureExtractor.__dict__['extract_geometry_batch']
+        with bench_pipeline.StageProfiler() as profiler:
+            profiler.wrap(FeatureExtractor, 'extract_geometry_batch', 'features')
+            assert FeatureExtractor.__dict__['extract_geometry_batch'] is not original
+            FeatureExtractor.extract_geometry_batch([])
+            profiler.commit()
+        assert FeatureExtractor.__dict__['extract_geometry_batch'] is original
+        assert profiler.samples['features'][0] >= 0
+
+
+class TestThreadAutotune:
+    def test_in_process_sweep_reports_best(self, tmp_path):
+        '''A single-worker sweep runs in process and restores torch's thread count'''
+        before = torch.get_num_threads()
+        output = tmp_path / 'tune.json'
+        report = autotune_threads.main([
+            '--threads', '1', '2', '--workers', '1', '--size', '160x120', '--images', '1',
+            '--passes', '1', '--target-size', '256', '--output', str(output),
+        ])
+        assert torch.get_num_threads() == before
+        assert [trial['threads'] for trial in report['trials']] == [1, 2]
+        assert all(trial['images'] == 1 and trial['images_per_second'] > 0 for trial in report['trials'])
+        assert report['best'] in report['trials']
+        assert json.loads(output.read_text())['best'] == report['best']
+
+    def test_verbose_controls_log_level(self, tmp_path):
+        '''Pipeline logging is quiet unless --verbose is given'''
+        args = ['--threads', '1', '--workers', '1', '--size', '160x120', '--images', '1',
+                '--passes', '1', '--target-size', '256']
+        try:
+            autotune_threads.main(args)
+            assert logging.getLogger(LOGGER_NAME).level == logging.WARNING
+            autotune_threads.main(args + ['--verbose'])
+            assert logging.getLogger(LOGGER_NAME).level == logging.INFO
+        finally:
+            setup_logging()
+
+    def test_default_thread_counts(self):
+        assert autotune_threads.default_thread_counts(1) == [1]
+        assert autotune_threads.default_thread_counts(12) == [1, 2, 4, 8, 12]
+        assert autotune_threads.default_thread_counts(32) == [1, 2, 4, 8, 16, 32]
@@ -0,0 +1,277 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+from core.cache import LandmarkStore, ResultCache, SessionPriors, config_fingerprint, file_digest, image_digest, model_fingerprint
+from pipeline import PalmReadingPipeline
+from benchmarks.synthetic import UPRIGHT_LANDMARKS, SyntheticLineDetector, make_hand, upright_orient_hand
+
+
+def make_entry(size=10, value=0):
+    image = np.full((size, size, 3), value, dtype=np.uint8)
+    interpretations = {'life_line': {'interpretation': 'Strong vitality', 'length': np.float64(12.5)}}
+    mounts = {'jupiter': np.array([4, 5])}
+    return image, interpretations, mounts
+
+
+class TestFingerprints:
+    def test_image_digest_tracks_pixels_shape_and_dtype(self):
+        '''Equal pixels hash equally; any pixel, shape or dtype change alters the key'''
+        img = np.zeros((4, 4, 3), dtype=np.uint8)
+        changed = img.copy()
+        changed[0, 0, 0] = 1
+        assert image_digest(img) == image_digest(img.copy())
+        assert image_digest(img) != image_digest(changed)
+        assert image_digest(img) != image_digest(img.reshape(4, 12))
+        assert image_digest(img) != image_digest(img.astype(np.uint16))
+
+    def test_model_and_config_fingerprints(self, tmp_path):
+        '''Weights are hashed by content; config hash is stable'''
+        weights = tmp_path / 'best.pt'
+        weights.write_bytes(b'weights-v1')
+        first = model_fingerprint(str(weights))
+        assert first == file_digest(str(weights))
+        assert model_fingerprint('yolov8n-pose.yaml') == 'yolov8n-pose.yaml'
+        assert config_fingerprint() == config_fingerprint()
+
+
+class TestResultCache:
+    def test_lru_eviction_by_count(self):
+        '''Least recently used entries are dropped first'''
+        cache = ResultCache(max_entries=2)
+        for key in 'ab':
+            cache.put(key, *make_entry())
+        cache.get('a')
+        cache.put('c', *make_entry())
+
+        assert cache.get('b') is None
+        assert cache.get('a') is not None and cache.get('c') is not None
+        assert cache.stats()['evictions'] == 1
+
+    def test_byte_limit(self):
+        '''Entries are evicted once total image bytes exceed max_bytes'''
+        cache = ResultCache(max_bytes=2 * 300)
+        for key in 'abc':
+            cache.put(key, *make_entry(size=10))
+        stats = cache.stats()
+        assert stats['entries'] == 2
+        assert stats['bytes'] == 600
+
+    def test_ttl_expiry(self, monkeypatch):
+        '''Entries older than ttl count as misses'''
+        cache = ResultCache(ttl=10)
+        cache.put('a', *make_entry())
+        now = time.time()
+        monkeypatch.setattr(time, 'time', lambda: now + 11)
+        assert cache.get('a') is None
+        stats = cache.stats()
+        assert stats['expirations'] == 1 and stats['misses'] == 1
+
+    def test_disk_round_trip(self, tmp_path):
+        '''A fresh cache on the same directory serves entries from disk'''
+        image, interpretations, mounts = make_entry(value=7)
+        annotations = {'lines': [([[1, 2], [3, 4]], 'life_line')], 'color_order': 'BGR'}
+        ResultCache(disk_dir=str(tmp_path)).put('k', image, interpretations, mounts, annotations)
+        ResultCache(disk_dir=str(tmp_path)).put('none', None, None, None)
+
+        cache = ResultCache(disk_dir=str(tmp_path))
+        cached_image, cached_interp, cached_mounts, cached_annotations = cache.get('k')
+        np.testing.assert_array_equal(cached_image, image)
+        assert cached_interp == {'life_line': {'interpretation': 'Strong vitality', 'length': 12.5}}
+        np.testing.assert_array_equal(cached_mounts['jupiter'], mounts['jupiter'])
+        assert cached_annotations == {'lines': [[[[1, 2], [3, 4]], 'life_line']], 'color_order': 'BGR'}
+        assert cache.get('none') == (None, None, None, None)
+
+        cache.get('k')
+        stats = cache.stats()
+        assert stats['disk_hits'] == 2 and stats['memory_hits'] == 1
+        assert stats['hit_rate'] == 1.0
+
+    def test_entries_are_isolated_from_callers(self):
+        '''Changing what was stored or returned does not alter the cached entry'''
+        cache = ResultCache()
+        image, interpretations, mounts = make_entry(value=3)
+        cache.put('k', image, interpretations, mounts)
+        image[:] = 0
+        interpretations['life_line']['interpretation'] = 'changed'
+        mounts['jupiter'][0] = 99
+
+        first = cache.get('k')
+        first[0][:] = 0
+        first[1]['life_line']['interpretation'] = 'CLOBBERED'
+        first[2]['jupiter'][1] = 99
+
+        cached_image, cached_interp, cached_mounts, _ = cache.get('k')
+        assert (cached_image == 3).all()
+        assert cached_interp['life_line']['interpretation'] == 'Strong vitality'
+        np.testing.assert_array_equal(cached_mounts['jupiter'], [4, 5])
+
+    def test_memory_and_disk_tiers_return_the_same_types(self, tmp_path):
+        '''A memory hit and a disk hit for one entry are indistinguishable'''
+        image, mounts = make_entry()[0], {'jupiter': np.array([4, 5]), 'palm_width': np.float64(3.5)}
+        interpretations = {'life_line': {'start': (1, 2), 'length': np.float64(12.5)}}
+        ResultCache(disk_dir=str(tmp_path)).put('k', image, interpretations, mounts)
+
+        memory = ResultCache()
+        memory.put('k', image, interpretations, mounts)
+        from_memory = memory.get('k')
+        from_disk = ResultCache(disk_dir=str(tmp_path)).get('k')
+        assert from_memory[1] == from_disk[1] == {'life_line': {'start': [1, 2], 'length': 12.5}}
+        for name in mounts:
+            assert type(from_memory[2][name]) is type(from_disk[2][name])
+            np.testing.assert_array_equal(from_memory[2][name], from_disk[2][name])
+
+
+class TestPipelineCache:
+    @pytest.fixture
+    def palm_pipeline(self):
+        palm_pipeline = PalmReadingPipeline(None, target_size=256, line_detector=SyntheticLineDetector(run_model=False),
+                                            cache=ResultCache())
+        palm_pipeline.hand_detector.orient_hand = upright_orient_hand
+        yield palm_pipeline
+        palm_pipeline.close()
+
+    def test_repeat_upload_is_served_from_cache(self, palm_pipeline, monkeypatch):
+        '''Second call with identical pixels skips every stage and returns a fresh copy'''
+        img = np.random.default_rng(0).integers(0, 255, (300, 200, 3), dtype=np.uint8)
+        first_img, first_interp, first_mounts = palm_pipeline.process_array(img.copy(), color_order='BGR')
+
+        def fail(*args, **kwargs):
+            raise AssertionError('pipeline stage ran on a cache hit')
+        monkeypatch.setattr(palm_pipeline, 'prepare_image', fail)
+
+        second_img, second_interp, second_mounts = palm_pipeline.process_array(img.copy(), color_order='BGR')
+        np.testing.assert_array_equal(first_img, second_img)
+        assert second_img is not first_img
+        assert second_interp == first_interp
+        assert second_mounts.keys() == first_mounts.keys()
+
+        second_interp['life_line']['interpretation'] = 'CLOBBERED'
+        third_interp = palm_pipeline.process_array(img.copy(), color_order='BGR')[1]
+        assert third_interp['life_line']['interpretation'] != 'CLOBBERED'
+
+        with pytest.raises(AssertionError):
+            palm_pipeline.process_array(img.copy(), color_order='RGB')
+
+        stats = palm_pipeline.cache.stats()
+        assert stats['hits'] == 2 and stats['stores'] == 1
+
+
+    def test_batch_mode_uses_the_cache(self, palm_pipeline, monkeypatch):
+        '''process_batch stores its results and serves repeats without running any stage'''
+        rng = np.random.default_rng(1)
+        images = [rng.integers(0, 255, (300, 200 + 10 * i, 3), dtype=np.uint8) for i in range(3)]
+        first = palm_pipeline.process_batch([img.copy() for img in images], batch_size=2)
+        assert palm_pipeline.cache.stats()['stores'] == 3
+
+        def fail(*args, **kwargs):
+            raise AssertionError('pipeline stage ran on a cache hit')
+        monkeypatch.setattr(palm_pipeline, 'prepare_image', fail)
+        monkeypatch.setattr(palm_pipeline.line_detector, 'detect_batch', fail)
+
+        second = palm_pipeline.process_batch([img.copy() for img in images], batch_size=2)
+        for (img_a, _, _), (img_b, _, _) in zip(first, second):
+            np.testing.assert_array_equal(img_a, img_b)
+        assert palm_pipeline.process_array(images[0].copy(), color_order='BGR')[1] == second[0][1]
+        assert palm_pipeline.cache.stats()['hits'] == 4
+
+    @pytest.mark.parametrize('disk', [False, True])
+    def test_hit_matches_miss(self, palm_pipeline, tmp_path, disk):
+        '''A hit returns the same types, image and re-renderable overlay as the miss that stored it'''
+        if disk:
+            palm_pipeline.cache = ResultCache(disk_dir=str(tmp_path))
+        img = np.random.default_rng(2).integers(0, 255, (300, 260, 3), dtype=np.uint8)
+        miss = palm_pipeline.process_array(img.copy(), color_order='BGR')
+        if disk:
+            palm_pipeline.cache = ResultCache(disk_dir=str(tmp_path))
+        hit = palm_pipeline.process_array(img.copy(), color_order='BGR')
+        assert palm_pipeline.cache.stats()['hits'] == 1 and hit.overlay.lines
+
+        np.testing.assert_array_equal(miss.image, hit.image)
+        assert miss.interpretations == hit.interpretations
+        assert miss.mounts.keys() == hit.mounts.keys()
+        for name in miss.mounts:
+            assert type(miss.mounts[name]) is type(hit.mounts[name])
+            np.testing.assert_array_equal(miss.mounts[name], hit.mounts[name])
+        np.testing.assert_array_equal(miss.render(), hit.render())
+        np.testing.assert_array_equal(miss.render(max_size=128), hit.render(max_size=128))
+
+
+class TestLandmarkStore:
+    def test_persists_across_instances(self, tmp_path):
+        '''Records are appended to disk and reloaded; a torn last line is skipped'''
+        path = str(tmp_path / 'landmarks.jsonl')
+        store = LandmarkStore(path)
+        store.put('a', 90, np.array([[0.1, 0.2, 0.0]] * 21))
+        store.put('b', 0, None)
+        with open(path, 'a') as f:
+            f.write('{"key": "c", "ang')
+
+        reloaded = LandmarkStore(path)
+        assert len(reloaded) == 2
+        angle, coords = reloaded.get('a')
+        assert angle == 90 and coords[0] == [0.1, 0.2, 0.0]
+        assert reloaded.get('b') == (0, None)
+        assert reloaded.get('c') is None
+        assert reloaded.stats() == {'hits': 2, 'misses': 1, 'stores': 0, 'entries': 2}
+
+    def test_file_does_not_grow_with_repeats(self, tmp_path):
+        '''Unchanged re-puts are not appended; superseded records are compacted away on load'''
+        path = tmp_path / 'landmarks.jsonl'
+        store = LandmarkStore(str(path))
+        for _ in range(3):
+            store.put('a', 90, None)
+        store.put('b', 0, None)
+        store.put('b', 180, None)
+        assert len(path.read_text().splitlines()) == 3
+        assert store.stats()['stores'] == 3
+
+        reloaded = LandmarkStore(str(path))
+        assert reloaded.get('b') == (180, None)
+        assert len(path.read_text().splitlines()) == 2
+        assert LandmarkStore(str(path)).get('a') == (90, None)
+
+    def test_pipeline_skips_mediapipe_on_reprocessing(self, tmp_path):
+        '''A new pipeline on the same store replays the stored rotation and landmarks'''
+        path = str(tmp_path / 'landmarks.jsonl')
+        img = np.random.default_rng(1).integers(0, 255, (200, 300, 3), dtype=np.uint8)
+        calls = []
+
+        def rotating_orient_hand(image, mode=None, **hints):
+            calls.append(image.shape)
+            return cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE), 90, make_hand(UPRIGHT_LANDMARKS)
+
+        results = []
+        for _ in range(2):
+            with PalmReadingPipeline(None, target_size=256, line_detector=SyntheticLineDetector(run_model=False),
+                                     landmark_store=LandmarkStore(path)) as palm_pipeline:
+                palm_pipeline.hand_detector.orient_hand = rotating_orient_hand
+                results.append(palm_pipeline.process_array(img.copy(), color_order='BGR'))
+
+        assert len(calls) == 1
+        (img_a, interp_a, mounts_a), (img_b, interp_b, mounts_b) = results
+        np.testing.assert_array_equal(img_a, img_b)
+        assert img_b.shape[0] > img_b.shape[1]
+        assert interp_a == interp_b
+        for name in mounts_a:
+            np.testing.assert_allclose(mounts_a[name], mounts_b[name])
+
+
+class TestSessionPriors:
+    def test_bounded_by_count_and_age(self, monkeypatch):
+        '''Least recently used sessions go first; stale ones expire; None is never stored'''
+        priors = SessionPriors(max_sessions=2, ttl=10)
+        priors.put('a', 90)
+        priors.put('b', 180)
+        assert priors.get('a') == 90
+        priors.put('c', 270)
+        assert priors.get('b') is None
+        assert len(priors) == 2
+
+        priors.put(None, 90)
+        assert priors.get(None) is None and len(priors) == 2
+
+        now = time.time()
+        monkeypatch.setattr(time, 'time', lambda: now + 11)
+        assert priors.get('a') is None and priors.get('c') is None
@@ -0,0 +1,292 @@
+import contextlib
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+from core.detectors import HandDetector, LineDetector, LineModelPool
+from benchmarks.synthetic import make_hand
+
+
+class TestHandsSessionManager:
+    def setup_method(self):
+        self.detector = HandDetector()
+        self.blank = np.zeros((128, 128, 3), dtype=np.uint8)
+
+    def teardown_method(self):
+        self.detector.close()
+
+    def test_sessions_are_reused(self):
+        '''Repeated calls reuse the same pooled graph'''
+        for _ in range(3):
+            assert self.detector.get_landmarks(self.blank) is None
+
+        stats = self.detector.sessions.stats()
+        assert stats['created'] == 1
+        assert stats['reused'] == 2
+        assert stats['idle'] == 1
+
+    def test_sessions_keyed_by_confidence(self):
+        '''Different confidences get different sessions'''
+        self.detector.get_landmarks(self.blank, confidence=0.5)
+        self.detector.get_landmarks(self.blank, confidence=0.3)
+        assert self.detector.sessions.stats()['created'] == 2
+
+    def test_concurrent_checkout(self):
+        '''Threads never share a checked-out session'''
+        in_use = set()
+        lock = threading.Lock()
+        errors = []
+
+        def worker():
+            for _ in range(5):
+                with self.detector.sessions.session(0.5) as hands:
+                    with lock:
+                        if id(hands) in in_use:
+                            errors.append(id(hands))
+                        in_use.add(id(hands))
+                    hands.process(self.blank)
+                    with lock:
+                        in_use.discard(id(hands))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert not errors
+        stats = self.detector.sessions.stats()
+        assert stats['created'] + stats['reused'] == 20
+        assert stats['created'] <= 4
+
+    def test_close_rejects_new_sessions(self):
+        '''Closed manager refuses checkouts'''
+        with HandDetector() as detector:
+            detector.get_landmarks(self.blank)
+        with pytest.raises(RuntimeError):
+            detector.get_landmarks(self.blank)
+
+
+
+class TestFastOrientation:
+    def setup_method(self):
+        # Upright hand: wrist at bottom, fingers pointing up
+        self.upright = make_hand({0: (0.5, 0.9), 5: (0.4, 0.5), 12: (0.5, 0.1), 17: (0.6, 0.5)})
+
+    def test_rotate_landmarks_round_trip(self):
+        '''Rotating by 90 then 270 restores the original coordinates'''
+        back = HandDetector.rotate_landmarks(HandDetector.rotate_landmarks(self.upright, 90), 270)
+        for a, b in zip(self.upright.landmark, back.landmark):
+            assert a.x == pytest.approx(b.x)
+            assert a.y == pytest.approx(b.y)
+
+    @pytest.mark.parametrize('angle', [0, 90, 180, 270])
+    def test_best_rotation_restores_upright(self, angle):
+        '''Scoring every frame mathematically recovers the upright rotation'''
+        # Simulate a photo taken rotated so that undoing it needs ``angle``
+        tilted = HandDetector.rotate_landmarks(self.upright, (360 - angle) % 360)
+        scores = {a: HandDetector.uprightness_score(HandDetector.rotate_landmarks(tilted, a))
+                  for a in (0, 90, 180, 270)}
+        assert max(scores, key=scores.get) == angle
+
+
+
+class MarkerHands:
+    '''MediaPipe stand-in: the hand is upright only when the marker pixel is top-left'''
+
+    def __init__(self, upright, sideways):
+        self.upright, self.sideways = upright, sideways
+        self.calls = 0
+
+    def process(self, img_rgb):
+        self.calls += 1
+        hand = self.upright if img_rgb[0, 0, 0] == 255 else self.sideways
+
+        class Results:
+            multi_hand_landmarks = [hand]
+        return Results()
+
+
+class TestOrderedRotationSearch:
+    def setup_method(self):
+        self.upright = make_hand({0: (0.5, 0.9), 5: (0.4, 0.5), 12: (0.5, 0.1), 17: (0.6, 0.5)})
+        self.detector = HandDetector()
+        self.hands = MarkerHands(self.upright, HandDetector.rotate_landmarks(self.upright, 90))
+        hands = self.hands
+
+        class Sessions:
+            def session(self, confidence):
+                return contextlib.nullcontext(hands)
+        self.detector.sessions = Sessions()
+
+        # Landscape frame whose marker reaches the top-left after a 90° clockwise turn
+        self.img = np.zeros((60, 80, 3), dtype=np.uint8)
+        self.img[-1, 0] = 255
+
+    @pytest.mark.parametrize('shape, exif, prior, expected', [
+        ((100, 50), None, None, [0, 180, 90, 270]),
+        ((50, 100), None, None, [90, 270, 0, 180]),
+        ((50, 100), 90, None, [0, 90, 270, 180]),
+        ((50, 100), 0, 180, [180, 0, 90, 270]),
+    ])
+    def test_rotation_order(self, shape, exif, prior, expected):
+        '''Prior first, then EXIF (image already upright), then aspect ratio'''
+        assert HandDetector.rotation_order(shape, exif, prior) == expected
+
+    def test_likely_angle_needs_one_pass(self):
+        img, angle, hand_landmarks = self.detector.orient_hand(self.img, mode='ordered')
+        assert angle == 90 and self.hands.calls == 1
+        assert img.shape[:2] == (80, 60)
+        assert hand_landmarks is self.upright
+
+    def test_wrong_prior_costs_one_extra_pass(self):
+        _, angle, _ = self.detector.orient_hand(self.img, mode='ordered', prior=180)
+        assert angle == 90 and self.hands.calls == 2
+
+    def test_exhaustive_mode_tries_every_rotation(self):
+        '''The brute-force mode ignores the hints and never stops early'''
+        img, angle, hand_landmarks = self.detector.orient_hand(self.img, mode='exhaustive', prior=90)
+        assert angle == 90 and self.hands.calls == 4
+        assert hand_landmarks is self.upright
+
+    def test_legacy_search_tries_every_rotation(self):
+        _, angle = self.detector.detect_and_rotate_to_portrait(self.img)
+        assert angle == 90 and self.hands.calls == 4
+
+
+class TestLineDetector:
+    @classmethod
+    def setup_class(cls):
+        # Untrained stand-in pose model; no best.pt needed
+        cls.detector = LineDetector('yolov8n-pose.yaml')
+
+    def test_array_matches_path(self, tmp_path):
+        '''In-memory detection matches the file wrapper on a lossless image'''
+        rng = np.random.default_rng(0)
+        img = rng.integers(0, 255, (320, 240, 3), dtype=np.uint8)
+        path = str(tmp_path / 'palm.png')
+        cv2.imwrite(path, img)
+
+        from_array = self.detector.detect(img, conf=0.01)
+        from_path = self.detector.detect_path(path, conf=0.01)
+        np.testing.assert_allclose(from_array.keypoints.xy.cpu().numpy(),
+                                   from_path.keypoints.xy.cpu().numpy())
+        assert list(tmp_path.iterdir()) == [tmp_path / 'palm.png']
+
+    def test_missing_path_raises(self, tmp_path):
+        '''Unreadable files raise ValueError'''
+        with pytest.raises(ValueError):
+            self.detector.detect_path(str(tmp_path / 'missing.jpg'))
+
+    def test_concurrent_detection_matches_serial(self):
+        '''Threads sharing one detector get the same keypoints as serial calls'''
+        detector = LineDetector('yolov8n-pose.yaml', max_instances=3)
+        rng = np.random.default_rng(1)
+        images = [rng.integers(0, 255, (256, 192, 3), dtype=np.uint8) for _ in range(6)]
+        expected = [detector.detect(img, conf=0.01).keypoints.xy.cpu().numpy() for img in images]
+
+        results = [None] * len(images)
+        barrier = threading.Barrier(len(images))
+
+        def worker(i):
+            barrier.wait()
+            results[i] = detector.detect(images[i], conf=0.01).keypoints.xy.cpu().numpy()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(images))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for got, want in zip(results, expected):
+            np.testing.assert_allclose(got, want, rtol=1e-4, atol=1e-3)
+        assert detector.pool.stats()['created'] <= 3
+
+
+class TestTorchThreads:
+    def test_configure_threads(self):
+        '''Intra-op threads are applied; None leaves settings untouched'''
+        import torch
+        before = torch.get_num_threads()
+        try:
+            assert LineDetector.configure_threads(1)[0] == 1
+            assert torch.get_num_threads() == 1
+            assert LineDetector.configure_threads() == (1, torch.get_num_interop_threads())
+            with pytest.raises(ValueError):
+                LineDetector.configure_threads(0)
+        finally:
+            torch.set_num_threads(before)
+
+
+class TestLineModelPool:
+    def test_handles_are_exclusive_and_bounded(self):
+        '''No handle is used by two threads at once and at most max_instances exist'''
+        pool = LineModelPool({'weights': 1}, max_instances=2)
+        in_use = set()
+        lock = threading.Lock()
+        errors = []
+
+        def worker():
+            for _ in range(5):
+                with pool.session() as model:
+                    with lock:
+                        if id(model) in in_use:
+                            errors.append(id(model))
+                        in_use.add(id(model))
+                    assert model == {'weights': 1}
+                    with lock:
+                        in_use.discard(id(model))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert not errors
+        stats = pool.stats()
+        assert stats['created'] <= 2
+        assert stats['idle'] == stats['created']
+
+    def test_clones_only_under_contention(self):
+        '''Uncontended callers share the original; the first waiter adds a clone'''
+        original = {'weights': 1}
+        pool = LineModelPool(original, max_instances=2)
+        for _ in range(3):
+            with pool.session() as model:
+                assert model is original
+        assert pool.stats()['created'] == 1
+
+        model = pool.acquire()
+        got = []
+        thread = threading.Thread(target=lambda: got.append(pool.acquire()))
+        thread.start()
+        while pool.stats()['waits'] == 0:
+            time.sleep(0.001)
+        pool.release(model)
+        thread.join(1)
+        stats = pool.stats()
+        assert got[0] is original and stats['created'] == 2 and stats['idle'] == 1
+        assert pool.acquire() is not original
+
+    def test_single_instance_serializes(self):
+        '''With one instance, a second caller waits until the handle returns'''
+        pool = LineModelPool(object(), max_instances=1)
+        model = pool.acquire()
+        acquired = threading.Event()
+
+        def waiter():
+            pool.release(pool.acquire())
+            acquired.set()
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        assert not acquired.wait(0.1)
+        pool.release(model)
+        thread.join(1)
+        assert acquired.is_set()
+        assert pool.stats()['waits'] >= 1
+        with pytest.raises(ValueError):
+            LineModelPool(object(), max_instances=0)
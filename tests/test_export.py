@@ -0,0 +1,105 @@
+import os
+import numpy as np
+import pytest
+from ultralytics import YOLO
+from core.detectors import LineDetector
+from core.export import exported_path, is_exported, resolve_line_model, export_line_model
+from pipeline import PalmReadingPipeline
+from benchmarks.synthetic import make_palm_image
+
+
+@pytest.fixture(scope='module')
+def weights(tmp_path_factory):
+    '''Untrained stand-in pose weights saved as a .pt file'''
+    path = str(tmp_path_factory.mktemp('weights') / 'standin.pt')
+    YOLO('yolov8n-pose.yaml').save(path)
+    return path
+
+
+@pytest.fixture(scope='module')
+def images():
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8), make_palm_image(384, 512, seed=1)]
+
+
+def assert_same_detections(expected, actual, atol):
+    assert len(actual.boxes) == len(expected.boxes) > 0
+    np.testing.assert_array_equal(actual.boxes.cls.cpu().numpy(), expected.boxes.cls.cpu().numpy())
+    np.testing.assert_allclose(actual.boxes.conf.cpu().numpy(), expected.boxes.conf.cpu().numpy(), atol=1e-3)
+    np.testing.assert_allclose(actual.keypoints.data.cpu().numpy(), expected.keypoints.data.cpu().numpy(),
+                               atol=atol)
+    for a, b in zip(PalmReadingPipeline.unpack_lines(expected), PalmReadingPipeline.unpack_lines(actual)):
+        np.testing.assert_allclose(a, b, atol=atol)
+
+
+class TestExportPaths:
+    def test_naming_and_detection(self):
+        '''Export paths follow ultralytics naming; exported models are recognized'''
+        assert exported_path('models/best.pt', 'onnxruntime') == 'models/best.onnx'
+        assert exported_path('models/best.pt', 'onnxruntime', int8=True) == 'models/best_int8.onnx'
+        assert exported_path('best.pt', 'openvino') == 'best_openvino_model'
+        assert is_exported('best.onnx') and is_exported('best_openvino_model/')
+        assert not is_exported('best.pt')
+        with pytest.raises(ValueError):
+            exported_path('best.pt', 'tensorrt')
+
+    def test_torch_and_exported_paths_pass_through(self):
+        assert resolve_line_model('best.pt', 'torch') == 'best.pt'
+        assert resolve_line_model('best.onnx', 'onnxruntime') == 'best.onnx'
+        with pytest.raises(ValueError):
+            resolve_line_model('best.pt', 'tflite')
+
+    def test_bad_int8_requests(self):
+        with pytest.raises(ValueError):
+            export_line_model('best.pt', 'openvino', int8=True, calibration_images=[])
+        with pytest.raises(ValueError):
+            export_line_model('best.pt', 'onnxruntime', int8=True)
+
+
+class TestOnnxRuntimeBackend:
+    def test_parity_with_ultralytics(self, weights, images):
+        '''ONNX Runtime detections match PyTorch: classes, confidences and keypoints'''
+        pytest.importorskip('onnx')
+        pytest.importorskip('onnxruntime')
+        torch_detector = LineDetector(weights, backend='torch')
+        onnx_detector = LineDetector(weights, backend='onnxruntime')
+        assert onnx_detector.model_path == exported_path(weights, 'onnxruntime')
+        assert onnx_detector.model.names == torch_detector.model.names
+
+        for img in images:
+            assert_same_detections(torch_detector.detect(img, conf=0.01), onnx_detector.detect(img, conf=0.01),
+                                   atol=1e-2)
+        for expected, actual in zip(torch_detector.detect_batch(images, conf=0.01),
+                                    onnx_detector.detect_batch(images, conf=0.01)):
+            assert_same_detections(expected, actual, atol=1e-2)
+
+        # A fresh export is reused rather than redone
+        mtime = os.path.getmtime(onnx_detector.model_path)
+        assert LineDetector(weights, backend='onnxruntime').model_path == onnx_detector.model_path
+        assert os.path.getmtime(onnx_detector.model_path) == mtime
+
+    def test_int8_export_runs(self, weights, images):
+        '''The INT8 model loads with its class names and yields pose-shaped results'''
+        pytest.importorskip('onnx')
+        pytest.importorskip('onnxruntime')
+        path = export_line_model(weights, 'onnxruntime', int8=True, calibration_images=images, imgsz=320)
+        assert path == exported_path(weights, 'onnxruntime', int8=True)
+
+        detector = LineDetector(path, backend='onnxruntime')
+        assert detector.model.names == YOLO(weights).names
+        result = detector.detect(images[1], conf=0.0)
+        assert result.keypoints is not None
+        assert result.keypoints.data.shape[1:] == (17, 3)
+        assert len(result.keypoints) == len(result.boxes)
+
+
+class TestOpenVinoBackend:
+    def test_parity_with_ultralytics(self, weights, images):
+        '''OpenVINO detections match PyTorch to within a fraction of a pixel'''
+        pytest.importorskip('openvino')
+        torch_detector = LineDetector(weights, backend='torch')
+        ov_detector = LineDetector(weights, backend='openvino')
+        assert ov_detector.model_path == exported_path(weights, 'openvino')
+        for img in images:
+            assert_same_detections(torch_detector.detect(img, conf=0.01), ov_detector.detect(img, conf=0.01),
+                                   atol=0.25)
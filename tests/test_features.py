@@ -0,0 +1,222 @@
+import cv2
+import numpy as np
+import pytest
+from scipy.spatial import distance
+from config import BREAK_STD_DEV_THRESHOLD, MAX_THICKNESS_SEARCH, THICKNESS_SAMPLE_POINTS
+from core.features import FeatureExtractor, ImageContext
+from utils import calculate_line_length, turning_angles
+
+
+def reference_line_thickness(keypoints, img, sample_points=THICKNESS_SAMPLE_POINTS):
+    '''Original per-pixel implementation, kept as the equivalence oracle'''
+    if len(keypoints) < 2:
+        return 1
+
+    thicknesses = []
+    indices = np.linspace(0, len(keypoints)-1, min(sample_points, len(keypoints)), dtype=int)
+
+    for idx in indices:
+        if idx >= len(keypoints) - 1:
+            continue
+
+        vec = np.array(keypoints[min(idx+1, len(keypoints)-1)]) - np.array(keypoints[idx])
+        vec_len = np.linalg.norm(vec)
+
+        if vec_len == 0:
+            continue
+
+        perp = np.array([-vec[1], vec[0]]) / vec_len
+        center = keypoints[idx]
+        thickness = 0
+
+        for dist in range(1, MAX_THICKNESS_SEARCH):
+            sample_pos = center + perp * dist
+            x, y = int(sample_pos[0]), int(sample_pos[1])
+
+            if x < 0 or y < 0 or x >= img.shape[1] or y >= img.shape[0]:
+                break
+
+            if len(img.shape) == 3:
+                pixel_val = cv2.cvtColor(img[y:y+1, x:x+1], cv2.COLOR_BGR2GRAY)[0, 0]
+            else:
+                pixel_val = img[y, x]
+
+            if pixel_val < 128:
+                thickness += 1
+            else:
+                break
+
+        thicknesses.append(thickness * 2)
+
+    return np.mean(thicknesses) if thicknesses else 1
+
+
+def reference_branches(keypoints, img, radius=15):
+    '''Original per-ROI threshold implementation'''
+    branches = {'upward': 0, 'downward': 0, 'forks': 0}
+    for i in range(1, len(keypoints) - 1):
+        x, y = int(keypoints[i][0]), int(keypoints[i][1])
+        if x < radius or y < radius or x >= img.shape[1] - radius or y >= img.shape[0] - radius:
+            continue
+        roi = cv2.cvtColor(img[y-radius:y+radius, x-radius:x+radius], cv2.COLOR_BGR2GRAY)
+        _, binary = cv2.threshold(roi, 127, 255, cv2.THRESH_BINARY)
+        num_labels, _ = cv2.connectedComponents(binary)
+        if num_labels > 2:
+            branches['forks'] += 1
+        if i < len(keypoints) - 2:
+            y_trend = keypoints[i+1][1] - keypoints[i][1]
+            if y_trend < -5:
+                branches['upward'] += 1
+            elif y_trend > 5:
+                branches['downward'] += 1
+    return branches
+
+
+def reference_line_length(keypoints):
+    '''Original pairwise scipy implementation'''
+    total_length = 0.0
+    for i in range(len(keypoints) - 1):
+        total_length += distance.euclidean(keypoints[i], keypoints[i+1])
+    return total_length
+
+
+def reference_curvature(keypoints):
+    '''Original per-vertex loop'''
+    if len(keypoints) < 3:
+        return 0, 0
+    actual_length = reference_line_length(keypoints)
+    straight_distance = distance.euclidean(keypoints[0], keypoints[-1])
+    if straight_distance == 0:
+        return 0, 0
+    overall_curvature = (actual_length - straight_distance) / straight_distance
+    angles = []
+    for i in range(1, len(keypoints) - 1):
+        vec1 = np.array(keypoints[i]) - np.array(keypoints[i-1])
+        vec2 = np.array(keypoints[i+1]) - np.array(keypoints[i])
+        norm1 = np.linalg.norm(vec1)
+        norm2 = np.linalg.norm(vec2)
+        if norm1 > 0 and norm2 > 0:
+            cos_angle = np.clip(np.dot(vec1, vec2) / (norm1 * norm2), -1.0, 1.0)
+            angles.append(np.degrees(np.arccos(cos_angle)))
+    return overall_curvature, max(angles) if angles else 0
+
+
+def reference_breaks(keypoints):
+    '''Original per-gap loop'''
+    if len(keypoints) < 2:
+        return 0, []
+    gaps = [distance.euclidean(keypoints[i], keypoints[i+1]) for i in range(len(keypoints) - 1)]
+    break_threshold = np.median(gaps) + BREAK_STD_DEV_THRESHOLD * np.std(gaps)
+    breaks = [i for i, gap in enumerate(gaps) if gap > break_threshold]
+    return len(breaks), breaks
+
+
+def make_lines(seed, count=8):
+    '''Random lines of varying length, some with repeated points and big jumps'''
+    rng = np.random.default_rng(seed)
+    lines = []
+    for _ in range(count):
+        n = int(rng.integers(0, 18))
+        line = np.cumsum(rng.normal(0, 8, (n, 2)), axis=0) + 100
+        if n > 4:
+            line[2] = line[1]
+            line[n // 2:] += rng.uniform(40, 90)
+        lines.append(line)
+    return lines
+
+
+def make_palm_image(seed, shape=(240, 200)):
+    '''Bright background with dark blurred strokes'''
+    rng = np.random.default_rng(seed)
+    img = np.full(shape + (3,), 210, dtype=np.uint8)
+    for _ in range(6):
+        pts = rng.integers(0, min(shape), (4, 2)).astype(np.int32)
+        cv2.polylines(img, [pts], False, (40, 50, 60), int(rng.integers(1, 9)))
+    img = cv2.GaussianBlur(img, (5, 5), 0)
+    noise = rng.integers(-30, 30, img.shape)
+    return np.clip(img.astype(int) + noise, 0, 255).astype(np.uint8)
+
+
+class TestLineThickness:
+    @pytest.mark.parametrize('seed', range(10))
+    def test_matches_reference(self, seed):
+        '''Vectorized thickness equals the per-pixel walk'''
+        rng = np.random.default_rng(seed)
+        img = make_palm_image(seed)
+        for num_points in (2, 3, 7, 20):
+            # Include points near and beyond the image border
+            kpts = rng.uniform(-10, 250, (num_points, 2)).astype(np.float32)
+            expected = reference_line_thickness(kpts, img)
+            assert FeatureExtractor.calculate_line_thickness(kpts, img) == pytest.approx(expected)
+
+    def test_grayscale_input(self):
+        '''Single-channel images are sampled directly'''
+        img = cv2.cvtColor(make_palm_image(3), cv2.COLOR_BGR2GRAY)
+        kpts = np.array([[20, 30], [60, 80], [120, 90], [180, 200]], dtype=np.float32)
+        expected = reference_line_thickness(kpts, img)
+        assert FeatureExtractor.calculate_line_thickness(kpts, img) == pytest.approx(expected)
+
+    def test_degenerate_lines(self):
+        '''Too few or coincident keypoints fall back to 1'''
+        img = make_palm_image(0)
+        assert FeatureExtractor.calculate_line_thickness(np.array([[5.0, 5.0]]), img) == 1
+        same = np.array([[50.0, 50.0], [50.0, 50.0], [50.0, 50.0]])
+        assert FeatureExtractor.calculate_line_thickness(same, img) == 1
+
+
+
+class TestVectorizedGeometry:
+    @pytest.mark.parametrize('seed', range(10))
+    def test_single_line_kernels_match_reference(self, seed):
+        '''Per-line wrappers equal the original scalar loops'''
+        for line in make_lines(seed):
+            assert calculate_line_length(line) == pytest.approx(reference_line_length(line) if len(line) > 1 else 0.0)
+            overall, local = FeatureExtractor.calculate_curvature_improved(line)
+            ref_overall, ref_local = reference_curvature(line)
+            assert overall == pytest.approx(ref_overall)
+            assert local == pytest.approx(ref_local)
+            assert FeatureExtractor.detect_breaks_adaptive(line) == reference_breaks(line)
+
+    @pytest.mark.parametrize('seed', range(10))
+    def test_batch_matches_reference(self, seed):
+        '''One (N, K, 2) call reproduces every line's scalar results'''
+        lines = make_lines(seed)
+        geometries = FeatureExtractor.extract_geometry_batch(lines)
+        assert len(geometries) == len(lines)
+        for line, geometry in zip(lines, geometries):
+            ref_overall, ref_local = reference_curvature(line)
+            ref_breaks, ref_positions = reference_breaks(line)
+            assert geometry['length'] == pytest.approx(reference_line_length(line))
+            assert geometry['curvature_ratio'] == pytest.approx(ref_overall)
+            assert geometry['max_local_curvature'] == pytest.approx(ref_local)
+            assert geometry['breaks'] == ref_breaks
+            assert geometry['break_positions'] == ref_positions
+
+    def test_turning_angles_shape(self):
+        '''Right angle is 90 degrees; degenerate vertices are NaN'''
+        lines = np.array([[[0, 0], [1, 0], [1, 1], [1, 1]]], dtype=float)
+        angles = turning_angles(lines)
+        assert angles.shape == (1, 2)
+        assert angles[0, 0] == pytest.approx(90.0)
+        assert np.isnan(angles[0, 1])
+
+
+class TestImageContext:
+    def test_maps_are_cached(self):
+        '''Grayscale and binary maps are computed once'''
+        ctx = ImageContext(make_palm_image(0))
+        assert ctx.gray is ctx.gray
+        assert ctx.binary is ctx.binary
+        assert ctx.shape == ctx.img.shape
+
+    @pytest.mark.parametrize('seed', range(5))
+    def test_context_matches_plain_array(self, seed):
+        '''Shared maps give the same features as per-ROI preprocessing'''
+        rng = np.random.default_rng(seed)
+        img = make_palm_image(seed)
+        ctx = ImageContext(img)
+        for _ in range(5):
+            kpts = rng.uniform(0, 200, (12, 2)).astype(np.float32)
+            assert FeatureExtractor.detect_actual_branches(kpts, ctx) == reference_branches(kpts, img)
+            assert (FeatureExtractor.calculate_line_thickness(kpts, ctx)
+                    == pytest.approx(reference_line_thickness(kpts, img)))
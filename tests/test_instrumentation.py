@@ -0,0 +1,53 @@
+import pytest
+from core.instrumentation import NULL_TIMER, StageMetrics, StageTimer
+
+
+class TestStageTimer:
+    def test_records_durations_counts_and_hooks(self):
+        '''Repeated stages accumulate; hooks see every block'''
+        seen = []
+        timer = StageTimer(hooks=[lambda stage, ms: seen.append(stage)])
+        for _ in range(3):
+            with timer.stage('features'):
+                pass
+        with timer.stage('draw', count=0):
+            pass
+        timer.add('yolo', 12.5)
+
+        timings = timer.as_dict()
+        assert timings['stages']['features']['count'] == 3
+        assert timings['stages']['draw']['count'] == 0
+        assert timings['stages']['yolo'] == {'ms': 12.5, 'count': 1}
+        assert timings['total_ms'] >= 0
+        assert seen == ['features', 'features', 'features', 'draw', 'yolo']
+
+    def test_null_timer_is_inert(self):
+        '''Disabled timer records nothing and still propagates errors'''
+        with NULL_TIMER.stage('yolo'):
+            pass
+        assert NULL_TIMER.as_dict() is None
+        with pytest.raises(KeyError):
+            with NULL_TIMER.stage('yolo'):
+                raise KeyError('boom')
+
+
+class TestStageMetrics:
+    def test_rolling_percentiles(self):
+        '''Window keeps the most recent samples only'''
+        metrics = StageMetrics(window=100)
+        for ms in range(200):
+            metrics.record({'stages': {'yolo': {'ms': float(ms), 'count': 1}}, 'total_ms': float(ms)})
+
+        snapshot = metrics.snapshot()
+        assert snapshot['yolo']['count'] == 100
+        assert snapshot['yolo']['p50_ms'] == pytest.approx(149.5)
+        assert snapshot['yolo']['p99_ms'] == pytest.approx(198.01)
+        assert metrics.calls == 200
+
+    def test_prometheus_rendering(self):
+        metrics = StageMetrics()
+        metrics.record({'stages': {'yolo': {'ms': 250.0, 'count': 1}}, 'total_ms': 300.0})
+        text = metrics.render_prometheus()
+        assert 'palm_pipeline_stage_seconds{stage="yolo",quantile="0.95"} 0.250000' in text
+        assert 'palm_pipeline_stage_seconds_count{stage="total"} 1' in text
+        assert 'palm_pipeline_calls_total 1' in text
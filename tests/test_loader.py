@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from core.loader import load_image, read_jpeg_header, reduction_for
+
+
+def write_jpeg(path, width, height, orientation=None):
+    rng = np.random.default_rng(0)
+    img = cv2.resize(rng.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8), (width, height))
+    pil_image = Image.fromarray(img)
+    exif = pil_image.getexif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    pil_image.save(path, exif=exif.tobytes(), quality=90)
+    return path
+
+
+class TestJpegHeader:
+    def test_size_and_orientation_without_decoding(self, tmp_path):
+        path = write_jpeg(str(tmp_path / 'phone.jpg'), 640, 480, orientation=6)
+        assert read_jpeg_header(path) == ((640, 480), 6)
+
+    def test_missing_orientation_and_non_jpeg(self, tmp_path):
+        path = write_jpeg(str(tmp_path / 'plain.jpg'), 64, 48)
+        assert read_jpeg_header(path) == ((64, 48), None)
+
+        png = str(tmp_path / 'palm.png')
+        cv2.imwrite(png, np.zeros((10, 10, 3), dtype=np.uint8))
+        assert read_jpeg_header(png) is None
+
+    @pytest.mark.parametrize('data', [b'\xff\xd8\xff\xff', b'\xff\xd8\xff', b'\xff\xd8\xff\xe1\x00'])
+    def test_truncated_headers(self, tmp_path, data):
+        '''Files cut off inside a marker are not JPEG headers, and load as None'''
+        path = tmp_path / 'cut.jpg'
+        path.write_bytes(data)
+        assert read_jpeg_header(str(path)) is None
+        img, _ = load_image(str(path), target_size=8)
+        assert img is None
+
+    @pytest.mark.parametrize('size, expected', [((4000, 3000), 2), ((8192, 6000), 8),
+                                                ((5000, 100), 4), ((1500, 1000), 1)])
+    def test_reduction_keeps_longer_edge_above_target(self, size, expected):
+        assert reduction_for(size, 1024) == expected
+
+
+class TestLoadImage:
+    def test_large_jpeg_decodes_reduced_and_upright(self, tmp_path):
+        '''EXIF orientation 6 is applied and the decode runs at 1/2 scale'''
+        path = write_jpeg(str(tmp_path / 'big.jpg'), 2400, 1600, orientation=6)
+        img, info = load_image(path, target_size=1024)
+        assert img.shape[:2] == (1200, 800)
+        assert info == {'orientation': 6, 'exif_rotation': 90, 'reduction': 2, 'stored_size': (2400, 1600)}
+
+        full, full_info = load_image(path, target_size=1024, reduced=False)
+        assert full.shape[:2] == (2400, 1600) and full_info['reduction'] == 1
+
+    def test_other_formats_and_missing_files(self, tmp_path):
+        png = str(tmp_path / 'palm.png')
+        cv2.imwrite(png, np.full((30, 20, 3), 7, dtype=np.uint8))
+        img, info = load_image(png, target_size=8)
+        assert img.shape == (30, 20, 3) and info['reduction'] == 1
+
+        img, _ = load_image(str(tmp_path / 'missing.jpg'), target_size=8)
+        assert img is None
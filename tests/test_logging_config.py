@@ -0,0 +1,92 @@
+import io
+import json
+import logging
+
+import logging_config
+from logging_config import get_logger, request_context, setup_logging
+
+
+def capture(monkeypatch, **kwargs):
+    '''Point the console handler at a buffer and configure logging'''
+    buffer = io.StringIO()
+    monkeypatch.setattr(logging_config.sys, 'stdout', buffer)
+    setup_logging(**kwargs)
+    return buffer
+
+
+class TestSetupLogging:
+    def teardown_method(self):
+        setup_logging()
+
+    def test_repeated_setup_does_not_duplicate(self, monkeypatch):
+        '''Calling setup twice keeps exactly one console handler'''
+        buffer = capture(monkeypatch)
+        setup_logging()
+        setup_logging()
+        get_logger('test').info("hello %s", "once")
+        assert buffer.getvalue().count("hello once") == 1
+        assert len(logging.getLogger('palm_reader').handlers) == 1
+
+    def test_json_records_carry_request_id_and_extras(self, monkeypatch):
+        buffer = capture(monkeypatch, json_format=True)
+        with request_context('abc123'):
+            get_logger('pipeline').info("stage %s took %.1f ms", "yolo", 12.34, extra={'stage': 'yolo'})
+        get_logger('pipeline').info("outside")
+
+        inside, outside = [json.loads(line) for line in buffer.getvalue().splitlines()]
+        assert inside['message'] == "stage yolo took 12.3 ms"
+        assert inside['request_id'] == 'abc123'
+        assert inside['stage'] == 'yolo'
+        assert inside['logger'] == 'palm_reader.pipeline'
+        assert outside['request_id'] == '-'
+
+    def test_queue_handler_delivers_after_flush(self, monkeypatch):
+        '''Queued records keep the request ID of the emitting thread'''
+        buffer = capture(monkeypatch, json_format=True, use_queue=True)
+        with request_context('queued'):
+            get_logger().warning("via queue")
+        logging_config._stop_queue_listener()
+
+        record = json.loads(buffer.getvalue().strip())
+        assert record['message'] == "via queue"
+        assert record['request_id'] == 'queued'
+
+    def test_queued_records_keep_the_exception(self, monkeypatch):
+        '''Tracebacks survive the queue as a separate JSON field, or after the plain-text line'''
+        buffer = capture(monkeypatch, json_format=True, use_queue=True)
+        try:
+            raise ValueError("bad image")
+        except ValueError:
+            get_logger('pipeline').exception("failed on %s", "palm.jpg")
+        logging_config._stop_queue_listener()
+
+        record = json.loads(buffer.getvalue().strip())
+        assert record['message'] == "failed on palm.jpg"
+        assert 'ValueError: bad image' in record['exception']
+
+        buffer = capture(monkeypatch, use_queue=True)
+        try:
+            raise ValueError("bad image")
+        except ValueError:
+            get_logger('pipeline').exception("failed")
+        logging_config._stop_queue_listener()
+        assert 'failed' in buffer.getvalue() and buffer.getvalue().count('ValueError: bad image') == 1
+
+    def test_debug_arguments_not_formatted_at_info(self, monkeypatch):
+        '''Level gating skips formatting of suppressed records'''
+        capture(monkeypatch, log_level='INFO')
+
+        class Exploding:
+            def __str__(self):
+                raise AssertionError("formatted a suppressed record")
+
+        get_logger('test').debug("value %s", Exploding())
+
+
+class TestRequestContext:
+    def test_nested_context_reuses_outer_id(self):
+        with request_context('outer') as outer:
+            with request_context() as inner:
+                assert inner == outer == 'outer'
+        with request_context() as generated:
+            assert generated and generated != 'outer'
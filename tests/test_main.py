@@ -0,0 +1,76 @@
+import os
+
+import main
+from main import assign_output_paths, collect_image_paths, worker_torch_threads
+
+
+class TestBatchInputs:
+    def test_collect_dirs_globs_and_lists(self, tmp_path):
+        '''Directories, globs and list files expand to unique image paths'''
+        (tmp_path / 'a').mkdir()
+        (tmp_path / 'b').mkdir()
+        for name in ['a/1.jpg', 'a/2.png', 'a/notes.txt', 'b/3.jpeg']:
+            (tmp_path / name).write_bytes(b'')
+        listing = tmp_path / 'list.txt'
+        listing.write_text(f"{tmp_path / 'b' / '3.jpeg'}\n# comment\n\n")
+
+        paths = collect_image_paths([str(tmp_path / 'a'), str(tmp_path / 'b' / '*.jpeg')],
+                                    file_list=str(listing))
+
+        assert [os.path.relpath(p, tmp_path) for p in paths] == ['b/3.jpeg', 'a/1.jpg', 'a/2.png']
+
+    def test_repeated_basenames_get_unique_outputs(self):
+        '''Same filename in different folders does not overwrite results'''
+        jobs = assign_output_paths(['x/palm.jpg', 'y/palm.jpg', 'y/other.png'], 'out')
+        assert [out for _, out in jobs] == [
+            os.path.join('out', 'palm_result.jpg'),
+            os.path.join('out', 'palm_1_result.jpg'),
+            os.path.join('out', 'other_result.jpg'),
+        ]
+
+    def test_suffixes_never_collide_with_real_names(self):
+        '''A suffixed duplicate cannot take the output name of an input that has that name'''
+        jobs = assign_output_paths(['a/palm.jpg', 'b/palm.jpg', 'c/palm_1.jpg', 'd/palm.jpg'], 'out')
+        outputs = [out for _, out in jobs]
+        assert len(set(outputs)) == len(outputs)
+        assert outputs == [os.path.join('out', name) for name in
+                           ['palm_result.jpg', 'palm_1_result.jpg', 'palm_1_1_result.jpg', 'palm_2_result.jpg']]
+
+    def test_json_reports_use_json_extension(self):
+        jobs = assign_output_paths(['x/palm.jpg'], 'out', extension='.json')
+        assert jobs[0][1] == os.path.join('out', 'palm_result.json')
+
+    def test_workers_split_the_cores(self):
+        '''Each worker gets an even share of the cores, at least one thread'''
+        assert worker_torch_threads(4, cpu_count=32) == 8
+        assert worker_torch_threads(3, cpu_count=32) == 10
+        assert worker_torch_threads(64, cpu_count=32) == 1
+
+
+class TestBatchSetup:
+    def test_model_is_exported_once_before_workers_start(self, tmp_path, monkeypatch):
+        '''Workers receive the resolved (exported) path and never export themselves'''
+        calls = []
+        monkeypatch.setattr(main, 'resolve_line_model', lambda path: calls.append(path) or 'best.onnx')
+        monkeypatch.setattr(main, '_init_worker', lambda path, *args: calls.append(('worker', path)))
+        monkeypatch.setattr(main, '_process_job', lambda job: main._job_summary(job[0], job[1], 'ok', 0, 0.0))
+
+        main.process_palm_batch(['a.jpg', 'b.jpg'], 'best.pt', str(tmp_path), workers=1)
+        assert calls == ['best.pt', ('worker', 'best.onnx')]
+
+    def test_cli_torch_threads_win_over_config(self, monkeypatch):
+        '''--torch-threads reaches the worker's LineDetector even when TORCH_NUM_THREADS is set'''
+        import torch
+        from core.detectors import LineDetector
+        defaults = list(LineDetector.__init__.__defaults__)
+        defaults[1] = 3  # as if config.TORCH_NUM_THREADS = 3
+        monkeypatch.setattr(LineDetector.__init__, '__defaults__', tuple(defaults))
+        previous = torch.get_num_threads()
+        try:
+            main._init_worker('yolov8n-pose.yaml', 256, True, torch_threads=1)
+            assert torch.get_num_threads() == 1
+            assert main._worker_pipeline.line_detector.threads[0] == 1
+        finally:
+            main._worker_pipeline.close()
+            main._worker_pipeline = None
+            torch.set_num_threads(previous)
@@ -0,0 +1,313 @@
+import json
+import cv2
+import numpy as np
+import pytest
+from pipeline import PalmReadingPipeline
+from core.detectors import LineDetector
+from core.stages import StageError
+from utils import to_jsonable
+from benchmarks.synthetic import LINE_PATHS, SyntheticLineDetector, upright_orient_hand
+
+
+@pytest.fixture(scope='module')
+def pipeline():
+    palm_pipeline = PalmReadingPipeline(None, target_size=256, line_detector=SyntheticLineDetector(run_model=False))
+    palm_pipeline.hand_detector.orient_hand = upright_orient_hand
+    yield palm_pipeline
+    palm_pipeline.close()
+
+
+def make_images(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 255, (300 + 10 * i, 200, 3), dtype=np.uint8) for i in range(count)]
+
+
+class TestProcessBatch:
+    def test_matches_single_image_results(self, pipeline):
+        '''Batched results equal per-image results, in input order'''
+        images = make_images(5)
+        expected = [pipeline.process_array(img.copy(), color_order='BGR') for img in images]
+
+        pipeline.line_detector.batch_sizes.clear()
+        batched = pipeline.process_batch([img.copy() for img in images], batch_size=2)
+
+        assert pipeline.line_detector.batch_sizes == [2, 2, 1]
+        assert len(batched) == len(expected)
+        assert all(len(interp) == 4 for _, interp, _ in expected)
+        for (img_a, interp_a, mounts_a), (img_b, interp_b, mounts_b) in zip(expected, batched):
+            np.testing.assert_array_equal(img_a, img_b)
+            assert interp_a.keys() == interp_b.keys()
+            for name in interp_a:
+                assert interp_a[name]['interpretation'] == interp_b[name]['interpretation']
+            assert mounts_a.keys() == mounts_b.keys()
+
+    def test_paths_and_missing_hands(self, pipeline, tmp_path, monkeypatch):
+        '''Paths are decoded; images without a hand keep their slot as None'''
+        images = make_images(3)
+        path = str(tmp_path / 'palm.png')
+        cv2.imwrite(path, images[0])
+
+        calls = []
+
+        def flaky_orient(img, mode=None, **hints):
+            calls.append(img)
+            if len(calls) == 2:
+                return img, 0, None
+            return upright_orient_hand(img, mode)
+
+        monkeypatch.setattr(pipeline.hand_detector, 'orient_hand', flaky_orient)
+        monkeypatch.setattr(pipeline.hand_detector, 'get_landmarks', lambda img_rgb, confidence=0.5: None)
+        results = pipeline.process_batch([path, images[1], images[2]], batch_size=4)
+
+        assert results[0][0] is not None
+        assert results[1] == (None, None, None)
+        assert results[2][0] is not None
+
+    def test_unreadable_path_does_not_discard_the_batch(self, pipeline, tmp_path):
+        '''A missing or corrupt file yields a no-hand result; the other images still complete'''
+        corrupt = tmp_path / 'corrupt.jpg'
+        corrupt.write_bytes(b'not an image')
+        images = make_images(2)
+        results = pipeline.process_batch([images[0], str(tmp_path / 'missing.jpg'), str(corrupt), images[1]],
+                                         batch_size=4)
+
+        assert len(results) == 4
+        assert results[0][0] is not None and results[3][0] is not None
+        assert results[1] == (None, None, None) and results[2] == (None, None, None)
+
+    def test_rejects_bad_batch_size(self, pipeline):
+        with pytest.raises(ValueError):
+            pipeline.process_batch(make_images(1), batch_size=0)
+
+
+class TestProcessStream:
+    def test_matches_single_image_results(self, pipeline):
+        '''Streamed results equal per-image results and come back in input order'''
+        images = make_images(5, seed=3)
+        expected = [pipeline.process_array(img.copy(), color_order='BGR') for img in images]
+
+        stream = pipeline.process_stream((img.copy() for img in images), queue_size=2)
+        streamed = list(stream)
+
+        assert [index for index, _ in streamed] == list(range(5))
+        for (img_a, interp_a, _), (_, (img_b, interp_b, _)) in zip(expected, streamed):
+            np.testing.assert_array_equal(img_a, img_b)
+            assert {k: v['interpretation'] for k, v in interp_a.items()} == \
+                   {k: v['interpretation'] for k, v in interp_b.items()}
+
+        stats = stream.stats()['stages']
+        assert list(stats) == ['load', 'prepare', 'yolo', 'features']
+        assert all(stage['items'] == 5 for stage in stats.values())
+
+    def test_missing_hands_bad_paths_and_completion_order(self, pipeline, tmp_path, monkeypatch):
+        '''No-hand images finish early, unreadable files raise at their index'''
+        images = make_images(3)
+
+        def orient(img, mode=None, **hints):
+            if img.mean() < 1:
+                return img, 0, None
+            return upright_orient_hand(img, mode)
+
+        monkeypatch.setattr(pipeline.hand_detector, 'orient_hand', orient)
+        monkeypatch.setattr(pipeline.hand_detector, 'get_landmarks', lambda img_rgb, confidence=0.5: None)
+        inputs = [images[0], np.zeros_like(images[1]), str(tmp_path / 'missing.png'), images[2]]
+
+        stream = pipeline.process_stream(inputs, ordered=False, render=False)
+        results, errors = {}, []
+        while True:
+            try:
+                index, report = next(stream)
+            except StopIteration:
+                break
+            except StageError as e:
+                errors.append((e.index, e.stage))
+                continue
+            results[index] = report
+
+        assert errors == [(2, 'load')]
+        assert sorted(results) == [0, 1, 3]
+        assert results[1]['hand_detected'] is False
+        assert results[0]['hand_detected'] and results[3]['hand_detected']
+        assert stream.stats()['stages']['yolo']['items'] == 2
+
+
+
+class TestInstrumentation:
+    def test_disabled_by_default(self, pipeline):
+        '''Uninstrumented results carry no timings'''
+        result = pipeline.process_array(make_images(1)[0], color_order='BGR')
+        assert result.timings is None
+        assert pipeline.metrics is None
+
+    def test_stage_timings_on_result_and_metrics(self, tmp_path):
+        '''Every stage is timed per call and aggregated across calls'''
+        hook_calls = []
+        palm_pipeline = PalmReadingPipeline(None, target_size=256, line_detector=SyntheticLineDetector(run_model=False),
+                                            timing_hooks=[lambda stage, ms: hook_calls.append(stage)])
+        palm_pipeline.hand_detector.orient_hand = upright_orient_hand
+        path = str(tmp_path / 'palm.png')
+        cv2.imwrite(path, make_images(1)[0])
+
+        with palm_pipeline:
+            img, interpretations, mounts = result = palm_pipeline.process(path)
+            batch = palm_pipeline.process_batch(make_images(2), batch_size=2)
+
+        stages = result.timings['stages']
+        assert set(stages) == {'load', 'standardize', 'rotation', 'mounts', 'yolo',
+                               'features', 'interpret', 'draw'}
+        assert stages['features']['count'] == len(interpretations) == 4
+        assert stages['interpret']['count'] == 4
+        assert result.image is img and result.mounts is mounts
+        assert 'yolo' in hook_calls
+        assert all(r.timings['stages']['yolo']['count'] == 1 for r in batch)
+
+        snapshot = palm_pipeline.metrics.snapshot()
+        assert snapshot['total']['count'] == 3
+        assert {'p50_ms', 'p95_ms', 'p99_ms'} <= set(snapshot['yolo'])
+
+
+class TestRenderMode:
+    def test_json_only_result_skips_drawing(self, pipeline, monkeypatch):
+        '''render=False returns a JSON-ready report and never touches drawing code'''
+        def fail(*args, **kwargs):
+            raise AssertionError('drawing ran with render=False')
+        monkeypatch.setattr(pipeline, 'draw_lines', fail)
+        monkeypatch.setattr(pipeline.hand_detector, 'draw_landmarks', fail)
+        monkeypatch.setattr(pipeline.hand_detector, 'draw_mounts', fail)
+
+        report = pipeline.process_array(make_images(1)[0], color_order='BGR', render=False)
+
+        assert report['hand_detected'] is True
+        assert set(report['interpretations']) == {'life_line', 'heart_line', 'head_line', 'fate_line'}
+        features = report['interpretations']['life_line']['features']
+        assert all(type(v) is float for v in features['start_point'])
+        assert isinstance(report['mounts']['wrist'], list)
+        assert json.loads(json.dumps(report)) == report
+
+        batch = pipeline.process_batch(make_images(2), batch_size=2, render=False)
+        assert all(r['hand_detected'] for r in batch)
+
+    def test_rendered_result_converts_to_report(self, pipeline, monkeypatch):
+        result = pipeline.process_array(make_images(1)[0], color_order='BGR')
+        report = result.to_report()
+        assert report['interpretations'].keys() == result.interpretations.keys()
+        json.dumps(report)
+
+        monkeypatch.setattr(pipeline.hand_detector, 'orient_hand', lambda img, mode=None, **hints: (img, 0, None))
+        monkeypatch.setattr(pipeline.hand_detector, 'get_landmarks', lambda img_rgb: None)
+        missing = pipeline.process_array(make_images(1)[0], color_order='BGR', render=False)
+        assert missing == {'hand_detected': False, 'interpretations': {}, 'mounts': {}, 'timings': None}
+
+    def test_features_read_clean_pixels(self, pipeline):
+        '''Rendering no longer changes the measured features'''
+        img = make_images(1, seed=3)[0]
+        rendered = pipeline.process_array(img.copy(), color_order='BGR')
+        report = pipeline.process_array(img.copy(), color_order='BGR', render=False)
+        assert rendered.to_report()['interpretations'] == report['interpretations']
+
+    def test_overlay_renders_onto_copies(self, pipeline):
+        '''The overlay keeps the clean image and can render downscaled previews'''
+        result = pipeline.process_array(make_images(1)[0], color_order='RGB')
+        clean = result.overlay.image.copy()
+
+        full = result.render()
+        np.testing.assert_array_equal(full, result.image)
+        assert full is not result.image
+        assert not np.array_equal(cv2.cvtColor(full, cv2.COLOR_RGB2BGR), clean)
+        np.testing.assert_array_equal(result.overlay.image, clean)
+
+        preview = result.render(max_size=128)
+        assert max(preview.shape[:2]) == 128
+        assert result.overlay.base(128)[0] is result.overlay.base(128)[0]
+
+
+class TestMultiResolution:
+    def test_detectors_see_small_images_features_see_full_size(self, monkeypatch):
+        '''MediaPipe and YOLO get downscaled copies; keypoints land on the target_size image'''
+        detector = SyntheticLineDetector(run_model=False)
+        seen = {}
+        detect = detector.detect
+
+        def recording_detect(image, conf=0.3, iou=0.4):
+            seen['yolo'] = image.shape[:2]
+            return detect(image, conf=conf, iou=iou)
+
+        def recording_orient_hand(img, mode=None, **hints):
+            seen['mediapipe'] = img.shape[:2]
+            return upright_orient_hand(img, mode)
+
+        with PalmReadingPipeline(None, target_size=800, line_detector=detector, resolution_mode='multi',
+                                 detection_size=128, yolo_input_size=400) as palm_pipeline:
+            monkeypatch.setattr(detector, 'detect', recording_detect)
+            palm_pipeline.hand_detector.orient_hand = recording_orient_hand
+            result = palm_pipeline.process_array(np.full((600, 400, 3), 200, dtype=np.uint8), color_order='BGR')
+
+        assert seen == {'mediapipe': (128, 85), 'yolo': (400, 266)}
+        assert result.image.shape[:2] == (800, 533)
+        start_x, _ = result.interpretations['life_line']['features']['start_point']
+        assert start_x == pytest.approx(LINE_PATHS[0][0][0] * 533, abs=1.0)
+        assert result.mounts['wrist'][1] == pytest.approx(0.9 * 800, abs=1)
+
+    def test_unknown_resolution_mode(self):
+        with pytest.raises(ValueError, match='resolution mode'):
+            PalmReadingPipeline(None, line_detector=SyntheticLineDetector(run_model=False), resolution_mode='tiny')
+
+
+class TestRotationHints:
+    def test_session_prior_and_exif_reach_orientation(self, pipeline, monkeypatch):
+        '''The previous angle of a session and the EXIF flag are passed as hints'''
+        seen = []
+
+        def recording_orient_hand(img, mode=None, **hints):
+            seen.append(hints)
+            return upright_orient_hand(img, mode)
+
+        monkeypatch.setattr(pipeline.hand_detector, 'orient_hand', recording_orient_hand)
+        images = make_images(2)
+        pipeline.process_array(images[0], color_order='BGR', session_id='user-a', exif_rotation=90)
+        pipeline.process_array(images[1], color_order='BGR', session_id='user-a')
+        pipeline.process_array(images[1], color_order='BGR', session_id='user-b')
+        # Requests without a session neither leave nor use a prior
+        pipeline.process_array(images[0], color_order='BGR')
+        pipeline.process_array(images[1], color_order='BGR')
+
+        assert seen == [{'exif_rotation': 90, 'prior': None},
+                        {'exif_rotation': None, 'prior': 0},
+                        {'exif_rotation': None, 'prior': None},
+                        {'exif_rotation': None, 'prior': None},
+                        {'exif_rotation': None, 'prior': None}]
+        assert len(pipeline.rotation_priors) == 2
+
+
+class TestThreadSafety:
+    def test_threads_match_serial_run(self, monkeypatch):
+        '''N threads sharing one pipeline produce exactly the serial results'''
+        from concurrent.futures import ThreadPoolExecutor
+        from benchmarks.synthetic import StubHandDetector, make_palm_image
+        import pipeline as pipeline_module
+
+        # No result cache or landmark store: every call runs MediaPipe and a
+        # real YOLO model drawn from a LineModelPool. The untrained stand-in
+        # only yields lines at a very low confidence, under a palm line name.
+        monkeypatch.setattr(pipeline_module, 'YOLO_CONFIDENCE', 0.01)
+        detector = LineDetector('yolov8n-pose.yaml', max_instances=3)
+        detector.model.model.names = {0: 'life_line'}
+        images = [make_palm_image(240, 320, seed=i) for i in range(6)]
+        with PalmReadingPipeline(None, target_size=320, hand_detector=StubHandDetector(run_mediapipe=True),
+                                 line_detector=detector, instrument=True) as shared:
+            serial = [shared.process_array(img.copy(), color_order='BGR') for img in images]
+            assert any(interpretations for _, interpretations, _ in serial)
+
+            with ThreadPoolExecutor(4) as pool:
+                threaded = list(pool.map(lambda img: shared.process_array(img.copy(), color_order='BGR'),
+                                         images * 2))
+
+            assert shared.metrics.snapshot()['total']['count'] == len(images) * 3
+            assert shared.line_detector.pool.stats()['created'] > 1
+
+        for i, (img, interpretations, mounts) in enumerate(threaded):
+            expected_img, expected_interp, expected_mounts = serial[i % len(images)]
+            np.testing.assert_array_equal(img, expected_img)
+            assert json.dumps(to_jsonable(interpretations), sort_keys=True) == \
+                   json.dumps(to_jsonable(expected_interp), sort_keys=True)
+            assert mounts.keys() == expected_mounts.keys()
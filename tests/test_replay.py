@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from pipeline import PalmReadingPipeline
+from replay import DetectionRecorder, ReplayEngine, extract_strip, main
+from benchmarks.synthetic import SyntheticLineDetector, upright_orient_hand
+
+
+def make_palm(seed):
+    '''Noisy light background with a few dark strokes so thickness and branches vary'''
+    rng = np.random.default_rng(seed)
+    img = rng.integers(110, 255, (320, 240, 3), dtype=np.uint8)
+    for _ in range(6):
+        x, y = rng.integers(20, 220), rng.integers(20, 300)
+        img[y:y + rng.integers(2, 12), x:x + rng.integers(20, 120)] = rng.integers(0, 100)
+    return img
+
+
+@pytest.fixture(scope='module')
+def recorded(tmp_path_factory):
+    '''Live results for a few images plus detection files with and without strips'''
+    directory = tmp_path_factory.mktemp('replay')
+    live = {}
+    paths = {}
+    for store_strips in (False, True):
+        recorder = DetectionRecorder(store_strips=store_strips)
+        with PalmReadingPipeline(None, target_size=256, line_detector=SyntheticLineDetector(run_model=False),
+                                 recorder=recorder) as palm_pipeline:
+            palm_pipeline.hand_detector.orient_hand = upright_orient_hand
+            for seed in range(4):
+                _, interpretations, _ = palm_pipeline.process_array(
+                    make_palm(seed), color_order='BGR', image_id=f"palm_{seed}")
+                live[f"palm_{seed}"] = interpretations
+        paths[store_strips] = str(directory / f"strips_{store_strips}.npz")
+        recorder.save(paths[store_strips])
+    return live, paths
+
+
+def assert_same_interpretations(expected, actual):
+    assert expected.keys() == actual.keys()
+    for name in expected:
+        assert actual[name]['interpretation'] == expected[name]['interpretation']
+        for key, value in expected[name]['features'].items():
+            if key in ('start_point', 'end_point'):
+                np.testing.assert_allclose(actual[name]['features'][key], value)
+            else:
+                assert actual[name]['features'][key] == pytest.approx(value), key
+
+
+class TestReplay:
+    @pytest.mark.parametrize('store_strips', [False, True])
+    def test_replay_matches_live_pipeline(self, recorded, store_strips):
+        '''Replayed features and interpretations equal the live run'''
+        live, paths = recorded
+        engine = ReplayEngine(paths[store_strips])
+        assert engine.use_strips == store_strips
+        results = dict(engine.run())
+        assert results.keys() == live.keys()
+        for image_id, interpretations in results.items():
+            assert len(interpretations) == 4
+            assert_same_interpretations(live[image_id], interpretations)
+
+    def test_strips_keep_only_the_line_corridor(self):
+        '''Pixels far from the polyline are zeroed; pixels on it are kept'''
+        gray = np.full((200, 200), 200, dtype=np.uint8)
+        pts = np.array([[50.0, 100.0], [150.0, 100.0]])
+        (x0, y0, h, w), strip = extract_strip(gray, pts, half_width=10)
+        assert (x0, y0, h, w) == (40, 90, 21, 121)
+        assert strip[10, 60] == 200
+        assert strip[0, 0] == 0
+
+    def test_requesting_missing_strips_fails(self, recorded):
+        _, paths = recorded
+        with pytest.raises(ValueError, match='without strips'):
+            ReplayEngine(paths[False], use_strips=True)
+
+    def test_cli_run_writes_json(self, recorded, tmp_path, capsys):
+        _, paths = recorded
+        output = tmp_path / 'interpretations.json'
+        results = main(['run', paths[True], '--no-strips', '--output', str(output)])
+        assert len(results) == 4 and output.exists()
+        assert 'images/s' in capsys.readouterr().out
+
+    def test_save_without_records_fails(self, tmp_path):
+        with pytest.raises(ValueError):
+            DetectionRecorder().save(str(tmp_path / 'empty.npz'))
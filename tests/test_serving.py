@@ -0,0 +1,188 @@
+import asyncio
+import threading
+import time
+import numpy as np
+import pytest
+from pipeline import PalmReadingPipeline
+import serving
+from serving import MicroBatcher, PalmServer, ServerBusy, build_server
+from benchmarks.synthetic import SyntheticLineDetector, upright_orient_hand
+
+
+def make_images(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 255, (300, 200 + 10 * i, 3), dtype=np.uint8) for i in range(count)]
+
+
+class BlockingPipeline:
+    '''Pipeline stand-in whose calls wait until released'''
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.line_detector = None
+        self.started = 0
+
+    def process_array(self, img, color_order='RGB', render=None, session_id=None):
+        self.started += 1
+        self.release.wait(5)
+        return img.shape
+
+    def close(self):
+        pass
+
+
+class TestMicroBatcher:
+    def test_groups_concurrent_calls(self):
+        '''Calls arriving inside the window share one detect_batch'''
+        detector = SyntheticLineDetector(run_model=False)
+        batcher = MicroBatcher(detector, max_batch=8, window_ms=200)
+        images = make_images(4)
+        results = [None] * len(images)
+        barrier = threading.Barrier(len(images))
+
+        def call(i):
+            barrier.wait()
+            results[i] = batcher.detect(images[i])
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(len(images))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        batcher.close()
+
+        assert sum(detector.batch_sizes) == 4
+        assert max(detector.batch_sizes) > 1
+        for img, result in zip(images, results):
+            expected = detector.detect(img)
+            np.testing.assert_array_equal(result.keypoints.xy.numpy(), expected.keypoints.xy.numpy())
+        assert batcher.stats()['images'] == 4
+
+    def test_respects_max_batch_and_propagates_errors(self):
+        '''Batches never exceed max_batch; model errors reach the caller'''
+        detector = SyntheticLineDetector(run_model=False)
+        batcher = MicroBatcher(detector, max_batch=2, window_ms=50)
+        results = batcher.detect_batch(make_images(5))
+        assert len(results) == 5
+        assert max(detector.batch_sizes) <= 2
+
+        def broken(images, conf=0.3, iou=0.4):
+            raise RuntimeError("model failed")
+
+        detector.detect_batch = broken
+        with pytest.raises(RuntimeError, match="model failed"):
+            batcher.detect(make_images(1)[0])
+        batcher.close()
+        with pytest.raises(RuntimeError):
+            batcher.detect(make_images(1)[0])
+
+
+class TestPalmServer:
+    def test_results_match_direct_pipeline(self):
+        '''Concurrent submissions return the same readings as direct calls'''
+        images = make_images(6)
+        reference = PalmReadingPipeline(None, target_size=256, line_detector=SyntheticLineDetector(run_model=False))
+        reference.hand_detector.orient_hand = upright_orient_hand
+        expected = [reference.process_array(img.copy(), color_order='BGR') for img in images]
+        reference.close()
+
+        detector = SyntheticLineDetector(run_model=False)
+        server = build_server(None, workers=3, max_queue=8, batch_window_ms=20,
+                              line_detector=detector, target_size=256)
+        server.pipeline.hand_detector.orient_hand = upright_orient_hand
+
+        async def run():
+            results = await asyncio.gather(*[server.submit(img.copy(), color_order='BGR') for img in images])
+            stats = server.stats()
+            await server.close()
+            return results, stats
+
+        results, stats = asyncio.run(run())
+
+        for (img_a, interp_a, _), (img_b, interp_b, _) in zip(expected, results):
+            np.testing.assert_array_equal(img_a, img_b)
+            assert {k: v['interpretation'] for k, v in interp_a.items()} == \
+                   {k: v['interpretation'] for k, v in interp_b.items()}
+        assert stats['completed'] == 6
+        assert stats['batching']['images'] == 6
+        assert stats['latency']['queue_wait']['count'] == 6
+
+    def test_batches_close_once_every_worker_is_waiting(self):
+        '''With max_batch capped at the worker count, a full batch does not wait out the window'''
+        detector = SyntheticLineDetector(run_model=False)
+        server = build_server(None, workers=2, max_batch=8, batch_window_ms=5000,
+                              line_detector=detector, target_size=256)
+        server.pipeline.hand_detector.orient_hand = upright_orient_hand
+        assert server.pipeline.line_detector.max_batch == 2
+
+        async def run():
+            start = time.perf_counter()
+            await asyncio.gather(*[server.submit(img, color_order='BGR') for img in make_images(2)])
+            elapsed = time.perf_counter() - start
+            await server.close()
+            return elapsed
+
+        assert asyncio.run(run()) < 2.5
+        assert detector.batch_sizes == [2]
+
+    def test_torch_threads_reach_the_line_detector(self, monkeypatch):
+        '''The LineDetector built behind the batcher gets the pipeline's torch_threads'''
+        built = {}
+
+        def fake_line_detector(model_path, num_threads=None):
+            built['num_threads'] = num_threads
+            return SyntheticLineDetector(run_model=False)
+        monkeypatch.setattr(serving, 'LineDetector', fake_line_detector)
+
+        server = build_server(None, workers=2, torch_threads=3, target_size=256)
+        assert built == {'num_threads': 3}
+        server.pipeline.close()
+
+    def test_rejects_when_queue_full(self):
+        '''With the worker busy and the queue full, further requests get ServerBusy'''
+        pipeline = BlockingPipeline()
+        server = PalmServer(pipeline, workers=1, max_queue=1)
+        img = np.zeros((4, 4, 3), dtype=np.uint8)
+
+        async def run():
+            first = asyncio.create_task(server.submit(img))
+            while pipeline.started == 0:
+                await asyncio.sleep(0.01)
+            second = asyncio.create_task(server.submit(img))
+            await asyncio.sleep(0.01)
+
+            with pytest.raises(ServerBusy):
+                await server.submit(img)
+            with pytest.raises(ServerBusy):
+                await server.submit(img, timeout=0.05)
+            depth = server.stats()['queue_depth']
+
+            pipeline.release.set()
+            results = await asyncio.gather(first, second)
+            stats = server.stats()
+            await server.close()
+            return results, depth, stats
+
+        results, depth, stats = asyncio.run(run())
+
+        assert results == [(4, 4, 3), (4, 4, 3)]
+        assert depth == 1
+        assert stats['rejected'] == 2
+        assert stats['accepted'] == 2
+        assert stats['max_queue_depth'] == 1
+        assert stats['latency']['queue_wait']['p95_ms'] > 0
+
+    def test_errors_reach_the_caller(self):
+        '''A failing pipeline call raises in submit and is counted'''
+        pipeline = BlockingPipeline()
+        pipeline.process_array = lambda img, **kwargs: (_ for _ in ()).throw(ValueError("bad image"))
+        server = PalmServer(pipeline, workers=1, max_queue=2)
+
+        async def run():
+            with pytest.raises(ValueError, match="bad image"):
+                await server.submit(np.zeros((4, 4, 3), dtype=np.uint8))
+            stats = server.stats()
+            await server.close()
+            return stats
+
+        assert asyncio.run(run())['failed'] == 1
@@ -0,0 +1,132 @@
+import gc
+import itertools
+import threading
+import time
+import pytest
+from core.stages import Done, Stage, StagedRunner, StageError
+
+
+def slow(seconds, fn=lambda x: x):
+    def run(x):
+        time.sleep(seconds)
+        return fn(x)
+    return run
+
+
+class TestStagedRunner:
+    def test_input_order(self):
+        '''Ordered streams yield every item in input order, even with parallel workers'''
+        runner = StagedRunner([
+            Stage('double', lambda x: x * 2),
+            Stage('jitter', lambda x: (time.sleep(0.01 * (x % 3)), x + 1)[1], workers=3),
+        ], queue_size=2)
+        assert list(runner.run(range(10))) == [(i, 2 * i + 1) for i in range(10)]
+
+    def test_completion_order(self):
+        '''Unordered streams yield items as they finish'''
+        runner = StagedRunner([Stage('wait', lambda x: (time.sleep(x), x)[1], workers=2)])
+        results = list(runner.run([0.2, 0.0], ordered=False))
+        assert results == [(1, 0.0), (0, 0.2)]
+
+    def test_stages_overlap(self):
+        '''Two 50ms stages over 6 items take about 7 slots, not 12'''
+        runner = StagedRunner([Stage('a', slow(0.05)), Stage('b', slow(0.05))])
+        start = time.perf_counter()
+        stream = runner.run(range(6))
+        assert [result for _, result in stream] == list(range(6))
+        assert time.perf_counter() - start < 0.5
+
+        stats = stream.stats()
+        assert set(stats['stages']) == {'a', 'b'}
+        for stage in stats['stages'].values():
+            assert stage['items'] == 6
+            assert 0.3 < stage['utilization'] <= 1.0
+
+    def test_done_skips_later_stages(self):
+        '''Done(result) finishes an item early'''
+        seen = []
+
+        def second(x):
+            seen.append(x)
+            return x
+
+        runner = StagedRunner([
+            Stage('filter', lambda x: Done('odd') if x % 2 else x),
+            Stage('second', second),
+        ])
+        assert list(runner.run(range(4))) == [(0, 0), (1, 'odd'), (2, 2), (3, 'odd')]
+        assert seen == [0, 2]
+
+    def test_errors_are_raised_at_their_item(self):
+        '''A failing item raises StageError and the stream carries on'''
+        def check(x):
+            if x == 1:
+                raise ValueError("bad item")
+            return x
+
+        stream = StagedRunner([Stage('check', check)]).run(range(3))
+        assert next(stream) == (0, 0)
+        with pytest.raises(StageError) as excinfo:
+            next(stream)
+        assert excinfo.value.index == 1
+        assert excinfo.value.stage == 'check'
+        assert isinstance(excinfo.value.__cause__, ValueError)
+        assert next(stream) == (2, 2)
+
+    def test_close_stops_threads(self):
+        '''Closing mid-stream stops the feeder and stage threads'''
+        before = threading.active_count()
+        stream = StagedRunner([Stage('a', slow(0.01))], queue_size=1).run(iter(range(1000)))
+        next(stream)
+        stream.close()
+        assert threading.active_count() == before
+
+    def test_dropping_the_stream_stops_threads(self):
+        '''An abandoned stream over an endless input does not leave threads running'''
+        before = threading.active_count()
+        stream = StagedRunner([Stage('a', slow(0.01))], queue_size=1).run(itertools.count())
+        next(stream)
+        del stream
+        gc.collect()
+        deadline = time.time() + 2
+        while threading.active_count() > before and time.time() < deadline:
+            time.sleep(0.05)
+        assert threading.active_count() == before
+
+    def test_context_manager_closes(self):
+        before = threading.active_count()
+        with StagedRunner([Stage('a', slow(0.01))]).run(itertools.count()) as stream:
+            assert next(stream) == (0, 0)
+        assert threading.active_count() == before
+
+    def test_inputs_in_flight_are_bounded(self):
+        '''A slow consumer, or one slow item in ordered mode, stalls the input instead of buffering it'''
+        consumed = []
+
+        def count(items):
+            for item in items:
+                consumed.append(item)
+                yield item
+
+        runner = StagedRunner([Stage('a', lambda x: x, workers=2), Stage('b', lambda x: x)], queue_size=2)
+        with runner.run(count(itertools.count()), ordered=False) as stream:
+            next(stream)
+            time.sleep(0.3)
+            assert len(consumed) <= stream.window + 1  # the consumed item's slot was reused
+
+        # Item 0 holds everything behind it in the reorder buffer
+        runner = StagedRunner([Stage('a', lambda x: (time.sleep(0.5 if x == 0 else 0), x)[1], workers=3)],
+                              queue_size=2)
+        consumed.clear()
+        with runner.run(count(itertools.count())) as stream:
+            assert next(stream) == (0, 0)
+            assert len(consumed) <= stream.window + 1  # the consumed item's slot was reused
+            assert [next(stream) for _ in range(3)] == [(1, 1), (2, 2), (3, 3)]
+
+    def test_rejects_bad_settings(self):
+        with pytest.raises(ValueError):
+            StagedRunner([])
+        with pytest.raises(ValueError):
+            StagedRunner([Stage('a', len)], queue_size=0)
+        with pytest.raises(ValueError):
+            Stage('a', len, workers=0)
@@ -1,6 +1,7 @@
 import pytest
 import numpy as np
-from utils import calculate_line_length, get_pixel_coords
+import cv2
+from utils import calculate_line_length, get_pixel_coords, rotate_normalized_coords
 
 
 class TestUtils:
@@ -40,4 +41,25 @@ class TestPixelCoords:
         
         result = get_pixel_coords(MockLandmark(), 640, 480)
         assert result[0] == 640
-        assert result[1] == 480
\ No newline at end of file
+        assert result[1] == 480
+
+
+class TestRotateNormalizedCoords:
+    @pytest.mark.parametrize('angle, code', [
+        (90, cv2.ROTATE_90_CLOCKWISE),
+        (180, cv2.ROTATE_180),
+        (270, cv2.ROTATE_90_COUNTERCLOCKWISE),
+    ])
+    def test_matches_cv2_rotate(self, angle, code):
+        '''Rotated coords land on the same pixel cv2.rotate moves it to'''
+        img = np.zeros((40, 60), dtype=np.uint8)
+        img[10, 45] = 255
+        rotated = cv2.rotate(img, code)
+        
+        x, y = rotate_normalized_coords((45 + 0.5) / 60, (10 + 0.5) / 40, angle)
+        rh, rw = rotated.shape
+        assert rotated[int(y * rh), int(x * rw)] == 255
+    
+    def test_zero_is_identity(self):
+        '''No rotation leaves coords unchanged'''
+        assert rotate_normalized_coords(0.2, 0.7, 0) == (0.2, 0.7)
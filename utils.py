@@ -1,5 +1,4 @@
 import numpy as np
-from scipy.spatial import distance
 from typing import Tuple
 
 def calculate_line_length(keypoints: np.ndarray) -> float:
@@ -7,11 +6,73 @@ def calculate_line_length(keypoints: np.ndarray) -> float:
     if len(keypoints) < 2:
         return 0.0
     
-    total_length = 0.0
-    for i in range(len(keypoints) - 1):
-        total_length += distance.euclidean(keypoints[i], keypoints[i+1])
-    return total_length
+    return float(np.sum(segment_lengths(np.asarray(keypoints, dtype=float))))
+
+def pack_lines(lines) -> Tuple[np.ndarray, np.ndarray]:
+    '''Stack variable-length (K_i, 2) lines into a zero-padded (N, K, 2) array plus counts'''
+    counts = np.array([len(line) for line in lines], dtype=int)
+    packed = np.zeros((len(lines), max(counts, default=0), 2), dtype=float)
+    for i, line in enumerate(lines):
+        if len(line):
+            packed[i, :len(line)] = line
+    return packed, counts
+
+def segment_mask(counts: np.ndarray, num_points: int, span: int = 1) -> np.ndarray:
+    '''(N, K-span) mask of windows of span+1 consecutive points that lie within each line'''
+    starts = np.arange(max(num_points - span, 0))
+    return starts[None, :] + span < np.asarray(counts)[:, None]
+
+def segment_lengths(lines: np.ndarray) -> np.ndarray:
+    '''Length of each consecutive segment: (..., K, 2) -> (..., K-1)'''
+    deltas = np.diff(lines, axis=-2)
+    return np.hypot(deltas[..., 0], deltas[..., 1])
+
+def batch_line_lengths(lines: np.ndarray, counts: np.ndarray = None) -> np.ndarray:
+    '''Total polyline length for each line of an (N, K, 2) batch'''
+    lengths = segment_lengths(lines)
+    if counts is not None:
+        lengths = np.where(segment_mask(counts, lines.shape[1]), lengths, 0.0)
+    return lengths.sum(axis=-1)
+
+def turning_angles(lines: np.ndarray) -> np.ndarray:
+    '''
+    Turning angle in degrees at each interior point: (..., K, 2) -> (..., K-2)
+    
+    Angles at points touching a zero-length segment are NaN.
+    '''
+    vecs = np.diff(lines, axis=-2)
+    vec1, vec2 = vecs[..., :-1, :], vecs[..., 1:, :]
+    norms = np.hypot(vecs[..., 0], vecs[..., 1])
+    norm1, norm2 = norms[..., :-1], norms[..., 1:]
+    
+    valid = (norm1 > 0) & (norm2 > 0)
+    denom = np.where(valid, norm1 * norm2, 1.0)
+    cos_angle = np.clip(np.sum(vec1 * vec2, axis=-1) / denom, -1.0, 1.0)
+    return np.where(valid, np.degrees(np.arccos(cos_angle)), np.nan)
 
 def get_pixel_coords(landmark, width: int, height: int) -> np.ndarray:
     '''Converts normalized landmark to pixel coordinates'''
-    return np.array([int(landmark.x * width), int(landmark.y * height)])
\ No newline at end of file
+    return np.array([int(landmark.x * width), int(landmark.y * height)])
+
+def rotate_normalized_coords(x: float, y: float, angle: int) -> Tuple[float, float]:
+    '''Map normalized (x, y) into the frame of an image rotated clockwise by angle'''
+    if angle == 90:
+        return 1.0 - y, x
+    if angle == 180:
+        return 1.0 - x, 1.0 - y
+    if angle == 270:
+        return y, 1.0 - x
+    return x, y
+
+
+def to_jsonable(value):
+    '''Recursively convert numpy arrays/scalars and tuples into JSON-safe Python types'''
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value